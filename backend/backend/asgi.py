@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Under an ASGI server (e.g. ``uvicorn backend.asgi:application``) the async views do the I/O
+os.environ.setdefault('ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
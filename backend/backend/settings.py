@@ -13,7 +13,6 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-from mongoengine import connect
 
 # Load environment variables from .env file
 load_dotenv()
@@ -50,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend_app.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -138,13 +138,178 @@ CORS_ALLOW_ALL_ORIGINS = True
 # GitHub OAuth Settings
 GITHUB_CLIENT_ID = os.environ.get('GITHUB_CLIENT_ID')
 GITHUB_CLIENT_SECRET = os.environ.get('GITHUB_CLIENT_SECRET')
-GITHUB_REDIRECT_URI = 'http://localhost:3000/github/callback'
+GITHUB_REDIRECT_URI = os.environ.get('GITHUB_REDIRECT_URI', 'http://localhost:3000/github/callback')
+GITHUB_OAUTH_URL = os.environ.get('GITHUB_OAUTH_URL', 'https://github.com')
+
+# Push webhooks (POST /api/github/webhook) are rejected unless signed with this secret
+GITHUB_WEBHOOK_SECRET = os.environ.get('GITHUB_WEBHOOK_SECRET')
+# Token pushed repositories are re-scanned with in the background; without one, pushes only invalidate
+GITHUB_WEBHOOK_TOKEN = os.environ.get('GITHUB_WEBHOOK_TOKEN')
+# Also generate the summary of each pushed revision (needs SUMMARY_CACHE_ENABLED to be kept)
+WEBHOOK_PRECOMPUTE_SUMMARY = os.getenv('WEBHOOK_PRECOMPUTE_SUMMARY', 'false').lower() == 'true'
+
+# MongoDB (mongoengine); the client is only created on first use, see backend_app/apps.py
+MONGODB_NAME = os.getenv('MONGODB_NAME', 'githubParser')
+MONGODB_URI = os.getenv('MONGODB_URI')
+
+# GitHub REST API
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+# Retention of ETag/Last-Modified validated responses; entries are always revalidated
+GITHUB_CONDITIONAL_CACHE_TTL = int(os.getenv('GITHUB_CONDITIONAL_CACHE_TTL', str(7 * 24 * 3600)))
+GITHUB_CONDITIONAL_CACHE_SIZE = int(os.getenv('GITHUB_CONDITIONAL_CACHE_SIZE', '2000'))
+# Access token -> user profile, in memory only; invalidated early on any 401
+GITHUB_IDENTITY_CACHE_TTL = int(os.getenv('GITHUB_IDENTITY_CACHE_TTL', '300'))
+GITHUB_IDENTITY_CACHE_SIZE = int(os.getenv('GITHUB_IDENTITY_CACHE_SIZE', '10000'))
+# Per-user list of every repository, used for server-side paging and search
+GITHUB_REPOS_CACHE_TTL = int(os.getenv('GITHUB_REPOS_CACHE_TTL', '60'))
+GITHUB_REPOS_CACHE_SIZE = int(os.getenv('GITHUB_REPOS_CACHE_SIZE', '1000'))
+
+# Per-token GitHub request pacing (backend_app/ratelimit.py)
+GITHUB_REQUESTS_PER_SECOND = float(os.getenv('GITHUB_REQUESTS_PER_SECOND', '15'))
+GITHUB_REQUEST_BURST = int(os.getenv('GITHUB_REQUEST_BURST', '100'))
+# Bucket slots bulk work leaves free for interactive calls
+GITHUB_INTERACTIVE_BURST_RESERVE = int(os.getenv('GITHUB_INTERACTIVE_BURST_RESERVE', '20'))
+# Bulk work pauses until the reset once the primary budget is down to this
+GITHUB_BULK_BUDGET_RESERVE = int(os.getenv('GITHUB_BULK_BUDGET_RESERVE', '500'))
+# Longest a call may wait for a slot before it is answered with a 429
+GITHUB_INTERACTIVE_MAX_WAIT = float(os.getenv('GITHUB_INTERACTIVE_MAX_WAIT', '10'))
+GITHUB_BULK_MAX_WAIT = float(os.getenv('GITHUB_BULK_MAX_WAIT', '3700'))
+GITHUB_RATE_LIMIT_RETRIES = int(os.getenv('GITHUB_RATE_LIMIT_RETRIES', '3'))
+# Tokens whose budgets are remembered; the least recently used idle ones are forgotten
+GITHUB_RATE_LIMIT_TOKENS = int(os.getenv('GITHUB_RATE_LIMIT_TOKENS', '10000'))
+
+# Shared outbound HTTP client (backend_app/clients.py)
+HTTP_CLIENT_TIMEOUT = float(os.getenv('HTTP_CLIENT_TIMEOUT', '15'))
+HTTP_CLIENT_CONNECT_TIMEOUT = float(os.getenv('HTTP_CLIENT_CONNECT_TIMEOUT', '5'))
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.getenv('HTTP_CLIENT_MAX_CONNECTIONS', '100'))
+HTTP_CLIENT_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_CLIENT_KEEPALIVE_EXPIRY', '30'))
+HTTP_CLIENT_HTTP2 = os.getenv('HTTP_CLIENT_HTTP2', 'true').lower() == 'true'
+# Connections per host of the async views' client; more requests wait their turn
+HTTP_CLIENT_ASYNC_MAX_CONNECTIONS = int(os.getenv('HTTP_CLIENT_ASYNC_MAX_CONNECTIONS', '20'))
+# Threads available for issuing independent upstream calls in parallel
+HTTP_CLIENT_FANOUT_WORKERS = int(os.getenv('HTTP_CLIENT_FANOUT_WORKERS', '32'))
+# The same for bulk work (jobs, campaigns, webhooks), which may wait out a rate-limit reset
+HTTP_CLIENT_BULK_FANOUT_WORKERS = int(os.getenv('HTTP_CLIENT_BULK_FANOUT_WORKERS', '16'))
+# Maximum concurrent connections per upstream host
+HTTP_CLIENT_HOST_LIMITS = {
+    'api.github.com': int(os.getenv('GITHUB_MAX_CONNECTIONS', '20')),
+    'github.com': int(os.getenv('GITHUB_OAUTH_MAX_CONNECTIONS', '4')),
+    'codeload.github.com': int(os.getenv('GITHUB_ARCHIVE_MAX_CONNECTIONS', '4')),
+}
+
+# Serve the I/O-heavy endpoints from backend_app/async_views.py (on by default under asgi.py)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+# Threads the async views run the shared sync pipelines (dependency scans, update PRs) in
+ASYNC_VIEW_SYNC_WORKERS = int(os.getenv('ASYNC_VIEW_SYNC_WORKERS', '32'))
+
+# Set to false to keep every TieredCache in memory only (e.g. when running without MongoDB)
+CACHE_PERSISTENT_TIER = os.getenv('CACHE_PERSISTENT_TIER', 'true').lower() == 'true'
+
+# Identical in-flight dependency scans and summaries run once (backend_app/singleflight.py);
+# with SINGLE_FLIGHT_LEASES, also across worker processes through a MongoDB lease
+SINGLE_FLIGHT_LEASES = os.getenv('SINGLE_FLIGHT_LEASES', str(CACHE_PERSISTENT_TIER)).lower() == 'true'
+# Seconds before a lease whose holder died can be taken over
+SINGLE_FLIGHT_LEASE_TTL = int(os.getenv('SINGLE_FLIGHT_LEASE_TTL', '300'))
+# Seconds a finished result stays readable for followers in other processes
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv('SINGLE_FLIGHT_RESULT_TTL', '15'))
+# Longest a follower waits on another process, or an interactive one on a bulk
+# leader, before computing itself
+SINGLE_FLIGHT_MAX_WAIT = float(os.getenv('SINGLE_FLIGHT_MAX_WAIT', '120'))
+
+# Record every dependency scan in the cross-repository index (backend_app/dependency_index.py)
+DEPENDENCY_INDEX = os.getenv('DEPENDENCY_INDEX', str(CACHE_PERSISTENT_TIER)).lower() == 'true'
+
+# Generated repository summaries are kept per revision, bounded by age and per-user count
+SUMMARY_CACHE_ENABLED = os.getenv('SUMMARY_CACHE_ENABLED', 'true').lower() == 'true'
+SUMMARY_CACHE_MAX_AGE = int(os.getenv('SUMMARY_CACHE_MAX_AGE', str(30 * 24 * 3600)))
+SUMMARY_CACHE_MAX_PER_USER = int(os.getenv('SUMMARY_CACHE_MAX_PER_USER', '50'))
+
+# Package registry lookups
+NPM_REGISTRY_URL = os.getenv('NPM_REGISTRY_URL', 'https://registry.npmjs.org')
+PYPI_URL = os.getenv('PYPI_URL', 'https://pypi.org/pypi')
+REGISTRY_CONCURRENCY = {
+    'npm': int(os.getenv('NPM_REGISTRY_CONCURRENCY', '16')),
+    'pip': int(os.getenv('PYPI_CONCURRENCY', '16')),
+}
+REGISTRY_TIMEOUT = float(os.getenv('REGISTRY_TIMEOUT', '10'))
+
+# Latest-version cache: fresh for VERSION_CACHE_TTL seconds, then served stale
+# for up to VERSION_CACHE_STALE_TTL more while refreshed in the background
+VERSION_CACHE_TTL = int(os.getenv('VERSION_CACHE_TTL', '3600'))
+VERSION_CACHE_STALE_TTL = int(os.getenv('VERSION_CACHE_STALE_TTL', '86400'))
+VERSION_CACHE_SIZE = int(os.getenv('VERSION_CACHE_SIZE', '10000'))
+
+# Manifest contents cached by git blob SHA (never expire)
+BLOB_CACHE_SIZE = int(os.getenv('BLOB_CACHE_SIZE', '5000'))
+# Manifest paths of each tree, cached by tree SHA
+TREE_CACHE_SIZE = int(os.getenv('TREE_CACHE_SIZE', '500'))
+TREE_CACHE_TTL = int(os.getenv('TREE_CACHE_TTL', str(30 * 24 * 3600)))
+# Parsed manifests per (repo, path, blob SHA) and the last scanned manifest set per repo
+MANIFEST_SCAN_CACHE_SIZE = int(os.getenv('MANIFEST_SCAN_CACHE_SIZE', '20000'))
+SCAN_STATE_CACHE_SIZE = int(os.getenv('SCAN_STATE_CACHE_SIZE', '1000'))
+
+# Scans with at least this many uncached manifests stream the repository tarball once
+SCAN_ARCHIVE_THRESHOLD = int(os.getenv('SCAN_ARCHIVE_THRESHOLD', '50'))
+
+# Background jobs (backend_app/jobs.py)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# Minimum seconds between progress writes to the job store
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '1'))
+# Seconds after which a queued or running job is reported failed: its worker was
+# lost to a restart. Longer than the longest wait for a bulk rate-limit budget.
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', '7200'))
+
+# Dependency update campaigns (backend_app/campaigns.py)
+# Campaigns driven at once, on their own pool so they never hold up scan jobs or webhooks
+CAMPAIGN_WORKERS = int(os.getenv('CAMPAIGN_WORKERS', '2'))
+CAMPAIGN_CONCURRENCY = int(os.getenv('CAMPAIGN_CONCURRENCY', '4'))
+CAMPAIGN_MAX_REPOS = int(os.getenv('CAMPAIGN_MAX_REPOS', '1000'))
+# Seconds between progress polls of the campaign event stream
+CAMPAIGN_STREAM_INTERVAL = float(os.getenv('CAMPAIGN_STREAM_INTERVAL', '1'))
+# Seconds of silence after which the stream writes a keep-alive comment, so a
+# disconnected client is noticed
+CAMPAIGN_STREAM_HEARTBEAT = float(os.getenv('CAMPAIGN_STREAM_HEARTBEAT', '15'))
+# Seconds after which the stream ends with a timeout event; clients reconnect for more
+CAMPAIGN_STREAM_MAX_DURATION = float(os.getenv('CAMPAIGN_STREAM_MAX_DURATION', '3600'))
+# Seconds without recorded progress after which a queued or running campaign is
+# reported failed: its driver was lost to a restart. Longer than the longest wait
+# for a bulk rate-limit budget.
+CAMPAIGN_TIMEOUT = int(os.getenv('CAMPAIGN_TIMEOUT', '7200'))
+
+# Logging (backend_app/logs.py): LOG_FORMAT is json or text; secrets are redacted either way
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {'()': 'backend_app.logs.RequestContextFilter'},
+        'redact': {'()': 'backend_app.logs.RedactingFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'backend_app.logs.JsonFormatter'},
+        'text': {'()': 'backend_app.logs.TextFormatter', 'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': LOG_FORMAT,
+            'filters': ['request_context', 'redact'],
+        },
+    },
+    'root': {'handlers': ['console'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Replaces Django's own console handler, so its records are formatted and redacted too
+        'django': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        # Every request is already logged once by RequestMetricsMiddleware
+        'django.server': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'httpx': {'level': 'WARNING'},
+    },
+}
 
-# Add MongoDB settings
-connect(
-    db=os.getenv('MONGODB_NAME', 'githubParser'),
-    host=os.getenv('MONGODB_URI')
-)
+# Metrics (backend_app/metrics.py); when set, /metrics and the cache and rate-limit
+# stats ask for this bearer token
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
 
 # Add CORS settings
 CORS_ALLOWED_ORIGINS = [
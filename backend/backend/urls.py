@@ -14,34 +14,57 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from functools import lru_cache
+
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-print("Loading main URLs")
-
-# Create the schema view for Swagger
-schema_view = get_schema_view(
-    openapi.Info(
-        title="GitHub Parser API Documentation",
-        default_version='v1',
-        description="API documentation for the GitHub Parser backend application",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+
+from backend_app import views as app_views
+
+
+@lru_cache(maxsize=None)
+def _schema_view():
+    # drf_yasg is slow to import and only serves the API docs, so it loads on the first docs request
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+
+    # Create the schema view for Swagger
+    return get_schema_view(
+        openapi.Info(
+            title="GitHub Parser API Documentation",
+            default_version='v1',
+            description="API documentation for the GitHub Parser backend application",
+            terms_of_service="https://www.google.com/policies/terms/",
+            contact=openapi.Contact(email="contact@example.com"),
+            license=openapi.License(name="BSD License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def _docs_view(ui=None):
+    """A view that builds the drf_yasg schema view (with ``ui``, or raw) when first called"""
+    @lru_cache(maxsize=None)
+    def view():
+        if ui is None:
+            return _schema_view().without_ui(cache_timeout=0)
+        return _schema_view().with_ui(ui, cache_timeout=0)
+
+    def docs(request, *args, **kwargs):
+        return view()(request, *args, **kwargs)
+    docs.csrf_exempt = True
+    return docs
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('backend_app.urls')),
+    path('metrics', app_views.metrics, name='metrics'),
     
     # Swagger URLs
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger<format>/', _docs_view(), name='schema-json'),
+    path('swagger/', _docs_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', _docs_view('redoc'), name='schema-redoc'),
 ]
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BackendAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend_app'
+
+    def ready(self):
+        from mongoengine import register_connection
+
+        # Unlike connect(), this only records the settings: the MongoClient
+        # (and any DNS lookup of a mongodb+srv:// URI) waits for the first query
+        register_connection('default', db=settings.MONGODB_NAME, host=settings.MONGODB_URI)
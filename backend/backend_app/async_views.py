@@ -0,0 +1,427 @@
+"""Async versions of the I/O-heavy views, served when ASYNC_VIEWS is on (the default under ASGI).
+
+GitHub calls and Groq completions run on the event loop, so a request waiting
+on upstream holds a coroutine instead of a worker thread. The event streams
+are async generators too: under ASGI, Django reads a sync iterator to the end
+before sending any of it. Dependency scans and
+update pull requests share their pipelines with the sync views; those run in a
+worker thread via ``sync_to_async`` while the event loop keeps serving.
+"""
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .campaigns import campaign_counts, get_campaign, refresh_campaign
+from .dependencies import ScanError, scan_dependencies
+from .github import github_get_all_pages_async, github_user_async, token_scope
+from .summary import (
+    RepoContextError, gather_repo_context_async, generate_summary_async, get_cached_summary, stream_summary_async
+)
+from .updates import UpdateError, create_update_pull_request
+from .views import repo_page, repos_cache, simplify_repos, sse_event
+
+logger = logging.getLogger(__name__)
+
+_pipeline_executor = None
+_pipeline_executor_lock = threading.Lock()
+
+
+def _run_pipeline(func, *args):
+    """Await a sync pipeline in a thread of its own pool
+
+    Scans and update PRs can each hold a thread for seconds; the event loop's
+    default executor is sized for short calls and would queue them.
+    """
+    global _pipeline_executor
+    if _pipeline_executor is None:
+        with _pipeline_executor_lock:
+            if _pipeline_executor is None:
+                _pipeline_executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_VIEW_SYNC_WORKERS, thread_name_prefix='async-view'
+                )
+    return sync_to_async(func, thread_sensitive=False, executor=_pipeline_executor)(*args)
+
+
+def _response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=DjangoJSONEncoder)
+
+
+def async_api_view(methods):
+    """The async counterpart of ``@api_view``: method check and CSRF exemption, JSON out"""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = _response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            return await view(request, *args, **kwargs)
+        # Token-authenticated API, like every DRF view here
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def _access_token(request):
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1]
+
+
+def _event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _json_body(request):
+    if not request.body:
+        return {}
+    data = json.loads(request.body)
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    return data
+
+
+@async_api_view(['GET'])
+async def github_repos(request):
+    """Fetch repositories for the authenticated user"""
+    try:
+        access_token = _access_token(request)
+        if access_token is None:
+            return _response({
+                'error': 'No authorization token provided'
+            }, status=401)
+
+        # Every page of the user's repositories, cached briefly per token
+        scope = token_scope(access_token)
+        cached_repos = await repos_cache.aget(scope)
+        if cached_repos is not None:
+            simplified_repos = cached_repos.value
+        else:
+            repos_data, status_code = await github_get_all_pages_async(
+                '/user/repos', access_token, params={'sort': 'updated'}
+            )
+            if repos_data is None:
+                logger.warning('Error fetching repos: status %s', status_code)
+                return _response({
+                    'error': 'Failed to fetch repositories'
+                }, status=status_code)
+
+            simplified_repos = simplify_repos(repos_data)
+            await repos_cache.aset(scope, simplified_repos)
+
+        try:
+            simplified_repos, total = repo_page(simplified_repos, request.GET)
+        except ValueError:
+            return _response({
+                'error': 'page and per_page must be integers'
+            }, status=400)
+
+        response = _response(simplified_repos)
+        response['X-Total-Count'] = str(total)
+        return response
+
+    except Exception as e:
+        logger.exception('Error in github_repos')
+        return _response({
+            'error': str(e)
+        }, status=500)
+
+
+@async_api_view(['GET'])
+async def generate_repo_summary(request, repo_name):
+    """Generate a summary for the specified repository"""
+    try:
+        access_token = _access_token(request)
+        if access_token is None:
+            return _response({
+                'error': 'No authorization token provided'
+            }, status=401)
+
+        user, status_code = await github_user_async(access_token)
+        if user is None:
+            return _response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        username = user['login']
+
+        try:
+            context = await gather_repo_context_async(username, repo_name, access_token)
+        except RepoContextError as e:
+            logger.warning('Failed to fetch repo details of %s/%s: %s', username, repo_name, e)
+            return _response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        # Reuse the summary of this exact revision unless a refresh was asked for
+        if request.GET.get('refresh') != '1' and settings.SUMMARY_CACHE_ENABLED:
+            cached_summary = await sync_to_async(get_cached_summary, thread_sensitive=False)(context)
+            if cached_summary is not None:
+                logger.info('Serving cached summary for %s@%s', context.full_name, context.pushed_at)
+                return _response({
+                    'content': cached_summary.content,
+                    'repo_name': repo_name,
+                    'languages': cached_summary.languages,
+                    'cached': True
+                })
+
+        summary = await generate_summary_async(username, context)
+        logger.info('Generated summary of %s: %d characters', context.full_name, len(summary))
+
+        return _response({
+            'content': summary,
+            'repo_name': repo_name,
+            'languages': context.languages,
+            'cached': False
+        })
+
+    except Exception as e:
+        logger.exception('Error generating summary')
+        return _response({
+            'error': f"Failed to generate summary: {str(e)}"
+        }, status=500)
+
+
+async def _summary_event_stream(username, repo_name, context, cached_summary):
+    yield sse_event('meta', {
+        'repo_name': repo_name,
+        'languages': context.languages,
+        'cached': cached_summary is not None
+    })
+    if cached_summary is not None:
+        yield sse_event('token', {'content': cached_summary.content})
+        yield sse_event('done', {'length': len(cached_summary.content)})
+        return
+
+    chunks = stream_summary_async(username, context)
+    try:
+        length = 0
+        async for content in chunks:
+            length += len(content)
+            yield sse_event('token', {'content': content})
+
+        logger.info('Streamed summary of %s: %d characters', context.full_name, length)
+        yield sse_event('done', {'length': length})
+    except Exception as e:
+        logger.exception('Error streaming summary')
+        yield sse_event('error', {'error': f"Failed to generate summary: {str(e)}"})
+    finally:
+        # A client that goes away must not leave the completion holding its followers
+        await chunks.aclose()
+
+
+@async_api_view(['GET'])
+async def stream_repo_summary(request, repo_name):
+    """Stream a summary for the specified repository as Server-Sent Events
+
+    Emits a ``meta`` event with the repository languages, one ``token`` event
+    per completion chunk, then ``done`` (or ``error``).
+    """
+    try:
+        access_token = _access_token(request)
+        if access_token is None:
+            return _response({
+                'error': 'No authorization token provided'
+            }, status=401)
+
+        user, status_code = await github_user_async(access_token)
+        if user is None:
+            return _response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        username = user['login']
+
+        try:
+            context = await gather_repo_context_async(username, repo_name, access_token)
+        except RepoContextError as e:
+            return _response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        cached_summary = None
+        if request.GET.get('refresh') != '1' and settings.SUMMARY_CACHE_ENABLED:
+            cached_summary = await sync_to_async(get_cached_summary, thread_sensitive=False)(context)
+
+        return _event_stream_response(_summary_event_stream(username, repo_name, context, cached_summary))
+
+    except Exception as e:
+        logger.exception('Error streaming summary')
+        return _response({
+            'error': f"Failed to generate summary: {str(e)}"
+        }, status=500)
+
+
+@async_api_view(['GET'])
+async def check_dependencies(request, repo_name):
+    """Check dependencies versions for a repository by recursively searching for dependency files"""
+    try:
+        access_token = _access_token(request)
+        if access_token is None:
+            return _response({
+                'error': 'No authorization token provided'
+            }, status=401)
+
+        user, status_code = await github_user_async(access_token)
+        if user is None:
+            return _response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        try:
+            dependencies = await _run_pipeline(scan_dependencies, user['login'], repo_name, access_token)
+        except ScanError as e:
+            return _response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        if not dependencies['npm'] and not dependencies['pip']:
+            return _response({
+                'message': 'No dependency files found in the repository'
+            })
+
+        return _response(dependencies)
+
+    except Exception as e:
+        logger.exception('Error in check_dependencies')
+        return _response({
+            'error': f"Failed to check dependencies: {str(e)}"
+        }, status=500)
+
+
+@async_api_view(['POST'])
+async def update_dependencies(request, repo_name):
+    """Create one PR with updated dependencies across one or more manifests
+
+    Takes ``files`` as {file_path: updates}; the single-file form with
+    ``file_path`` and ``updates`` is still accepted.
+    """
+    try:
+        access_token = _access_token(request)
+        if access_token is None:
+            return _response({
+                'error': 'No authorization token provided'
+            }, status=401)
+
+        try:
+            data = _json_body(request)
+        except ValueError as e:
+            return _response({
+                'error': f"Invalid request body: {str(e)}"
+            }, status=400)
+
+        files = data.get('files')
+        if files is None and data.get('file_path'):
+            files = {data['file_path']: data.get('updates') or {}}
+        if not files:
+            return _response({
+                'error': 'No files to update'
+            }, status=400)
+
+        user, status_code = await github_user_async(access_token)
+        if user is None:
+            return _response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        try:
+            pull_request = await _run_pipeline(
+                create_update_pull_request, user['login'], repo_name, access_token, files
+            )
+        except UpdateError as e:
+            return _response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        return _response({
+            'message': 'Successfully created pull request',
+            **pull_request
+        })
+
+    except Exception as e:
+        logger.exception('Error in update_dependencies')
+        return _response({
+            'error': f"Failed to update dependencies: {str(e)}"
+        }, status=500)
+
+
+async def _campaign_event_stream(campaign):
+    seen = {}
+    started = last_sent = time.monotonic()
+    while True:
+        for entry in campaign.repos:
+            if seen.get(entry['repo']) != entry:
+                seen[entry['repo']] = entry
+                last_sent = time.monotonic()
+                yield sse_event('repo', entry)
+        if campaign.status in ('succeeded', 'failed'):
+            yield sse_event('done', {
+                'status': campaign.status,
+                'counts': campaign_counts(campaign),
+                'error': campaign.error
+            })
+            return
+        now = time.monotonic()
+        if now - started >= settings.CAMPAIGN_STREAM_MAX_DURATION:
+            yield sse_event('timeout', {
+                'status': campaign.status,
+                'counts': campaign_counts(campaign)
+            })
+            return
+        if now - last_sent >= settings.CAMPAIGN_STREAM_HEARTBEAT:
+            # A comment line: clients ignore it, but writing it surfaces a closed connection
+            yield ': keep-alive\n\n'
+            last_sent = now
+        await asyncio.sleep(settings.CAMPAIGN_STREAM_INTERVAL)
+        campaign = await sync_to_async(refresh_campaign, thread_sensitive=False)(campaign)
+
+
+@async_api_view(['GET'])
+async def stream_campaign(request, campaign_id):
+    """Stream campaign progress as Server-Sent Events
+
+    Emits a ``repo`` event whenever a repository's state changes, then
+    ``done`` with per-state counts once the campaign has finished. Quiet
+    stretches get a keep-alive comment, and a stream open for longer than
+    CAMPAIGN_STREAM_MAX_DURATION ends with a ``timeout`` event.
+    """
+    try:
+        access_token = _access_token(request)
+        if access_token is None:
+            return _response({
+                'error': 'No authorization token provided'
+            }, status=401)
+
+        user, status_code = await github_user_async(access_token)
+        if user is None:
+            return _response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        campaign = await sync_to_async(get_campaign, thread_sensitive=False)(campaign_id, user['login'])
+        if campaign is None:
+            return _response({
+                'error': 'Campaign not found'
+            }, status=404)
+
+        return _event_stream_response(_campaign_event_stream(campaign))
+
+    except Exception as e:
+        logger.exception('Error in stream_campaign')
+        return _response({
+            'error': f"Failed to stream campaign: {str(e)}"
+        }, status=500)
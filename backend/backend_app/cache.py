@@ -0,0 +1,235 @@
+"""Two-tier caches: an in-process LRU in front of a MongoDB collection."""
+import logging
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from mongoengine.errors import MongoEngineException
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from . import metrics
+from .models import CacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Every TieredCache registers itself here so its counters can be reported
+CACHES = {}
+
+CacheLookup = namedtuple('CacheLookup', ['value', 'fresh'])
+
+
+class LRUCache:
+    """Thread-safe, size-bounded mapping of key -> (value, stored_at)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, stored_at):
+        """Store an entry and return how many old entries were evicted"""
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    """An LRU tier backed by a persistent MongoDB tier.
+
+    Entries younger than ``ttl`` are fresh. Entries between ``ttl`` and
+    ``ttl + stale_ttl`` are still returned, flagged as stale, so callers can
+    serve them while refreshing in the background. Older entries are misses.
+    A ``ttl`` of None means entries never expire.
+
+    The ``a``-prefixed methods are for async views: the MongoDB tier is read
+    and written in a worker thread so the event loop never blocks on it.
+    """
+
+    def __init__(self, namespace, ttl=None, stale_ttl=0, maxsize=1024, persistent=True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.persistent = persistent and getattr(settings, 'CACHE_PERSISTENT_TIER', True)
+        self.memory = LRUCache(maxsize)
+        self.counters = Counter()
+        self._counter_lock = threading.Lock()
+        CACHES[namespace] = self
+
+    def count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] += amount
+
+    def _freshness(self, stored_at, now):
+        """True if fresh, False if stale but servable, None if expired"""
+        if self.ttl is None:
+            return True
+        age = (now - stored_at).total_seconds()
+        if age < self.ttl:
+            return True
+        if age < self.ttl + self.stale_ttl:
+            return False
+        return None
+
+    def _expires_at(self, stored_at):
+        if self.ttl is None:
+            return None
+        return stored_at + timedelta(seconds=self.ttl + self.stale_ttl)
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def _memory_lookup(self, keys, now):
+        found = {}
+        remaining = []
+        for key in keys:
+            entry = self.memory.get(key)
+            fresh = self._freshness(entry[1], now) if entry else None
+            if fresh is None:
+                remaining.append(key)
+            else:
+                found[key] = CacheLookup(entry[0], fresh)
+                self.count('memory_hits')
+                if not fresh:
+                    self.count('stale_hits')
+        return found, remaining
+
+    def _persistent_lookup(self, keys, now):
+        found = {}
+        for document in self._load(keys):
+            fresh = self._freshness(document.stored_at, now)
+            if fresh is None:
+                continue
+            found[document.key] = CacheLookup(document.value, fresh)
+            self.count('evictions', self.memory.set(document.key, document.value, document.stored_at))
+            self.count('persistent_hits')
+            if not fresh:
+                self.count('stale_hits')
+        return found
+
+    def get_many(self, keys):
+        """Return {key: CacheLookup} for every key found in either tier"""
+        now = datetime.utcnow()
+        found, remaining = self._memory_lookup(keys, now)
+        if remaining and self.persistent:
+            found.update(self._persistent_lookup(remaining, now))
+        self.count('misses', len(keys) - len(found))
+        return found
+
+    async def aget_many(self, keys):
+        now = datetime.utcnow()
+        found, remaining = self._memory_lookup(keys, now)
+        if remaining and self.persistent:
+            found.update(await sync_to_async(self._persistent_lookup, thread_sensitive=False)(remaining, now))
+        self.count('misses', len(keys) - len(found))
+        return found
+
+    async def aget(self, key):
+        return (await self.aget_many([key])).get(key)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, values):
+        stored_at = datetime.utcnow()
+        for key, value in values.items():
+            self.count('evictions', self.memory.set(key, value, stored_at))
+        if values and self.persistent:
+            self._store(values, stored_at)
+
+    async def aset_many(self, values):
+        stored_at = datetime.utcnow()
+        for key, value in values.items():
+            self.count('evictions', self.memory.set(key, value, stored_at))
+        if values and self.persistent:
+            await sync_to_async(self._store, thread_sensitive=False)(values, stored_at)
+
+    async def aset(self, key, value):
+        await self.aset_many({key: value})
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.persistent:
+            try:
+                CacheEntry.objects(namespace=self.namespace, key=key).delete()
+            except (MongoEngineException, PyMongoError) as e:
+                logger.warning('Error deleting %s cache entry: %s', self.namespace, e)
+
+    def _load(self, keys):
+        try:
+            return list(CacheEntry.objects(namespace=self.namespace, key__in=keys))
+        except (MongoEngineException, PyMongoError) as e:
+            logger.warning('Error reading %s cache from MongoDB: %s', self.namespace, e)
+            return []
+
+    def _store(self, values, stored_at):
+        expires_at = self._expires_at(stored_at)
+        operations = [
+            UpdateOne(
+                {'namespace': self.namespace, 'key': key},
+                {'$set': {'value': value, 'stored_at': stored_at, 'expires_at': expires_at}},
+                upsert=True
+            )
+            for key, value in values.items()
+        ]
+        try:
+            CacheEntry._get_collection().bulk_write(operations, ordered=False)
+        except (MongoEngineException, PyMongoError) as e:
+            logger.warning('Error writing %s cache to MongoDB: %s', self.namespace, e)
+
+    def stats(self):
+        with self._counter_lock:
+            counters = dict(self.counters)
+        hits = counters.get('memory_hits', 0) + counters.get('persistent_hits', 0)
+        lookups = hits + counters.get('misses', 0)
+        return {
+            **counters,
+            'size': len(self.memory),
+            'maxsize': self.memory.maxsize,
+            'hit_rate': round(hits / lookups, 4) if lookups else None,
+        }
+
+
+def collect_cache_stats():
+    """Counters for every registered cache, keyed by namespace"""
+    return {namespace: cache.stats() for namespace, cache in CACHES.items()}
+
+
+def _cache_metrics():
+    events = metrics.Counter('cache_events_total', 'Hits, misses and other counted events per cache', ('cache', 'event'))
+    entries = metrics.Gauge('cache_entries', 'Entries held in memory per cache', ('cache',))
+    for namespace, stats in collect_cache_stats().items():
+        for event, value in stats.items():
+            # Sizes and rates (hit_rate, revalidation_hit_rate) are not counters
+            if event not in ('size', 'maxsize') and not event.endswith('hit_rate'):
+                events.inc(value, cache=namespace, event=event)
+        entries.set(stats['size'], cache=namespace)
+    return events, entries
+
+
+metrics.registry.add_collector(_cache_metrics)
@@ -0,0 +1,305 @@
+"""Dependency update campaigns: one version policy rolled out across many repositories."""
+import logging
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from packaging.version import InvalidVersion, Version
+
+from .dependencies import MANIFEST_ECOSYSTEMS, ScanError, scan_dependencies
+from .github import token_scope
+from .metrics import operation_trace
+from .models import Campaign
+from .ratelimit import bulk_priority, scheduler
+from .registry import fetch_latest_versions
+from .updates import UpdateError, create_update_pull_request
+
+logger = logging.getLogger(__name__)
+
+# Repositories in these states are not touched again when a campaign resumes
+FINISHED_REPO_STATES = ('updated', 'up_to_date', 'failed')
+
+# Every repository of a campaign gets its pull request from this branch, so
+# a resumed campaign finds the pull request an interrupted run already opened
+CAMPAIGN_BRANCH = 'dependency-updates-{campaign_id}'
+
+# Declared specs a campaign may rewrite: one plain version, optionally behind a caret,
+# tilde or comparison. Ranges with more than one clause, pip extras, workspace, file
+# and git references, tags and unpinned requirements are left alone.
+REWRITABLE_SPECS = {
+    'npm': re.compile(r'^(\^|~|>=|=)?v?\d+(\.\d+)*$'),
+    'pip': re.compile(r'^(==|>=)\d+(\.\d+)*$'),
+}
+
+# Campaigns whose driver is running in this process
+_running = set()
+_running_lock = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class CampaignError(Exception):
+    """The campaign request is invalid; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def campaign_executor():
+    """Return the pool running campaign drivers, creating it on first use
+
+    Drivers are long-lived, so they get a pool of their own rather than
+    taking job workers away from scans and webhook precomputation.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.CAMPAIGN_WORKERS, thread_name_prefix='campaign-driver'
+                )
+    return _executor
+
+
+def _parse_policy(policy):
+    if not isinstance(policy, list) or not policy:
+        raise CampaignError('policy must be a non-empty list of {ecosystem, package, version} targets')
+    targets = []
+    for target in policy:
+        if not isinstance(target, dict) or target.get('ecosystem') not in MANIFEST_ECOSYSTEMS.values() \
+                or not target.get('package'):
+            raise CampaignError(f'Invalid policy target: {target}')
+        targets.append({
+            'ecosystem': target['ecosystem'],
+            'package': target['package'],
+            'version': target.get('version'),
+        })
+    return targets
+
+
+def _parse_repos(repos, user_login):
+    if not isinstance(repos, list) or not repos:
+        raise CampaignError('repos must be a non-empty list of repository names')
+    if len(repos) > settings.CAMPAIGN_MAX_REPOS:
+        raise CampaignError(f'A campaign covers at most {settings.CAMPAIGN_MAX_REPOS} repositories')
+    # "name" means one of the user's own repositories
+    names = [repo if '/' in repo else f'{user_login}/{repo}' for repo in repos]
+    return [{'repo': name, 'status': 'pending'} for name in dict.fromkeys(names)]
+
+
+def _is_behind(current, target):
+    """True if ``current`` is a version older than ``target``; anything unparseable is not behind"""
+    try:
+        return Version(current) < Version(target)
+    except InvalidVersion:
+        return False
+
+
+def _rewritable(row):
+    pattern = REWRITABLE_SPECS.get(row['ecosystem'])
+    return pattern is not None and pattern.match(row.get('spec') or '') is not None
+
+
+def files_to_update(rows, targets):
+    """Return {file_path: updates} for every scan row behind its policy target
+
+    Only rows whose spec names a plain version are considered, so the pull
+    request never replaces a spec the parser did not understand.
+    """
+    files = {}
+    for row in rows:
+        target = targets.get((row['ecosystem'], row['package']))
+        if target is not None and _rewritable(row) and _is_behind(row['current'], target):
+            files.setdefault(row['file_path'], {})[row['package']] = {
+                'current': row['current'],
+                'latest': target
+            }
+    return files
+
+
+def _set_repo(campaign_id, index, **fields):
+    fields['updated_at'] = datetime.utcnow()
+    Campaign._get_collection().update_one(
+        {'campaign_id': campaign_id},
+        {'$set': {f'repos.{index}.{name}': value for name, value in fields.items()}}
+    )
+
+
+def _run_repo(campaign_id, index, repo, targets, access_token):
+    # Pool threads start with an empty context, so each repository sets its own
+    with bulk_priority(), operation_trace('campaign'):
+        _process_repo(campaign_id, index, repo, targets, access_token)
+
+
+def _process_repo(campaign_id, index, repo, targets, access_token):
+    owner, repo_name = repo.split('/', 1)
+    try:
+        # The scheduler holds bulk calls back while the token's budget is low;
+        # say so instead of appearing stuck in 'scanning'
+        if scheduler.bulk_pause(token_scope(access_token)):
+            _set_repo(campaign_id, index, status='waiting')
+        _set_repo(campaign_id, index, status='scanning')
+        result = scan_dependencies(owner, repo_name, access_token)
+        files = files_to_update(result['rows'], targets)
+        if not files:
+            _set_repo(campaign_id, index, status='up_to_date', files=[])
+            return
+
+        branch = CAMPAIGN_BRANCH.format(campaign_id=campaign_id)
+        _set_repo(campaign_id, index, status='updating', files=sorted(files), branch=branch)
+        pull_request = create_update_pull_request(owner, repo_name, access_token, files, branch=branch)
+        _set_repo(
+            campaign_id, index,
+            status='updated',
+            pr_url=pull_request['pr_url'],
+            pr_number=pull_request['pr_number'],
+            files=pull_request['files']
+        )
+    except (ScanError, UpdateError) as e:
+        _set_repo(campaign_id, index, status='failed', error=str(e))
+    except Exception as e:
+        logger.exception('Error in campaign %s for %s', campaign_id, repo)
+        _set_repo(campaign_id, index, status='failed', error=str(e))
+
+
+def _resolve_policy(campaign):
+    """Pin every target without a version to the latest release, once per campaign"""
+    unpinned = [(target['ecosystem'], target['package']) for target in campaign.policy if not target.get('version')]
+    if unpinned:
+        latest = fetch_latest_versions(unpinned)
+        for target in campaign.policy:
+            if not target.get('version'):
+                target['version'] = latest.get((target['ecosystem'], target['package']))
+        Campaign.objects(campaign_id=campaign.campaign_id).update_one(set__policy=campaign.policy)
+    return {
+        (target['ecosystem'], target['package']): target['version']
+        for target in campaign.policy if target['version']
+    }
+
+
+def _run_campaign(campaign_id, access_token):
+    with _running_lock:
+        if campaign_id in _running:
+            return
+        _running.add(campaign_id)
+    try:
+        Campaign.objects(campaign_id=campaign_id).update_one(
+            set__status='running', set__started_at=datetime.utcnow(), unset__finished_at=True, unset__error=True
+        )
+        campaign = Campaign.objects(campaign_id=campaign_id).first()
+        with operation_trace('campaign'):
+            targets = _resolve_policy(campaign)
+        pending = [
+            (index, entry['repo']) for index, entry in enumerate(campaign.repos)
+            if entry['status'] not in FINISHED_REPO_STATES
+        ]
+        logger.info('Campaign %s: %d of %d repositories to process', campaign_id, len(pending), len(campaign.repos))
+
+        # Repositories are independent; the pool bounds how many are in flight
+        with ThreadPoolExecutor(max_workers=settings.CAMPAIGN_CONCURRENCY, thread_name_prefix='campaign') as pool:
+            for index, repo in pending:
+                pool.submit(_run_repo, campaign_id, index, repo, targets, access_token)
+
+        Campaign.objects(campaign_id=campaign_id).update_one(
+            set__status='succeeded', set__finished_at=datetime.utcnow()
+        )
+    except Exception as e:
+        logger.exception('Error in campaign %s', campaign_id)
+        Campaign.objects(campaign_id=campaign_id).update_one(
+            set__status='failed', set__error=str(e), set__finished_at=datetime.utcnow()
+        )
+    finally:
+        with _running_lock:
+            _running.discard(campaign_id)
+
+
+def submit_campaign(user_login, policy, repos, access_token):
+    """Record a new campaign and start it in the background; raises CampaignError on bad input"""
+    campaign = Campaign(
+        campaign_id=uuid.uuid4().hex,
+        user=user_login,
+        policy=_parse_policy(policy),
+        repos=_parse_repos(repos, user_login),
+    ).save()
+    # The token only lives in the driver's arguments, never in the campaign record
+    campaign_executor().submit(_run_campaign, campaign.campaign_id, access_token)
+    return campaign
+
+
+def resume_campaign(campaign, access_token):
+    """Restart an interrupted campaign; finished repositories are skipped"""
+    if campaign.status != 'succeeded':
+        campaign_executor().submit(_run_campaign, campaign.campaign_id, access_token)
+    return campaign
+
+
+def _last_progress(campaign):
+    """When the campaign's driver last recorded anything"""
+    return max(
+        [campaign.started_at or campaign.created_at] +
+        [entry['updated_at'] for entry in campaign.repos if entry.get('updated_at')]
+    )
+
+
+def _expire(campaign):
+    """Mark the campaign failed if its driver has recorded nothing for CAMPAIGN_TIMEOUT
+
+    Drivers are threads of the web process, so a restart loses them without a
+    word; this is how such campaigns finish. A failed campaign can be resumed.
+    """
+    if campaign.status not in ('queued', 'running') or campaign.campaign_id in _running:
+        return campaign
+    since = _last_progress(campaign)
+    if datetime.utcnow() - since < timedelta(seconds=settings.CAMPAIGN_TIMEOUT):
+        return campaign
+    Campaign.objects(campaign_id=campaign.campaign_id, status=campaign.status).update_one(
+        set__status='failed',
+        set__error=(
+            f'No progress for {settings.CAMPAIGN_TIMEOUT} seconds; its driver was lost. '
+            'Resume the campaign to continue.'
+        ),
+        set__finished_at=datetime.utcnow()
+    )
+    logger.warning(
+        'Campaign %s was %s with no progress since %s; marked failed', campaign.campaign_id, campaign.status, since
+    )
+    campaign.reload()
+    return campaign
+
+
+def get_campaign(campaign_id, user_login):
+    """Return the user's campaign with this id, or None"""
+    campaign = Campaign.objects(campaign_id=campaign_id, user=user_login).first()
+    return _expire(campaign) if campaign is not None else None
+
+
+def refresh_campaign(campaign):
+    """Reload ``campaign`` from the store, failing it if its driver was lost"""
+    campaign.reload()
+    return _expire(campaign)
+
+
+def campaign_counts(campaign):
+    counts = {}
+    for entry in campaign.repos:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    return counts
+
+
+def serialize_campaign(campaign):
+    return {
+        'campaign_id': campaign.campaign_id,
+        'status': campaign.status,
+        'policy': campaign.policy,
+        'counts': campaign_counts(campaign),
+        'repos': campaign.repos,
+        'error': campaign.error,
+        'created_at': campaign.created_at,
+        'started_at': campaign.started_at,
+        'finished_at': campaign.finished_at,
+    }
@@ -0,0 +1,194 @@
+"""Shared outbound HTTP clients used by every view."""
+import asyncio
+import contextvars
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from django.conf import settings
+
+from .metrics import AsyncInstrumentedTransport, InstrumentedTransport
+from .ratelimit import BULK, current_priority
+
+_client = None
+# Fan-out pools by request priority
+_executors = {}
+_groq_client = None
+_client_lock = threading.Lock()
+# An AsyncClient is bound to the event loop it first runs on; one per loop
+_loop_clients = weakref.WeakKeyDictionary()
+_loop_groq_clients = weakref.WeakKeyDictionary()
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _instrumented(transport):
+    if isinstance(transport, httpx.AsyncBaseTransport):
+        return AsyncInstrumentedTransport(transport)
+    return InstrumentedTransport(transport)
+
+
+def _client_options(transport_class, max_connections):
+    http2 = settings.HTTP_CLIENT_HTTP2 and _http2_available()
+    keepalive_expiry = settings.HTTP_CLIENT_KEEPALIVE_EXPIRY
+
+    # Each busy upstream host gets its own pool so one slow host cannot
+    # starve the connections the others need
+    mounts = {
+        f'all://{host}': _instrumented(transport_class(
+            http2=http2,
+            retries=1,
+            limits=httpx.Limits(
+                max_connections=limit,
+                max_keepalive_connections=limit,
+                keepalive_expiry=keepalive_expiry
+            )
+        ))
+        for host, limit in settings.HTTP_CLIENT_HOST_LIMITS.items()
+    }
+    # Every transport is wrapped so each call is timed (see metrics.py)
+    transport = _instrumented(transport_class(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+    ))
+    return dict(
+        transport=transport,
+        mounts=mounts,
+        follow_redirects=True,
+        timeout=httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT, connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT),
+    )
+
+
+def _build_client():
+    return httpx.Client(**_client_options(httpx.HTTPTransport, settings.HTTP_CLIENT_MAX_CONNECTIONS))
+
+
+def http_client():
+    """Return the process-wide pooled client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+class _LoopClient:
+    """The AsyncClient of one event loop, with a request gate per upstream host"""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            **_client_options(httpx.AsyncHTTPTransport, settings.HTTP_CLIENT_ASYNC_MAX_CONNECTIONS)
+        )
+        self.gates = {}
+
+    def gate(self, host):
+        gate = self.gates.get(host)
+        if gate is None:
+            limit = settings.HTTP_CLIENT_HOST_LIMITS.get(host, settings.HTTP_CLIENT_ASYNC_MAX_CONNECTIONS)
+            gate = self.gates[host] = asyncio.Semaphore(limit)
+        return gate
+
+
+def _loop_client():
+    loop = asyncio.get_running_loop()
+    loop_client = _loop_clients.get(loop)
+    if loop_client is None:
+        loop_client = _loop_clients[loop] = _LoopClient()
+    return loop_client
+
+
+def async_host_gate(url):
+    """Semaphore bounding this event loop's in-flight requests to the host of ``url``
+
+    httpcore re-checks every connection for every queued request whenever one
+    starts or finishes, which over anyio costs more CPU than the requests
+    themselves once a few dozen pile up in a pool; waiting here is cheap.
+    """
+    return _loop_client().gate(httpx.URL(url).host)
+
+
+async def async_request(method, url, **kwargs):
+    """Send a request with the running event loop's pooled AsyncClient,
+    at most one per pooled connection in flight per host"""
+    loop_client = _loop_client()
+    async with loop_client.gate(httpx.URL(url).host):
+        return await loop_client.client.request(method, url, **kwargs)
+
+
+def groq_client():
+    """Return the process-wide Groq client, creating it on first use
+
+    The groq package takes a noticeable share of start-up time to import, so
+    it is only loaded once a summary is actually requested.
+    """
+    global _groq_client
+    if _groq_client is None:
+        with _client_lock:
+            if _groq_client is None:
+                import groq
+                _groq_client = groq.Groq(
+                    api_key=os.environ.get('GROQ_API_KEY'),
+                    http_client=httpx.Client(transport=InstrumentedTransport(httpx.HTTPTransport()))
+                )
+    return _groq_client
+
+
+def async_groq_client():
+    """Return the AsyncGroq client of the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    client = _loop_groq_clients.get(loop)
+    if client is None:
+        import groq
+        client = _loop_groq_clients[loop] = groq.AsyncGroq(
+            api_key=os.environ.get('GROQ_API_KEY'),
+            # Sized like the host gate, so completions never queue inside the pool
+            http_client=httpx.AsyncClient(transport=AsyncInstrumentedTransport(httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=settings.HTTP_CLIENT_ASYNC_MAX_CONNECTIONS)
+            )))
+        )
+    return client
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """Runs each task in a copy of the submitter's context, so context variables
+    such as the GitHub request priority follow the work into the pool"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def fanout_executor():
+    """Return the thread pool used to issue independent upstream calls in parallel
+
+    Only submit leaf work (single HTTP calls) to it; a task that waits on
+    another task in the same pool can deadlock when the pool is saturated.
+    Bulk work gets a pool of its own: its calls can wait in the rate-limit
+    scheduler until the budget resets, and must not hold the threads
+    interactive requests fan out on meanwhile.
+    """
+    priority = current_priority()
+    executor = _executors.get(priority)
+    if executor is None:
+        with _client_lock:
+            executor = _executors.get(priority)
+            if executor is None:
+                if priority == BULK:
+                    workers, prefix = settings.HTTP_CLIENT_BULK_FANOUT_WORKERS, 'fanout-bulk'
+                else:
+                    workers, prefix = settings.HTTP_CLIENT_FANOUT_WORKERS, 'fanout'
+                executor = _executors[priority] = ContextThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix=prefix
+                )
+    return executor
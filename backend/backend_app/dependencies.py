@@ -0,0 +1,450 @@
+"""Dependency scanning: find manifests in a repository and compare against the registries."""
+import hashlib
+import io
+import json
+import logging
+import re
+import tarfile
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from .cache import TieredCache
+from .clients import fanout_executor
+from .dependency_index import declared_version, index_scan
+from .github import github_get, github_stream, token_scope
+from .registry import fetch_latest_versions
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+BLOB_ACCEPT = 'application/vnd.github.raw+json'
+
+# Manifest contents keyed by git blob SHA. A SHA names immutable content, so
+# entries never expire and are shared across scans, users and repositories.
+blob_cache = TieredCache('manifest_blobs', ttl=None, maxsize=settings.BLOB_CACHE_SIZE)
+
+# The manifests of a tree ([path, blob sha] pairs) keyed by tree SHA; immutable too, but
+# every push makes a new one, so they expire once nobody is likely to scan that head again
+tree_cache = TieredCache('git_tree_manifests', ttl=settings.TREE_CACHE_TTL, maxsize=settings.TREE_CACHE_SIZE)
+
+# Declared [package, spec] pairs per (repo, manifest path, blob SHA), and the
+# {path: blob SHA} manifest set of each repository's last scan, so re-scans
+# only parse what changed
+manifest_scan_cache = TieredCache('manifest_scans', ttl=None, maxsize=settings.MANIFEST_SCAN_CACHE_SIZE)
+scan_state_cache = TieredCache('repo_scans', ttl=None, maxsize=settings.SCAN_STATE_CACHE_SIZE)
+
+scan_flight = SingleFlight('dependency_scan')
+
+# Bump when the parsers change what they return, so stored parses are not reused
+MANIFEST_PARSER_VERSION = '3'
+
+MANIFEST_ECOSYSTEMS = {
+    'package.json': 'npm',
+    'requirements.txt': 'pip',
+}
+
+
+class ScanError(Exception):
+    """The repository could not be scanned; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class RepoTree:
+    """The manifests of a branch head: ``blobs`` maps manifest path -> blob SHA"""
+    ref: str
+    commit_sha: str
+    sha: str
+    blobs: dict = field(default_factory=dict)
+
+
+def manifest_ecosystem(path):
+    """Return 'npm' or 'pip' for a manifest path, None for any other file"""
+    for suffix, ecosystem in MANIFEST_ECOSYSTEMS.items():
+        if path.endswith(suffix):
+            return ecosystem
+    return None
+
+
+def parse_package_json(content):
+    """Return [(package, spec)] from dependencies and devDependencies"""
+    package_data = json.loads(content)
+
+    # Combine all dependencies
+    all_deps = {}
+    if 'dependencies' in package_data:
+        all_deps.update(package_data['dependencies'])
+    if 'devDependencies' in package_data:
+        all_deps.update(package_data['devDependencies'])
+    return list(all_deps.items())
+
+
+def parse_requirements(content):
+    """Return [(package, spec)] from a requirements.txt; unpinned packages get an empty spec
+
+    The spec keeps every clause and any extras (``[redis]>=2.0,<3``) with the
+    whitespace removed, so callers can tell a plain pin from a range.
+    """
+    declared = []
+    for line in content.split('\n'):
+        if line and not line.startswith('#'):
+            # Parse package name, extras and the specifier up to any marker or comment
+            match = re.match(r'^([a-zA-Z0-9\-_]+)\s*(\[[^\]]*\])?\s*([=!<>~@][^;#]*)?', line.strip())
+            if match:
+                spec = (match.group(2) or '') + (match.group(3) or '')
+                declared.append((match.group(1), re.sub(r'\s+', '', spec)))
+    return declared
+
+
+def resolve_current(ecosystem, spec):
+    """The version a declared spec pins or starts from; unpinned pip packages get 0.0.0"""
+    return declared_version(ecosystem, spec) or ('' if ecosystem == 'npm' else '0.0.0')
+
+
+MANIFEST_PARSERS = {
+    'npm': parse_package_json,
+    'pip': parse_requirements,
+}
+
+
+def resolve_head(owner, repo_name, access_token, ref=None):
+    """Return ``(branch, commit_sha, tree_sha)`` for ``ref`` or the default branch"""
+    if ref is None:
+        repo_response = github_get(f'/repos/{owner}/{repo_name}', access_token)
+        if repo_response.status_code != 200:
+            raise ScanError('Could not fetch repository information', repo_response.status_code)
+        ref = repo_response.json()['default_branch']
+
+    branch_response = github_get(f'/repos/{owner}/{repo_name}/branches/{ref}', access_token)
+    if branch_response.status_code != 200:
+        raise ScanError(f'Could not resolve branch {ref}', branch_response.status_code)
+    commit = branch_response.json()['commit']
+    return ref, commit['sha'], commit['commit']['tree']['sha']
+
+
+def _get_tree(owner, repo_name, tree_sha, access_token, recursive):
+    params = {'recursive': 1} if recursive else None
+    # Trees are immutable and cached by SHA in tree_cache, so no conditional copy is kept
+    response = github_get(
+        f'/repos/{owner}/{repo_name}/git/trees/{tree_sha}', access_token, params=params, conditional=False
+    )
+    if response.status_code != 200:
+        raise ScanError('Could not access repository tree', response.status_code)
+    return response.json()
+
+
+def _walk_tree(owner, repo_name, tree_sha, access_token):
+    """Return {path: blob sha} for every blob under the tree
+
+    GitHub truncates recursive listings of very large trees. A truncated
+    tree is re-read one level deep and each of its subtrees is listed
+    recursively, all subtrees of a level in parallel.
+    """
+    blobs = {}
+    pending = [('', tree_sha)]
+    while pending:
+        futures = [
+            (prefix, fanout_executor().submit(_get_tree, owner, repo_name, sha, access_token, True))
+            for prefix, sha in pending
+        ]
+        pending = []
+        for prefix, future in futures:
+            tree = future.result()
+            if tree.get('truncated'):
+                tree = _get_tree(owner, repo_name, tree['sha'], access_token, False)
+                pending.extend(
+                    (f"{prefix}{item['path']}/", item['sha']) for item in tree['tree'] if item['type'] == 'tree'
+                )
+            for item in tree['tree']:
+                if item['type'] == 'blob':
+                    blobs[f"{prefix}{item['path']}"] = item['sha']
+    return blobs
+
+
+def fetch_tree(owner, repo_name, access_token, ref=None):
+    """Return the RepoTree of ``ref``, or of the repository's default branch
+
+    The branch head is always resolved (a cheap conditional request), but the
+    tree's manifests are cached by its SHA, so an unchanged commit needs no
+    tree fetch at all. Only manifest paths are kept: a monorepo's full
+    listing can run to megabytes per commit.
+    """
+    return load_tree(owner, repo_name, access_token, *resolve_head(owner, repo_name, access_token, ref=ref))
+
+
+def load_tree(owner, repo_name, access_token, ref, commit_sha, tree_sha):
+    """Return the RepoTree of a head already resolved with resolve_head"""
+    cached = tree_cache.get(tree_sha)
+    if cached is not None:
+        return RepoTree(ref, commit_sha, tree_sha, dict(cached.value))
+
+    blobs = {
+        path: sha for path, sha in _walk_tree(owner, repo_name, tree_sha, access_token).items()
+        if manifest_ecosystem(path)
+    }
+    tree_cache.set(tree_sha, sorted(blobs.items()))
+    return RepoTree(ref, commit_sha, tree_sha, blobs)
+
+
+def _download_blob(owner, repo_name, sha, access_token):
+    # The raw media type skips the base64/JSON wrapping and works past 1 MB
+    response = github_get(
+        f'/repos/{owner}/{repo_name}/git/blobs/{sha}',
+        access_token,
+        accept=BLOB_ACCEPT,
+        conditional=False
+    )
+    if response.status_code != 200:
+        logger.warning('Could not fetch blob %s: status %s', sha, response.status_code)
+        return None
+    try:
+        return response.content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        logger.warning('Blob %s is not valid UTF-8', sha)
+        return None
+
+
+def _download_blobs(owner, repo_name, shas, access_token):
+    futures = {
+        sha: fanout_executor().submit(_download_blob, owner, repo_name, sha, access_token)
+        for sha in shas
+    }
+    downloaded = {}
+    for sha, future in futures.items():
+        try:
+            text = future.result()
+        except Exception as e:
+            logger.warning('Error fetching blob %s: %s', sha, e)
+            continue
+        if text is not None:
+            downloaded[sha] = text
+    return downloaded
+
+
+def git_blob_sha(data):
+    """The SHA-1 git assigns to a blob with this content"""
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class _ResponseStream(io.RawIOBase):
+    """Read-only file object over a streaming HTTP response body"""
+
+    def __init__(self, response):
+        self._chunks = response.iter_bytes()
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def fetch_manifests_from_archive(owner, repo_name, wanted, access_token, ref=None):
+    """Return {sha: text} for the ``wanted`` {path: sha} manifests, read from one tarball
+
+    The archive is decompressed as it streams in and only matching members
+    are read, so nothing touches disk and the archive is never held in
+    memory. Members whose content does not hash to the expected blob SHA
+    (the branch moved since the tree was read) are skipped.
+    """
+    archive_url = f'/repos/{owner}/{repo_name}/tarball' + (f'/{ref}' if ref else '')
+    contents = {}
+    with github_stream(archive_url, access_token) as response:
+        if response.status_code != 200:
+            logger.warning('Could not download archive of %s/%s: status %s', owner, repo_name, response.status_code)
+            return contents
+        with tarfile.open(fileobj=_ResponseStream(response), mode='r|gz') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                # Members are prefixed with an "{owner}-{repo}-{sha}/" directory
+                sha = wanted.get(member.name.partition('/')[2])
+                if sha is None:
+                    continue
+                data = archive.extractfile(member).read()
+                if git_blob_sha(data) != sha:
+                    continue
+                try:
+                    contents[sha] = data.decode('utf-8-sig')
+                except UnicodeDecodeError:
+                    logger.warning('Blob %s is not valid UTF-8', sha)
+    return contents
+
+
+def load_manifests(owner, repo_name, manifests, access_token, ref=None):
+    """Return {sha: text} for the given [(path, sha)] manifests
+
+    Cached blobs are used as they are. When at least SCAN_ARCHIVE_THRESHOLD
+    manifests are missing, the repository tarball is streamed once instead
+    of fetching each blob; anything the archive did not yield is then
+    fetched blob by blob.
+    """
+    shas = sorted({sha for _, sha in manifests})
+    contents = {sha: entry.value for sha, entry in blob_cache.get_many(shas).items()}
+    missing = {path: sha for path, sha in manifests if sha not in contents}
+
+    downloaded = {}
+    if len(set(missing.values())) >= settings.SCAN_ARCHIVE_THRESHOLD:
+        logger.info('Scanning %s/%s from its archive (%d manifests)', owner, repo_name, len(missing))
+        try:
+            downloaded = fetch_manifests_from_archive(owner, repo_name, missing, access_token, ref=ref)
+        except (tarfile.TarError, OSError, EOFError) as e:
+            logger.warning('Error reading archive of %s/%s: %s', owner, repo_name, e)
+
+    remaining = sorted({sha for sha in missing.values() if sha not in downloaded})
+    downloaded.update(_download_blobs(owner, repo_name, remaining, access_token))
+    blob_cache.set_many(downloaded)
+    contents.update(downloaded)
+    return contents
+
+
+def _report(progress, stage, done, total):
+    if progress is not None:
+        progress(stage, done, total)
+
+
+def _manifest_key(owner, repo_name, path, sha):
+    return f'{owner}/{repo_name}:{path}:{sha}:v{MANIFEST_PARSER_VERSION}'
+
+
+def _parse_manifest(path, text):
+    ecosystem = manifest_ecosystem(path)
+    try:
+        return [[pkg, spec] for pkg, spec in MANIFEST_PARSERS[ecosystem](text)]
+    except Exception as e:
+        # The blob never changes, so neither would the outcome of parsing it again
+        logger.warning('Error checking %s dependencies in %s: %s', ecosystem, path, e)
+        return []
+
+
+def _parse_manifests(owner, repo_name, tree, access_token, reuse):
+    """Return {path: [[package, spec], ...]} for every manifest in the tree
+
+    Manifests whose (path, blob SHA) was parsed by an earlier scan are
+    reused; only the others are downloaded and parsed. The tree is diffed
+    against the previous scan of the repository to fill in ``reuse``.
+    """
+    current = dict(sorted(tree.blobs.items()))
+    repo_key = f'{owner}/{repo_name}'
+    previous_scan = scan_state_cache.get(repo_key)
+    previous = dict(previous_scan.value['manifests']) if previous_scan is not None else {}
+
+    keys = {path: _manifest_key(owner, repo_name, path, sha) for path, sha in current.items()}
+    stored = manifest_scan_cache.get_many(list(keys.values()))
+    parsed = {path: stored[key].value for path, key in keys.items() if key in stored}
+
+    to_parse = [(path, sha) for path, sha in current.items() if path not in parsed]
+    contents = load_manifests(owner, repo_name, to_parse, access_token, ref=tree.commit_sha)
+    fresh = {path: _parse_manifest(path, contents[sha]) for path, sha in to_parse if sha in contents}
+    manifest_scan_cache.set_many({keys[path]: declared for path, declared in fresh.items()})
+    parsed.update(fresh)
+    scan_state_cache.set(repo_key, {'tree_sha': tree.sha, 'manifests': [[path, sha] for path, sha in current.items()]})
+
+    reuse.update({
+        'previous_tree_sha': previous_scan.value['tree_sha'] if previous_scan is not None else None,
+        'manifests': len(current),
+        'manifests_reused': len(current) - len(to_parse),
+        'manifests_parsed': len(fresh),
+        'manifests_added': sum(1 for path in current if path not in previous),
+        'manifests_changed': sum(1 for path, sha in current.items() if previous.get(path, sha) != sha),
+        'manifests_removed': sum(1 for path in previous if path not in current),
+    })
+    return {path: parsed[path] for path in current if path in parsed}
+
+
+def summarize_rows(rows):
+    """Group result rows per package, the way the dependency tables show them
+
+    Packages the registries do not know are left out. When several
+    manifests declare a package, the last one's version and path are shown
+    and ``file_paths`` lists all of them.
+    """
+    dependencies = {
+        'npm': {},
+        'pip': {}
+    }
+    for row in rows:
+        if row['latest'] is None:
+            continue
+        entry = dependencies[row['ecosystem']].setdefault(row['package'], {'file_paths': []})
+        entry.update(current=row['current'], latest=row['latest'], file_path=row['file_path'])
+        entry['file_paths'].append(row['file_path'])
+    return dependencies
+
+
+def scan_dependencies(owner, repo_name, access_token, tree=None, progress=None):
+    """Scan every manifest in the repository and look up the latest versions
+
+    Returns ``{'npm': {package: {...}}, 'pip': {...}, 'rows': [...], 'reuse': {...}}``.
+    ``rows`` has one entry per package per manifest that declares it;
+    ``reuse`` says how much of the work earlier scans and caches saved.
+    The rows also replace the repository's entries in the dependency index.
+    ``progress``, when given, is called as ``progress(stage, done, total)``
+    while the scan runs.
+    """
+    if tree is None:
+        tree = fetch_tree(owner, repo_name, access_token)
+    # Concurrent scans of the same tree share one run; callers that wait
+    # get no progress reports of their own
+    return scan_flight.run(
+        owner, repo_name, tree.sha, lambda: _scan(owner, repo_name, access_token, tree, progress),
+        scope=token_scope(access_token)
+    )
+
+
+def _scan(owner, repo_name, access_token, tree, progress):
+    # Find all package.json and requirements.txt files, parsing only new blobs
+    reuse = {'tree_sha': tree.sha}
+    manifests = _parse_manifests(owner, repo_name, tree, access_token, reuse)
+    _report(progress, 'manifests', len(manifests), len(manifests))
+
+    # Collect declared dependencies from every manifest first so the
+    # registry lookups can run concurrently afterwards
+    declared = [
+        (manifest_ecosystem(manifest_path), pkg, spec, manifest_path)
+        for manifest_path, packages in manifests.items()
+        for pkg, spec in packages
+    ]
+
+    # Each unique (ecosystem, package) is resolved once, in one concurrent
+    # batch, and fanned out to every manifest declaring it; only versions
+    # missing from the cache wait on the registries
+    _report(progress, 'versions', 0, len(declared))
+    version_stats = {}
+    latest_versions = fetch_latest_versions(
+        ((ecosystem, pkg) for ecosystem, pkg, _, _ in declared), stats=version_stats
+    )
+    reuse.update(version_stats, declared=len(declared))
+    logger.info('Resolved %d latest versions for %d declared dependencies', len(latest_versions), len(declared))
+    _report(progress, 'versions', len(declared), len(declared))
+
+    rows = [
+        {
+            'ecosystem': ecosystem,
+            'package': pkg,
+            'file_path': file_path,
+            'spec': spec,
+            'current': resolve_current(ecosystem, spec),
+            'latest': latest_versions.get((ecosystem, pkg))
+        }
+        for ecosystem, pkg, spec, file_path in declared
+    ]
+    index_scan(owner, repo_name, tree.sha, rows)
+    return {
+        **summarize_rows(rows),
+        'rows': rows,
+        'reuse': reuse
+    }
@@ -0,0 +1,171 @@
+"""Cross-repository dependency index: who declares which package at which version.
+
+Every completed dependency scan replaces its repository's entries in
+MongoDB, one ``DependencyUse`` per package per manifest. Queries by
+(ecosystem, package) and a version range are answered from the compound
+indexes alone: versions are stored with a sortable key of their release
+numbers, so ``<4.17.21`` becomes a range over that key.
+"""
+import logging
+import re
+from datetime import datetime
+
+from django.conf import settings
+from mongoengine.errors import MongoEngineException
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from .models import DependencyUse
+
+logger = logging.getLogger(__name__)
+
+# Release numbers kept in a version key, each zero-padded to a fixed width
+VERSION_KEY_PARTS = 4
+VERSION_KEY_WIDTH = 8
+
+RANGE_OPERATORS = {
+    '<': '$lt',
+    '<=': '$lte',
+    '>': '$gt',
+    '>=': '$gte',
+    '==': '$eq',
+    '!=': '$ne',
+}
+_CLAUSE = re.compile(r'^(<=|>=|==|!=|<|>)?\s*v?([0-9][0-9A-Za-z.\-+]*)$')
+
+
+class IndexQueryError(Exception):
+    """The index query is invalid; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def package_key(ecosystem, package):
+    """The name a package is indexed under: PyPI names are case- and separator-insensitive"""
+    if ecosystem == 'pip':
+        return canonicalize_name(package)
+    return package.lower()
+
+
+def version_key(version):
+    """Sortable string of a version's release numbers, or None when it is not a version
+
+    ``4.17`` and ``4.17.0`` get the same key; pre-release and local parts
+    are ignored.
+    """
+    try:
+        release = Version(version).release
+    except InvalidVersion:
+        return None
+    release = (release + (0,) * VERSION_KEY_PARTS)[:VERSION_KEY_PARTS]
+    limit = 10 ** VERSION_KEY_WIDTH - 1
+    return '.'.join(f'{min(part, limit):0{VERSION_KEY_WIDTH}d}' for part in release)
+
+
+def declared_version(ecosystem, spec):
+    """The version a declared spec pins or starts from, or None when it names none"""
+    if ecosystem == 'npm':
+        # Remove version prefix characters (^, ~, etc.)
+        return re.sub(r'^[^0-9]*', '', spec) or None
+    # The first version that follows a comparison operator
+    match = re.search(r'[=<>~](\d+(?:\.\d+)*)', spec)
+    return match.group(1) if match else None
+
+
+def parse_range(text):
+    """Turn ``>=1.0,<2.0`` style ranges into a MongoDB condition on ``version_key``
+
+    A bare version means ``==``. Raises IndexQueryError on anything else.
+    """
+    condition = {}
+    for clause in text.split(','):
+        match = _CLAUSE.match(clause.strip())
+        key = version_key(match.group(2)) if match else None
+        if key is None:
+            raise IndexQueryError(f'Invalid version range clause: {clause.strip()!r}', 400)
+        operator = RANGE_OPERATORS[match.group(1) or '==']
+        if operator in condition:
+            raise IndexQueryError(f'Version range repeats {match.group(1) or "=="}', 400)
+        condition[operator] = key
+    return condition
+
+
+def index_scan(owner, repo_name, tree_sha, rows):
+    """Replace the repository's index entries with the declarations of one scan
+
+    New entries are upserted before stale ones are dropped, so readers never
+    see the repository missing. Failures are logged, never raised: the index
+    must not fail a scan.
+    """
+    if not settings.DEPENDENCY_INDEX:
+        return
+    now = datetime.utcnow()
+    # Unpinned requirements are indexed without a version, so no range matches them
+    versions = [declared_version(row['ecosystem'], row['spec']) for row in rows]
+    operations = [
+        UpdateOne(
+            {
+                'owner': owner,
+                'repo': repo_name,
+                'manifest': row['file_path'],
+                'ecosystem': row['ecosystem'],
+                'package': package_key(row['ecosystem'], row['package']),
+            },
+            {'$set': {
+                'name': row['package'],
+                'spec': row['spec'],
+                'version': version,
+                'version_key': version_key(version) if version else None,
+                'tree_sha': tree_sha,
+                'indexed_at': now,
+            }},
+            upsert=True
+        )
+        for row, version in zip(rows, versions)
+    ]
+    try:
+        collection = DependencyUse._get_collection()
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        stale = collection.delete_many({'owner': owner, 'repo': repo_name, 'tree_sha': {'$ne': tree_sha}})
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Could not index dependencies of %s/%s: %s', owner, repo_name, e)
+        return
+    logger.info(
+        'Indexed %d dependencies of %s/%s@%s (%d stale removed)',
+        len(operations), owner, repo_name, tree_sha, stale.deleted_count
+    )
+
+
+def serialize_use(use):
+    return {
+        'repo': f'{use.owner}/{use.repo}',
+        'manifest': use.manifest,
+        'package': use.name,
+        'spec': use.spec,
+        'version': use.version,
+        'tree_sha': use.tree_sha,
+        'indexed_at': use.indexed_at,
+    }
+
+
+def query_index(owner, ecosystem, package, version_range=None, page=1, per_page=30):
+    """Return ``(uses, total)``: one page of the owner's manifests declaring the package
+
+    Ordered by repository and manifest path. With ``version_range``, entries
+    whose declared version is not a version (``*``, git URLs, ...) are left
+    out.
+    """
+    query = {'owner': owner, 'ecosystem': ecosystem, 'package': package_key(ecosystem, package)}
+    if version_range:
+        condition = parse_range(version_range)
+        # Range operators never match a missing key, but != would
+        condition['$nin'] = [None] + ([condition.pop('$ne')] if '$ne' in condition else [])
+        query['version_key'] = condition
+    uses = DependencyUse.objects(__raw__=query).order_by('repo', 'manifest')
+    total = uses.count()
+    return list(uses.skip((page - 1) * per_page).limit(per_page)), total
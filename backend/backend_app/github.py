@@ -0,0 +1,339 @@
+"""GitHub REST API access shared by the views.
+
+GET requests are made conditional: the ETag / Last-Modified of every
+successful response is kept per (token scope, URL), and a 304 Not Modified
+answer is served from the stored body. GitHub does not count 304s against
+the rate limit.
+
+Every request is paced by the per-token scheduler in ratelimit.py and is
+retried after the back-off GitHub asks for when it is rate limited.
+"""
+import asyncio
+import hashlib
+import logging
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+
+from .cache import TieredCache
+from .clients import async_request, fanout_executor, http_client
+from .metrics import current_endpoint, github_rate_limited
+from .ratelimit import scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACCEPT = 'application/vnd.github.v3+json'
+
+# Response headers worth replaying from the cache
+_CACHED_HEADERS = ('content-type', 'etag', 'last-modified', 'link')
+
+class ConditionalRequestCache(TieredCache):
+    """TieredCache that also reports how many GETs were answered by a 304"""
+
+    def stats(self):
+        stats = super().stats()
+        requests = stats.get('conditional_requests', 0) + stats.get('unconditional_requests', 0)
+        not_modified = stats.get('not_modified', 0)
+        stats['revalidation_hit_rate'] = round(not_modified / requests, 4) if requests else None
+        return stats
+
+
+# Entries are always revalidated before use, so the TTL only bounds retention
+conditional_cache = ConditionalRequestCache(
+    'github_conditional',
+    ttl=settings.GITHUB_CONDITIONAL_CACHE_TTL,
+    maxsize=settings.GITHUB_CONDITIONAL_CACHE_SIZE,
+)
+
+# Token -> GitHub user profile. Kept in memory only and short-lived so a
+# revoked token stops resolving quickly; any 401 drops the entry at once.
+identity_cache = TieredCache(
+    'github_identity',
+    ttl=settings.GITHUB_IDENTITY_CACHE_TTL,
+    maxsize=settings.GITHUB_IDENTITY_CACHE_SIZE,
+    persistent=False,
+)
+
+
+def api_url(path):
+    """Absolute API URL for a path like ``/repos/{owner}/{repo}``; absolute URLs pass through"""
+    if path.startswith(('http://', 'https://')):
+        return path
+    return f'{settings.GITHUB_API_URL}{path}'
+
+
+def token_scope(access_token):
+    """Stable identifier for a token that never exposes the token itself"""
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def _headers(access_token, accept):
+    return {
+        'Authorization': f'Bearer {access_token}',
+        'Accept': accept
+    }
+
+
+def _check_unauthorized(response, access_token):
+    if response.status_code == 401:
+        identity_cache.delete(token_scope(access_token))
+    return response
+
+
+def _rate_limited_response(method, url):
+    """What a call gets when waiting for a slot would take longer than its priority allows"""
+    return httpx.Response(
+        status_code=429,
+        json={'message': 'GitHub rate limit budget exhausted, try again later'},
+        request=httpx.Request(method, url)
+    )
+
+
+def _log_rate_limited(method, url, response, backoff):
+    github_rate_limited.inc(endpoint=current_endpoint())
+    logger.warning('GitHub rate limited %s %s (status %s), backing off %.0fs',
+                   method, url, response.status_code, backoff)
+
+
+def _send(method, url, access_token, **kwargs):
+    """Send one request through the token's rate-limit scheduler, retrying when GitHub throttles it"""
+    scope = token_scope(access_token)
+    response = None
+    for attempt in range(settings.GITHUB_RATE_LIMIT_RETRIES + 1):
+        if not scheduler.acquire(scope):
+            # Too long a wait: hand back GitHub's own rate-limit answer if there is one
+            return response if response is not None else _rate_limited_response(method, url)
+        response = _check_unauthorized(http_client().request(method, url, **kwargs), access_token)
+        backoff = scheduler.record(scope, response)
+        if backoff is None:
+            return response
+        _log_rate_limited(method, url, response, backoff)
+    return response
+
+
+async def _send_async(method, url, access_token, **kwargs):
+    """_send() on the event loop's AsyncClient"""
+    scope = token_scope(access_token)
+    response = None
+    for attempt in range(settings.GITHUB_RATE_LIMIT_RETRIES + 1):
+        if not await scheduler.acquire_async(scope):
+            return response if response is not None else _rate_limited_response(method, url)
+        response = _check_unauthorized(await async_request(method, url, **kwargs), access_token)
+        backoff = scheduler.record(scope, response)
+        if backoff is None:
+            return response
+        _log_rate_limited(method, url, response, backoff)
+    return response
+
+
+def _conditional_key(access_token, accept, url):
+    return f'{token_scope(access_token)}:{accept}:{url}'
+
+
+def _add_validators(headers, cached):
+    if cached is not None:
+        if cached.value.get('etag'):
+            headers['If-None-Match'] = cached.value['etag']
+        if cached.value.get('last_modified'):
+            headers['If-Modified-Since'] = cached.value['last_modified']
+        conditional_cache.count('conditional_requests')
+    else:
+        conditional_cache.count('unconditional_requests')
+
+
+def _replay(cached, response):
+    """The cached response when GitHub answered 304 Not Modified, else None"""
+    if response.status_code != 304 or cached is None:
+        return None
+    conditional_cache.count('not_modified')
+    return httpx.Response(
+        status_code=cached.value['status'],
+        headers=cached.value['headers'],
+        content=cached.value['content'],
+        request=response.request
+    )
+
+
+def _cache_entry(response):
+    """What to keep of a fresh response to revalidate it later, or None"""
+    etag = response.headers.get('etag')
+    last_modified = response.headers.get('last-modified')
+    if response.status_code != 200 or not (etag or last_modified):
+        return None
+    return {
+        'etag': etag,
+        'last_modified': last_modified,
+        'status': response.status_code,
+        'headers': {name: response.headers[name] for name in _CACHED_HEADERS if name in response.headers},
+        'content': response.content,
+    }
+
+
+def github_get(path, access_token, params=None, accept=DEFAULT_ACCEPT, conditional=True):
+    """GET a GitHub API resource, revalidating any cached copy with a conditional request
+
+    Pass ``conditional=False`` for immutable resources the caller caches itself.
+    """
+    url = str(httpx.URL(api_url(path), params=params))
+    headers = _headers(access_token, accept)
+    if not conditional:
+        return _send('GET', url, access_token, headers=headers)
+
+    key = _conditional_key(access_token, accept, url)
+    cached = conditional_cache.get(key)
+    _add_validators(headers, cached)
+    response = _send('GET', url, access_token, headers=headers)
+
+    replayed = _replay(cached, response)
+    if replayed is not None:
+        return replayed
+    entry = _cache_entry(response)
+    if entry is not None:
+        conditional_cache.set(key, entry)
+    return response
+
+
+async def github_get_async(path, access_token, params=None, accept=DEFAULT_ACCEPT, conditional=True):
+    """github_get() for async views"""
+    url = str(httpx.URL(api_url(path), params=params))
+    headers = _headers(access_token, accept)
+    if not conditional:
+        return await _send_async('GET', url, access_token, headers=headers)
+
+    key = _conditional_key(access_token, accept, url)
+    cached = await conditional_cache.aget(key)
+    _add_validators(headers, cached)
+    response = await _send_async('GET', url, access_token, headers=headers)
+
+    replayed = _replay(cached, response)
+    if replayed is not None:
+        return replayed
+    entry = _cache_entry(response)
+    if entry is not None:
+        await conditional_cache.aset(key, entry)
+    return response
+
+
+def _page_number(url):
+    return int(httpx.URL(url).params.get('page', 1))
+
+
+def github_get_all_pages(path, access_token, params=None):
+    """GET every page of a list endpoint and return ``(items, status_code)``
+
+    The first page's ``Link: rel="last"`` header says how many pages there
+    are; the rest are fetched in parallel and concatenated in page order, so
+    the API's sort order is preserved. ``items`` is None if any page failed.
+    """
+    params = {**(params or {}), 'per_page': 100}
+    first_page = github_get(path, access_token, params={**params, 'page': 1})
+    if first_page.status_code != 200:
+        return None, first_page.status_code
+
+    last_url = first_page.links.get('last', {}).get('url')
+    last_page = _page_number(last_url) if last_url else 1
+    futures = [
+        fanout_executor().submit(github_get, path, access_token, {**params, 'page': page})
+        for page in range(2, last_page + 1)
+    ]
+
+    items = list(first_page.json())
+    for future in futures:
+        page_response = future.result()
+        if page_response.status_code != 200:
+            return None, page_response.status_code
+        items.extend(page_response.json())
+    return items, 200
+
+
+async def github_get_all_pages_async(path, access_token, params=None):
+    """github_get_all_pages() for async views"""
+    params = {**(params or {}), 'per_page': 100}
+    first_page = await github_get_async(path, access_token, params={**params, 'page': 1})
+    if first_page.status_code != 200:
+        return None, first_page.status_code
+
+    last_url = first_page.links.get('last', {}).get('url')
+    last_page = _page_number(last_url) if last_url else 1
+    pages = await asyncio.gather(*(
+        github_get_async(path, access_token, params={**params, 'page': page})
+        for page in range(2, last_page + 1)
+    ))
+
+    items = list(first_page.json())
+    for page_response in pages:
+        if page_response.status_code != 200:
+            return None, page_response.status_code
+        items.extend(page_response.json())
+    return items, 200
+
+
+@contextmanager
+def github_stream(path, access_token, accept=DEFAULT_ACCEPT):
+    """Open a streaming GET (e.g. an archive download) without buffering the body"""
+    scope = token_scope(access_token)
+    if not scheduler.acquire(scope):
+        yield _rate_limited_response('GET', api_url(path))
+        return
+    with http_client().stream('GET', api_url(path), headers=_headers(access_token, accept)) as response:
+        scheduler.record(scope, response)
+        yield _check_unauthorized(response, access_token)
+
+
+def github_post(path, access_token, json=None, accept=DEFAULT_ACCEPT):
+    return _send('POST', api_url(path), access_token, headers=_headers(access_token, accept), json=json)
+
+
+def github_put(path, access_token, json=None, accept=DEFAULT_ACCEPT):
+    return _send('PUT', api_url(path), access_token, headers=_headers(access_token, accept), json=json)
+
+
+def github_patch(path, access_token, json=None, accept=DEFAULT_ACCEPT):
+    return _send('PATCH', api_url(path), access_token, headers=_headers(access_token, accept), json=json)
+
+
+def _user_profile(user_data):
+    return {
+        'id': user_data['id'],
+        'login': user_data['login'],
+        'name': user_data.get('name'),
+        'avatar_url': user_data.get('avatar_url'),
+        'email': user_data.get('email')
+    }
+
+
+def github_user(access_token):
+    """Return ``(user, status_code)`` for the token's owner, cached per token hash
+
+    ``user`` is None when GitHub did not return the profile; ``status_code``
+    is then GitHub's answer so views can pass it on.
+    """
+    scope = token_scope(access_token)
+    cached = identity_cache.get(scope)
+    if cached is not None:
+        return cached.value, 200
+
+    response = github_get('/user', access_token)
+    if response.status_code != 200:
+        return None, response.status_code
+
+    user = _user_profile(response.json())
+    identity_cache.set(scope, user)
+    return user, 200
+
+
+async def github_user_async(access_token):
+    """github_user() for async views"""
+    scope = token_scope(access_token)
+    cached = await identity_cache.aget(scope)
+    if cached is not None:
+        return cached.value, 200
+
+    response = await github_get_async('/user', access_token)
+    if response.status_code != 200:
+        return None, response.status_code
+
+    user = _user_profile(response.json())
+    await identity_cache.aset(scope, user)
+    return user, 200
@@ -0,0 +1,144 @@
+"""Background dependency scans: a thread pool of workers and a MongoDB-backed job store."""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .dependencies import load_tree, resolve_head, scan_dependencies, summarize_rows
+from .metrics import operation_trace
+from .models import ScanJob
+from .ratelimit import bulk_priority
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def job_executor():
+    """Return the worker pool running background jobs, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix='job')
+    return _executor
+
+
+def serialize_job(job):
+    return {
+        'job_id': job.job_id,
+        'repo': f'{job.owner}/{job.repo}',
+        'status': job.status,
+        'progress': job.progress,
+        'tree_sha': job.tree_sha,
+        'result': {**summarize_rows(job.result), 'rows': job.result} if job.result is not None else None,
+        'reuse': job.reuse or None,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+
+def _progress_writer(job_id):
+    """Return a progress callback that writes at most every JOB_PROGRESS_INTERVAL seconds"""
+    last_write = [0.0]
+
+    def write(stage, done, total):
+        now = time.monotonic()
+        if done < total and now - last_write[0] < settings.JOB_PROGRESS_INTERVAL:
+            return
+        last_write[0] = now
+        ScanJob.objects(job_id=job_id).update_one(set__progress={'stage': stage, 'done': done, 'total': total})
+
+    return write
+
+
+def _run_scan(job_id, owner, repo_name, access_token, head):
+    started = ScanJob.objects(job_id=job_id, status='queued').update_one(
+        set__status='running', set__started_at=datetime.utcnow()
+    )
+    if not started:
+        # Reported failed while it waited for a worker
+        return
+    try:
+        with bulk_priority(), operation_trace('job:dependency_scan'):
+            tree = load_tree(owner, repo_name, access_token, *head)
+            result = scan_dependencies(owner, repo_name, access_token, tree=tree, progress=_progress_writer(job_id))
+        ScanJob.objects(job_id=job_id).update_one(
+            set__status='succeeded',
+            set__result=result['rows'],
+            set__reuse=result['reuse'],
+            set__finished_at=datetime.utcnow()
+        )
+    except Exception as e:
+        logger.exception('Error in scan job %s', job_id)
+        ScanJob.objects(job_id=job_id).update_one(
+            set__status='failed',
+            set__error=str(e),
+            set__finished_at=datetime.utcnow()
+        )
+
+
+def submit_scan(user_login, owner, repo_name, access_token):
+    """Queue a dependency scan and return its ScanJob
+
+    Only the branch head is resolved here; the worker lists the tree. If a
+    scan of the same tree already succeeded, that job is returned and
+    nothing is queued. Raises ScanError when the repository is not
+    accessible.
+    """
+    head = resolve_head(owner, repo_name, access_token)
+    tree_sha = head[2]
+
+    if tree_sha:
+        finished = ScanJob.objects(
+            user=user_login, owner=owner, repo=repo_name, tree_sha=tree_sha, status='succeeded'
+        ).order_by('-finished_at').first()
+        if finished is not None:
+            logger.info('Reusing scan job %s for %s/%s@%s', finished.job_id, owner, repo_name, tree_sha)
+            return finished
+
+    job = ScanJob(
+        job_id=uuid.uuid4().hex,
+        user=user_login,
+        owner=owner,
+        repo=repo_name,
+        tree_sha=tree_sha,
+    ).save()
+    # The token only lives in the worker's arguments, never in the job store
+    job_executor().submit(_run_scan, job.job_id, owner, repo_name, access_token, head)
+    return job
+
+
+def _expire(job):
+    """Mark the job failed if it has been queued or running for longer than JOB_TIMEOUT
+
+    Workers are threads of the web process, so a restart loses their jobs
+    without a word; this is how such jobs finish.
+    """
+    if job.status not in ('queued', 'running'):
+        return job
+    since = job.started_at or job.created_at
+    if datetime.utcnow() - since < timedelta(seconds=settings.JOB_TIMEOUT):
+        return job
+    ScanJob.objects(job_id=job.job_id, status=job.status).update_one(
+        set__status='failed',
+        set__error=f'The job did not finish within {settings.JOB_TIMEOUT} seconds; its worker was lost',
+        set__finished_at=datetime.utcnow()
+    )
+    logger.warning('Scan job %s was %s since %s; marked failed', job.job_id, job.status, since)
+    job.reload()
+    return job
+
+
+def get_job(job_id, user_login):
+    """Return the user's job with this id, or None"""
+    job = ScanJob.objects(job_id=job_id, user=user_login).first()
+    return _expire(job) if job is not None else None
+
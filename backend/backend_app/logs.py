@@ -0,0 +1,103 @@
+"""Structured logging: JSON (or key=value text) lines with secrets scrubbed out.
+
+Wired up by ``LOGGING`` in settings. Every record passes ``RedactingFilter``,
+which masks GitHub and Groq tokens, bearer headers and secret-looking
+key/value pairs in the message and in any ``extra`` fields, and
+``RequestContextFilter``, which tags records logged while serving a request
+with its id and endpoint.
+"""
+import json
+import logging
+import os
+import re
+from datetime import datetime, timezone
+
+REDACTED = '[REDACTED]'
+
+_PATTERNS = (
+    # GitHub tokens (personal, OAuth, user-to-server, server-to-server, refresh) and fine-grained PATs
+    (re.compile(r'\bgh[pousr]_[A-Za-z0-9]{16,}'), REDACTED),
+    (re.compile(r'\bgithub_pat_[A-Za-z0-9_]{16,}'), REDACTED),
+    # Groq API keys
+    (re.compile(r'\bgsk_[A-Za-z0-9]{16,}'), REDACTED),
+    (re.compile(r'\b(Bearer|token)\s+[A-Za-z0-9._~+/=-]{8,}', re.IGNORECASE), r'\1 ' + REDACTED),
+    (re.compile(
+        r'''\b(client_secret|access_token|refresh_token|api_key|password)(['"]?\s*[:=]\s*['"]?)[^'"&\s,}]+''',
+        re.IGNORECASE
+    ), r'\1\2' + REDACTED),
+)
+
+# Secrets read from the environment are masked wherever they show up verbatim
+_SECRET_ENV_VARS = ('GITHUB_CLIENT_SECRET', 'GROQ_API_KEY')
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def redact(text):
+    for pattern, replacement in _PATTERNS:
+        text = pattern.sub(replacement, text)
+    for name in _SECRET_ENV_VARS:
+        secret = os.environ.get(name)
+        if secret and len(secret) >= 8:
+            text = text.replace(secret, REDACTED)
+    return text
+
+
+def _extra_fields(record):
+    return {name: value for name, value in vars(record).items() if name not in _RECORD_ATTRS}
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for name, value in _extra_fields(record).items():
+            if isinstance(value, str):
+                setattr(record, name, redact(value))
+        return True
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        from .metrics import current_trace
+
+        trace = current_trace()
+        if trace is not None:
+            if not hasattr(record, 'request_id'):
+                record.request_id = trace.request_id
+            if not hasattr(record, 'endpoint'):
+                record.endpoint = trace.endpoint
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, then the extra fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            entry['exception'] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual text line followed by the extra fields as key=value pairs"""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            head, _, tail = line.partition('\n')
+            extras = ' '.join(f'{name}={json.dumps(value, default=str)}' for name, value in fields.items())
+            line = f'{head} {extras}' + (f'\n{tail}' if tail else '')
+        return line
+
+    def formatException(self, ei):
+        return redact(super().formatException(ei))
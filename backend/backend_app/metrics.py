@@ -0,0 +1,328 @@
+"""Latency histograms and counters for incoming requests and every outbound call.
+
+Metrics live in this process and are rendered in the Prometheus text format
+by the ``/metrics`` view; with several server workers, each one reports its
+own and Prometheus sums them.
+
+Outbound calls are timed by wrapping the httpx transports of the shared
+clients (GitHub, OAuth, registries and Groq), from sending the request until
+the response body has been read or closed. Each call is tagged with the
+upstream host, the endpoint it was made for and the response status, and
+added to the current ``RequestTrace`` so the per-request log line can say
+where the time went.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+# Seconds; the upper bound of each bucket, +Inf is implied
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Endpoint label of calls made outside any request or background operation
+NO_ENDPOINT = 'background'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (the last one is +Inf), sum]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # Callables returning extra metrics (e.g. cache counters) at scrape time
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    'http_request_duration_seconds',
+    'Time to produce the response of an incoming request',
+    ('endpoint', 'method', 'status'),
+))
+upstream_duration = registry.register(Histogram(
+    'upstream_request_duration_seconds',
+    'Duration of outbound HTTP calls, from sending the request to the end of the response body',
+    ('host', 'endpoint', 'status'),
+))
+upstream_errors = registry.register(Counter(
+    'upstream_request_errors_total',
+    'Outbound HTTP calls that failed without a response',
+    ('host', 'endpoint', 'error'),
+))
+github_rate_limited = registry.register(Counter(
+    'github_rate_limited_total',
+    'GitHub answers that made the scheduler back off',
+    ('endpoint',),
+))
+
+
+class RequestTrace:
+    """What one request (or background operation) spent its time on upstream"""
+
+    def __init__(self, endpoint=None, request=None):
+        self.request_id = uuid.uuid4().hex[:16]
+        self._endpoint = endpoint
+        self._request = request
+        self._lock = threading.Lock()
+        self.upstream = {}
+
+    @property
+    def endpoint(self):
+        # URL resolution happens after the middleware starts the trace
+        if self._endpoint is None and self._request is not None:
+            match = getattr(self._request, 'resolver_match', None)
+            if match is not None:
+                self._endpoint = match.url_name or match.view_name
+        return self._endpoint or 'unmatched'
+
+    def add(self, host, seconds):
+        with self._lock:
+            totals = self.upstream.setdefault(host, {'calls': 0, 'ms': 0.0})
+            totals['calls'] += 1
+            totals['ms'] += seconds * 1000
+
+    def upstream_summary(self):
+        with self._lock:
+            return {host: {'calls': totals['calls'], 'ms': round(totals['ms'], 1)}
+                    for host, totals in self.upstream.items()}
+
+
+_trace = ContextVar('request_trace', default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+def current_endpoint():
+    trace = _trace.get()
+    return trace.endpoint if trace is not None else NO_ENDPOINT
+
+
+def start_trace(endpoint=None, request=None):
+    """Start a trace for the current context; returns (trace, token for end_trace)"""
+    trace = RequestTrace(endpoint, request)
+    return trace, _trace.set(trace)
+
+
+def end_trace(token):
+    _trace.reset(token)
+
+
+@contextmanager
+def operation_trace(endpoint):
+    """Tag the upstream calls of a background operation (a job, a campaign) with ``endpoint``"""
+    trace, token = start_trace(endpoint)
+    try:
+        yield trace
+    finally:
+        end_trace(token)
+
+
+class _Span:
+    """One outbound call; recorded once, when the response is closed or the call fails"""
+
+    def __init__(self, request):
+        url = request.url
+        # The port only when it is not the scheme's default
+        self.host = url.host if url.port is None else f'{url.host}:{url.port}'
+        self.trace = _trace.get()
+        self.endpoint = self.trace.endpoint if self.trace is not None else NO_ENDPOINT
+        self.started = time.perf_counter()
+        self.status = None
+
+    def finish(self, status):
+        if self.status is not None:
+            return
+        self.status = status
+        seconds = time.perf_counter() - self.started
+        upstream_duration.observe(seconds, host=self.host, endpoint=self.endpoint, status=status)
+        if self.trace is not None:
+            self.trace.add(self.host, seconds)
+
+    def fail(self, error):
+        upstream_errors.inc(host=self.host, endpoint=self.endpoint, error=type(error).__name__)
+        self.finish('error')
+
+
+class _TimedStream(httpx.SyncByteStream):
+    def __init__(self, stream, span, status):
+        self._stream = stream
+        self._span = span
+        self._status = status
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._span.finish(self._status)
+
+
+class _AsyncTimedStream(httpx.AsyncByteStream):
+    def __init__(self, stream, span, status):
+        self._stream = stream
+        self._span = span
+        self._status = status
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._span.finish(self._status)
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """Wraps an httpx transport and records a span for every request it sends"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def handle_request(self, request):
+        span = _Span(request)
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as e:
+            span.fail(e)
+            raise
+        response.stream = _TimedStream(response.stream, span, str(response.status_code))
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncInstrumentedTransport(httpx.AsyncBaseTransport):
+    """InstrumentedTransport for async transports"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        span = _Span(request)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException as e:
+            # Includes cancellation, so a cancelled call still shows up
+            span.fail(e)
+            raise
+        response.stream = _AsyncTimedStream(response.stream, span, str(response.status_code))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
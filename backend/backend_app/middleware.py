@@ -0,0 +1,61 @@
+"""Request timing: one histogram sample and one structured log line per request."""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import end_trace, request_duration, start_trace
+
+logger = logging.getLogger('backend_app.requests')
+
+
+class RequestMetricsMiddleware:
+    """Times every request and logs where its time went upstream
+
+    Works in both sync and async chains, so under ASGI it adds no thread hop
+    of its own. Streaming responses are timed until their headers are ready.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        trace, token = start_trace(request=request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_trace(token)
+        self._record(request, response, trace, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        trace, token = start_trace(request=request)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_trace(token)
+        self._record(request, response, trace, time.perf_counter() - started)
+        return response
+
+    def _record(self, request, response, trace, seconds):
+        request_duration.observe(
+            seconds, endpoint=trace.endpoint, method=request.method, status=response.status_code
+        )
+        response['X-Request-ID'] = trace.request_id
+        # The path only: query strings can carry OAuth codes
+        logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'request_id': trace.request_id,
+            'endpoint': trace.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(seconds * 1000, 1),
+            'upstream': trace.upstream_summary(),
+        })
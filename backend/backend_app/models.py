@@ -1,6 +1,133 @@
-from mongoengine import Document, StringField, DateTimeField
+from mongoengine import Document, StringField, DateTimeField, DynamicField, ListField, DictField
 from datetime import datetime
 
 class TestConnection(Document):
     message = StringField(required=True)
     timestamp = DateTimeField(default=datetime.utcnow)
+
+class CacheEntry(Document):
+    """Persistent tier of a TieredCache; expired rows are dropped by MongoDB's TTL monitor"""
+    namespace = StringField(required=True)
+    key = StringField(required=True)
+    value = DynamicField()
+    stored_at = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            {'fields': ['namespace', 'key'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+class RepoSummary(Document):
+    """AI summary of a repository at one revision, for one prompt template and model"""
+    user = StringField(required=True)
+    full_name = StringField(required=True)
+    revision = StringField(required=True)
+    prompt_version = StringField(required=True)
+    model = StringField(required=True)
+    content = StringField(required=True)
+    languages = ListField(StringField())
+    created_at = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            {'fields': ['full_name', 'revision', 'prompt_version', 'model'], 'unique': True},
+            {'fields': ['user', '-created_at']},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+class ScanJob(Document):
+    """A background dependency scan; the access token is never stored"""
+    job_id = StringField(required=True, unique=True)
+    user = StringField(required=True)
+    owner = StringField(required=True)
+    repo = StringField(required=True)
+    status = StringField(required=True, choices=('queued', 'running', 'succeeded', 'failed'), default='queued')
+    progress = DictField()
+    tree_sha = StringField()
+    # Scan rows (one per package per manifest); names like socket.io are not valid MongoDB keys
+    result = DynamicField()
+    reuse = DictField()
+    error = StringField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            {'fields': ['owner', 'repo', 'tree_sha', '-finished_at']},
+            {'fields': ['user', '-created_at']},
+        ]
+    }
+
+class Campaign(Document):
+    """A dependency update rolled out across many repositories; the access token is never stored
+
+    ``policy`` is a list of {ecosystem, package, version} targets (no version
+    means the latest release). ``repos`` holds one progress entry per
+    repository, so a campaign interrupted by a crash resumes where it stopped.
+    """
+    campaign_id = StringField(required=True, unique=True)
+    user = StringField(required=True)
+    policy = ListField(DictField())
+    status = StringField(required=True, choices=('queued', 'running', 'succeeded', 'failed'), default='queued')
+    repos = ListField(DictField())
+    error = StringField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            {'fields': ['user', '-created_at']},
+        ]
+    }
+
+class SingleFlightLease(Document):
+    """Cross-process single-flight lease on one computation, then briefly its JSON result
+
+    Expired leases are dropped by MongoDB's TTL monitor; until then, readers
+    compare ``expires_at`` themselves.
+    """
+    key = StringField(primary_key=True)
+    holder = StringField(required=True)
+    status = StringField(required=True, choices=('running', 'done'))
+    result = StringField()
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        'indexes': [
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+class DependencyUse(Document):
+    """One package declared by one manifest, as of the repository's last scan
+
+    ``package`` is the normalized name queries match on and ``name`` the
+    name as declared; ``version_key`` is the declared version made sortable
+    (see backend_app/dependency_index.py), unset when it is not a version.
+    """
+    owner = StringField(required=True)
+    repo = StringField(required=True)
+    manifest = StringField(required=True)
+    ecosystem = StringField(required=True)
+    package = StringField(required=True)
+    name = StringField()
+    spec = StringField()
+    version = StringField()
+    version_key = StringField()
+    tree_sha = StringField()
+    indexed_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            {'fields': ['owner', 'repo', 'manifest', 'ecosystem', 'package'], 'unique': True},
+            # Equality on the package, sorted by repository, range on the version
+            {'fields': ['owner', 'ecosystem', 'package', 'repo', 'manifest', 'version_key']},
+        ]
+    }
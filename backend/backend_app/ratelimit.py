@@ -0,0 +1,250 @@
+"""Per-token pacing and back-off for GitHub API calls.
+
+Every GitHub request takes a slot from its token's bucket first. Buckets
+refill at ``GITHUB_REQUESTS_PER_SECOND`` up to ``GITHUB_REQUEST_BURST``;
+``X-RateLimit-*`` headers keep track of the primary budget, and 403/429
+rate-limit answers block the token until ``Retry-After`` (or the reset).
+
+Calls are interactive unless made inside ``bulk_priority()``. Bulk calls
+leave part of the bucket to interactive ones, yield to any interactive call
+that is waiting, and pause once the primary budget falls to
+``GITHUB_BULK_BUDGET_RESERVE``.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+_priority = ContextVar('github_priority', default=INTERACTIVE)
+
+# First wait for a secondary rate limit GitHub gave no Retry-After for; doubles on
+# repeats up to SECONDARY_LIMIT_MAX_BACKOFF
+SECONDARY_LIMIT_BACKOFF = 60
+SECONDARY_LIMIT_MAX_BACKOFF = 15 * 60
+
+
+@contextmanager
+def bulk_priority():
+    """Mark the GitHub calls made in this context (and tasks it fans out) as bulk work"""
+    reset_token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(reset_token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class TokenBudget:
+    """Bucket level and last known rate-limit headers of one token"""
+
+    def __init__(self, burst):
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.resource = None
+        self.blocked_until = 0.0
+        self.secondary_backoff = 0
+        self.waiting = Counter()
+        self.counters = Counter()
+
+    def snapshot(self):
+        now = time.time()
+        return {
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'reset': self.reset,
+            'resource': self.resource,
+            'blocked_for': round(max(self.blocked_until - now, 0), 1),
+            'bucket': round(self.tokens, 1),
+            'waiting': dict(self.waiting),
+            **self.counters,
+        }
+
+
+class RateLimitScheduler:
+    def __init__(self):
+        # Least recently used first
+        self._budgets = OrderedDict()
+        self._condition = threading.Condition()
+
+    def _budget(self, scope):
+        budget = self._budgets.get(scope)
+        if budget is None:
+            budget = self._budgets[scope] = TokenBudget(settings.GITHUB_REQUEST_BURST)
+            self._evict()
+        else:
+            self._budgets.move_to_end(scope)
+        return budget
+
+    def _evict(self):
+        """Forget the least recently used tokens beyond GITHUB_RATE_LIMIT_TOKENS
+
+        Budgets with calls waiting on them or a rate limit still running are
+        kept: forgetting those would let the token straight back in.
+        """
+        excess = len(self._budgets) - settings.GITHUB_RATE_LIMIT_TOKENS
+        if excess <= 0:
+            return
+        now = time.time()
+        idle = []
+        for scope, budget in self._budgets.items():
+            if len(idle) == excess:
+                break
+            if not budget.waiting and budget.blocked_until <= now:
+                idle.append(scope)
+        for scope in idle:
+            del self._budgets[scope]
+
+    def _refill(self, budget):
+        now = time.monotonic()
+        budget.tokens = min(
+            settings.GITHUB_REQUEST_BURST,
+            budget.tokens + (now - budget.refilled_at) * settings.GITHUB_REQUESTS_PER_SECOND
+        )
+        budget.refilled_at = now
+
+    def _delay(self, budget, priority):
+        """Seconds until a call of this priority may go out; 0 means now"""
+        now = time.time()
+        if budget.blocked_until > now:
+            return budget.blocked_until - now
+        needed = 1
+        if priority == BULK:
+            if budget.remaining is not None and budget.remaining <= settings.GITHUB_BULK_BUDGET_RESERVE \
+                    and budget.reset and budget.reset > now:
+                return budget.reset - now
+            if budget.waiting[INTERACTIVE]:
+                return 1 / settings.GITHUB_REQUESTS_PER_SECOND
+            needed += settings.GITHUB_INTERACTIVE_BURST_RESERVE
+        self._refill(budget)
+        if budget.tokens >= needed:
+            return 0
+        return (needed - budget.tokens) / settings.GITHUB_REQUESTS_PER_SECOND
+
+    def acquire(self, scope, priority=None):
+        """Wait for a slot; returns False if that would take longer than the priority allows"""
+        priority = priority or current_priority()
+        max_wait = settings.GITHUB_BULK_MAX_WAIT if priority == BULK else settings.GITHUB_INTERACTIVE_MAX_WAIT
+        deadline = time.monotonic() + max_wait
+        with self._condition:
+            budget = self._budget(scope)
+            budget.waiting[priority] += 1
+            try:
+                while True:
+                    delay = self._delay(budget, priority)
+                    if delay <= 0:
+                        budget.tokens -= 1
+                        budget.counters[f'{priority}_requests'] += 1
+                        return True
+                    if time.monotonic() + delay > deadline:
+                        budget.counters[f'{priority}_rejected'] += 1
+                        return False
+                    budget.counters[f'{priority}_throttled'] += 1
+                    self._condition.wait(delay)
+            finally:
+                budget.waiting[priority] -= 1
+                if not budget.waiting[priority]:
+                    del budget.waiting[priority]
+
+    async def acquire_async(self, scope, priority=None):
+        """acquire() for async code: sleeps on the event loop instead of blocking a thread"""
+        priority = priority or current_priority()
+        max_wait = settings.GITHUB_BULK_MAX_WAIT if priority == BULK else settings.GITHUB_INTERACTIVE_MAX_WAIT
+        deadline = time.monotonic() + max_wait
+        with self._condition:
+            budget = self._budget(scope)
+            budget.waiting[priority] += 1
+        try:
+            while True:
+                with self._condition:
+                    delay = self._delay(budget, priority)
+                    if delay <= 0:
+                        budget.tokens -= 1
+                        budget.counters[f'{priority}_requests'] += 1
+                        return True
+                    if time.monotonic() + delay > deadline:
+                        budget.counters[f'{priority}_rejected'] += 1
+                        return False
+                    budget.counters[f'{priority}_throttled'] += 1
+                await asyncio.sleep(delay)
+        finally:
+            with self._condition:
+                budget.waiting[priority] -= 1
+                if not budget.waiting[priority]:
+                    del budget.waiting[priority]
+
+    def record(self, scope, response):
+        """Update the budget from a response; returns seconds to back off if it was rate limited"""
+        headers = response.headers
+        now = time.time()
+        with self._condition:
+            budget = self._budget(scope)
+            if 'x-ratelimit-remaining' in headers:
+                budget.limit = int(headers.get('x-ratelimit-limit', 0)) or budget.limit
+                budget.remaining = int(headers['x-ratelimit-remaining'])
+                budget.reset = int(headers.get('x-ratelimit-reset', 0)) or budget.reset
+                budget.resource = headers.get('x-ratelimit-resource', budget.resource)
+
+            wait = None
+            if _is_rate_limited(response):
+                if headers.get('retry-after'):
+                    wait = float(headers['retry-after'])
+                elif headers.get('x-ratelimit-remaining') == '0' and budget.reset:
+                    wait = max(budget.reset - now, 1)
+                else:
+                    wait = min(SECONDARY_LIMIT_BACKOFF * 2 ** budget.secondary_backoff, SECONDARY_LIMIT_MAX_BACKOFF)
+                    if wait < SECONDARY_LIMIT_MAX_BACKOFF:
+                        budget.secondary_backoff += 1
+                budget.blocked_until = max(budget.blocked_until, now + wait)
+                budget.counters['rate_limited'] += 1
+            elif response.status_code < 400:
+                budget.secondary_backoff = 0
+            self._condition.notify_all()
+            return wait
+
+    def bulk_pause(self, scope):
+        """Seconds before bulk calls for this token can go out again; 0 if they can now"""
+        with self._condition:
+            budget = self._budgets.get(scope)
+            if budget is None:
+                return 0
+            now = time.time()
+            pause = budget.blocked_until - now
+            if budget.remaining is not None and budget.remaining <= settings.GITHUB_BULK_BUDGET_RESERVE \
+                    and budget.reset:
+                pause = max(pause, budget.reset - now)
+            return max(pause, 0)
+
+    def stats(self):
+        """Budget of every token seen, keyed by a prefix of its token scope"""
+        with self._condition:
+            return {scope[:12]: budget.snapshot() for scope, budget in self._budgets.items()}
+
+
+def _is_rate_limited(response):
+    if response.status_code == 429:
+        return True
+    if response.status_code != 403:
+        return False
+    if response.headers.get('retry-after') or response.headers.get('x-ratelimit-remaining') == '0':
+        return True
+    # Secondary limits sometimes come without either header; only the message tells
+    try:
+        return b'rate limit' in response.content.lower()
+    except Exception:
+        return False
+
+
+scheduler = RateLimitScheduler()
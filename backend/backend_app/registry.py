@@ -0,0 +1,128 @@
+"""Latest-version lookups against the npm registry and PyPI."""
+import logging
+import threading
+
+import anyio
+import httpx
+from django.conf import settings
+
+from .cache import TieredCache
+from .metrics import AsyncInstrumentedTransport, operation_trace
+
+logger = logging.getLogger(__name__)
+
+# Shared by every scan: popular packages are looked up once per TTL, not per request
+version_cache = TieredCache(
+    'package_version',
+    ttl=settings.VERSION_CACHE_TTL,
+    stale_ttl=settings.VERSION_CACHE_STALE_TTL,
+    maxsize=settings.VERSION_CACHE_SIZE,
+)
+
+# Packages with a background refresh already running
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _cache_key(ecosystem, package):
+    return f'{ecosystem}:{package}'
+
+
+def _registry_url(ecosystem, package):
+    if ecosystem == 'npm':
+        return f'{settings.NPM_REGISTRY_URL}/{package}/latest'
+    return f'{settings.PYPI_URL}/{package}/json'
+
+
+def _extract_version(ecosystem, data):
+    if ecosystem == 'npm':
+        return data['version']
+    return data['info']['version']
+
+
+async def _fetch_latest(client, limiter, ecosystem, package, results):
+    async with limiter:
+        try:
+            response = await client.get(_registry_url(ecosystem, package))
+            if response.status_code == 200:
+                results[(ecosystem, package)] = _extract_version(ecosystem, response.json())
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.warning('Error fetching latest %s version of %s: %s', ecosystem, package, e)
+
+
+async def fetch_latest_versions_async(packages):
+    """Look up the latest version of every (ecosystem, package) pair concurrently.
+
+    Each registry gets its own concurrency limit from ``REGISTRY_CONCURRENCY``.
+    Packages the registry does not know about are left out of the result.
+    """
+    results = {}
+    limiters = {
+        ecosystem: anyio.CapacityLimiter(limit)
+        for ecosystem, limit in settings.REGISTRY_CONCURRENCY.items()
+    }
+    transport = AsyncInstrumentedTransport(httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(max_connections=sum(settings.REGISTRY_CONCURRENCY.values()))
+    ))
+    async with httpx.AsyncClient(timeout=settings.REGISTRY_TIMEOUT, transport=transport) as client:
+        async with anyio.create_task_group() as task_group:
+            for ecosystem, package in packages:
+                task_group.start_soon(
+                    _fetch_latest, client, limiters[ecosystem], ecosystem, package, results
+                )
+    return results
+
+
+def _refresh(packages):
+    try:
+        with operation_trace('background:version_refresh'):
+            fetched = anyio.run(fetch_latest_versions_async, packages)
+        version_cache.set_many({_cache_key(*key): latest for key, latest in fetched.items()})
+        version_cache.count('refreshes', len(fetched))
+    finally:
+        with _refreshing_lock:
+            _refreshing.difference_update(packages)
+
+
+def _refresh_in_background(packages):
+    with _refreshing_lock:
+        packages = [key for key in packages if key not in _refreshing]
+        _refreshing.update(packages)
+    if packages:
+        threading.Thread(target=_refresh, args=(packages,), daemon=True).start()
+
+
+def fetch_latest_versions(packages, stats=None):
+    """Synchronous entry point for views; returns {(ecosystem, package): latest_version}
+
+    Cached versions are served straight away. Stale ones are refreshed in a
+    background thread, and only the misses wait on the registries. A
+    ``stats`` dict, when given, receives how many lookups each path took.
+    """
+    packages = sorted(set(packages))
+    cached = version_cache.get_many([_cache_key(*key) for key in packages])
+
+    results, stale, missing = {}, [], []
+    for key in packages:
+        entry = cached.get(_cache_key(*key))
+        if entry is None:
+            missing.append(key)
+            continue
+        results[key] = entry.value
+        if not entry.fresh:
+            stale.append(key)
+
+    if missing:
+        fetched = anyio.run(fetch_latest_versions_async, missing)
+        version_cache.set_many({_cache_key(*key): latest for key, latest in fetched.items()})
+        results.update(fetched)
+    if stale:
+        _refresh_in_background(stale)
+    if stats is not None:
+        stats.update({
+            'versions': len(packages),
+            'versions_cached': len(packages) - len(missing),
+            'versions_stale': len(stale),
+            'versions_fetched': len(missing),
+        })
+    return results
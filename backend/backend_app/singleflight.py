@@ -0,0 +1,506 @@
+"""Single-flight: identical in-flight computations run once and share their result.
+
+A computation is identified by (owner, repo, revision, operation). The first
+caller for a key leads and computes; callers arriving while it runs follow
+and get the leader's result (or its exception) instead of repeating the
+upstream fan-out. Within a process, followers wait on the leader's future,
+from a thread or from the event loop alike. Streamed computations coalesce
+too: the leader yields chunks as they come, followers get the finished
+result as one chunk.
+
+Across worker processes, a leader also takes a lease in MongoDB (when
+``SINGLE_FLIGHT_LEASES`` is on). A leader in another process finding the
+lease taken polls it until the holder publishes the result, which stays
+readable for ``SINGLE_FLIGHT_RESULT_TTL`` seconds. If the holder fails, the
+lease is released and the next poller takes over. A live holder renews its
+lease however long it computes; a dead one's lease expires after
+``SINGLE_FLIGHT_LEASE_TTL``. Results cross processes as JSON.
+
+A bulk leader can be held back by the rate-limit scheduler for as long as
+``GITHUB_BULK_MAX_WAIT``. Interactive followers of a bulk leader therefore
+stop waiting once the scheduler pauses the leader's token, or after
+``SINGLE_FLIGHT_MAX_WAIT``, and compute for themselves.
+
+Results are shared objects: callers must not modify them.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from mongoengine.errors import MongoEngineException
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from . import metrics
+from .models import SingleFlightLease
+from .ratelimit import BULK, INTERACTIVE, current_priority, scheduler
+
+logger = logging.getLogger(__name__)
+
+calls_total = metrics.registry.register(metrics.Counter(
+    'singleflight_calls_total',
+    'Coalescible computations by role: leader (computed), follower (shared an in-process result), '
+    'remote_follower (shared the result of another process), '
+    'detached (a follower that stopped waiting for a held-back bulk leader and computed itself)',
+    ('operation', 'role'),
+))
+
+# Seconds between polls of a lease held by another process; doubles up to the maximum
+LEASE_POLL_INTERVAL = 0.1
+LEASE_POLL_MAX_INTERVAL = 1.0
+
+# Seconds between checks of whether an interactive follower should stop waiting for a bulk leader
+DETACH_CHECK_INTERVAL = 1.0
+
+_FREE = 'free'
+_RUNNING = 'running'
+_DONE = 'done'
+
+
+def _collection():
+    return SingleFlightLease._get_collection()
+
+
+def _acquire(key, holder):
+    """Take the lease on ``key``; True if it is ours now (or MongoDB cannot be reached)"""
+    now = datetime.utcnow()
+    try:
+        # A live lease fails the filter, so the upsert collides with it on _id
+        _collection().update_one(
+            {'_id': key, 'expires_at': {'$lte': now}},
+            {'$set': {
+                'holder': holder,
+                'status': _RUNNING,
+                'result': None,
+                'expires_at': now + timedelta(seconds=settings.SINGLE_FLIGHT_LEASE_TTL),
+            }},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Single-flight lease on %s unavailable, computing without it: %s', key, e)
+        return True
+
+
+def _poll(key):
+    """State of the lease on ``key``: (state, result)"""
+    try:
+        lease = _collection().find_one({'_id': key})
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Could not read single-flight lease on %s: %s', key, e)
+        return _FREE, None
+    if lease is None or lease['expires_at'] <= datetime.utcnow():
+        return _FREE, None
+    if lease['status'] == _DONE:
+        return _DONE, json.loads(lease['result'])
+    return _RUNNING, None
+
+
+def _renew(key, holder):
+    """Push back the expiry of a lease we still hold"""
+    try:
+        _collection().update_one(
+            {'_id': key, 'holder': holder, 'status': _RUNNING},
+            {'$set': {'expires_at': datetime.utcnow() + timedelta(seconds=settings.SINGLE_FLIGHT_LEASE_TTL)}}
+        )
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Could not renew single-flight lease on %s: %s', key, e)
+
+
+@contextmanager
+def _renewing(key, holder):
+    """Renew the lease on ``key`` every third of its TTL until the block exits"""
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(settings.SINGLE_FLIGHT_LEASE_TTL / 3):
+            _renew(key, holder)
+
+    threading.Thread(target=renew, name='lease-renewal', daemon=True).start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def _publish(key, holder, result):
+    """Hand the result to followers in other processes and turn the lease into a short-lived record"""
+    try:
+        _collection().update_one({'_id': key, 'holder': holder}, {'$set': {
+            'status': _DONE,
+            'result': json.dumps(result),
+            'expires_at': datetime.utcnow() + timedelta(seconds=settings.SINGLE_FLIGHT_RESULT_TTL),
+        }})
+    except (TypeError, ValueError, MongoEngineException, PyMongoError) as e:
+        logger.warning('Could not publish single-flight result of %s: %s', key, e)
+        _release(key, holder)
+
+
+def _release(key, holder):
+    try:
+        _collection().delete_one({'_id': key, 'holder': holder})
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Could not release single-flight lease on %s: %s', key, e)
+
+
+class _LeaderCancelled(Exception):
+    """The leader was cancelled (or its stream closed) before finishing; its followers start over"""
+
+
+# Returned by a follower's wait when it should compute for itself
+_DETACH = object()
+
+
+@asynccontextmanager
+async def _aclosing(generator):
+    """Close an async generator however the block ends
+
+    Unlike ``yield from``, ``async for`` leaves an abandoned generator open
+    until it is garbage collected, and a leader's stream must settle at once.
+    """
+    try:
+        yield generator
+    finally:
+        await generator.aclose()
+
+
+class SingleFlight:
+    """Coalesces concurrent runs of one operation per (owner, repo, revision)"""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def key(self, owner, repo_name, revision):
+        return f'{self.operation}:{owner}/{repo_name}@{revision}'
+
+    def _join(self, key, scope):
+        """Return (future, is_leader) for ``key``"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            # A running future cannot be cancelled, so one follower giving up
+            # (e.g. an async view whose client went away) cannot cancel it for all
+            future.set_running_or_notify_cancel()
+            future.priority = current_priority()
+            future.scope = scope
+            return future, True
+
+    def _inverted(self, future):
+        """True if the caller is interactive and the leader bulk work"""
+        return current_priority() == INTERACTIVE and future.priority == BULK
+
+    def _held_back(self, future, started):
+        """True if an interactive follower should stop waiting for this bulk leader"""
+        if time.monotonic() - started >= settings.SINGLE_FLIGHT_MAX_WAIT:
+            return True
+        return future.scope is not None and scheduler.bulk_pause(future.scope) > 0
+
+    def _wait(self, future):
+        """The leader's result, or _DETACH"""
+        if not self._inverted(future):
+            return future.result()
+        started = time.monotonic()
+        while True:
+            if not future.done() and self._held_back(future, started):
+                return _DETACH
+            try:
+                return future.result(timeout=DETACH_CHECK_INTERVAL)
+            except FutureTimeoutError:
+                pass
+
+    async def _await(self, future):
+        """_wait() for async code"""
+        waiter = asyncio.wrap_future(future)
+        if not self._inverted(future):
+            return await waiter
+        started = time.monotonic()
+        while True:
+            if not future.done() and self._held_back(future, started):
+                # Running futures ignore cancellation, so this only drops our waiter
+                waiter.cancel()
+                return _DETACH
+            done, _ = await asyncio.wait({waiter}, timeout=DETACH_CHECK_INTERVAL)
+            if done:
+                return waiter.result()
+
+    def _settle(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            future.set_exception(_LeaderCancelled())
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _count(self, role):
+        calls_total.inc(operation=self.operation, role=role)
+
+    def run(self, owner, repo_name, revision, compute, scope=None):
+        """Return ``compute()``, or the result of an identical run already in flight
+
+        ``scope`` is the token scope ``compute`` makes its GitHub calls under,
+        if any; interactive followers stop waiting when its bulk calls are paused.
+        """
+        key = self.key(owner, repo_name, revision)
+        while True:
+            future, leader = self._join(key, scope)
+            if leader:
+                break
+            self._count('follower')
+            try:
+                result = self._wait(future)
+            except _LeaderCancelled:
+                continue
+            if result is not _DETACH:
+                return result
+            self._count('detached')
+            return compute()
+        try:
+            result = self._lead(key, compute)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def arun(self, owner, repo_name, revision, compute, scope=None):
+        """run() for async code: ``compute`` is a coroutine function, waits happen on the event loop"""
+        key = self.key(owner, repo_name, revision)
+        while True:
+            future, leader = self._join(key, scope)
+            if leader:
+                break
+            self._count('follower')
+            try:
+                result = await self._await(future)
+            except _LeaderCancelled:
+                continue
+            if result is not _DETACH:
+                return result
+            self._count('detached')
+            return await compute()
+        try:
+            result = await self._alead(key, compute)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def stream(self, owner, repo_name, revision, produce):
+        """run() for streamed results: yields the items of ``produce()``, a generator returning the result
+
+        Followers yield the leader's result as their only item, so it must be
+        what the items add up to. Closing the leader's stream early makes its
+        followers start over.
+        """
+        key = self.key(owner, repo_name, revision)
+        while True:
+            future, leader = self._join(key, None)
+            if leader:
+                break
+            self._count('follower')
+            try:
+                result = self._wait(future)
+            except _LeaderCancelled:
+                continue
+            if result is _DETACH:
+                self._count('detached')
+                return (yield from produce())
+            yield result
+            return result
+        try:
+            result = yield from self._lead_stream(key, produce)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def _contend(self, key, holder):
+        """Wait for the lease on ``key``; returns (state, result)
+
+        ``_RUNNING`` means the lease is ours, ``_DONE`` that another process
+        published ``result`` first and ``_FREE`` that we gave up waiting.
+        """
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_MAX_WAIT
+        delay = LEASE_POLL_INTERVAL
+        acquired = _acquire(key, holder)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, LEASE_POLL_MAX_INTERVAL)
+            state, result = _poll(key)
+            if state == _DONE:
+                return _DONE, result
+            if state == _FREE:
+                acquired = _acquire(key, holder)
+        if not acquired:
+            logger.warning('Gave up waiting for single-flight lease on %s', key)
+            return _FREE, None
+        return _RUNNING, None
+
+    def _lead(self, key, compute):
+        if not settings.SINGLE_FLIGHT_LEASES:
+            self._count('leader')
+            return compute()
+        holder = uuid.uuid4().hex
+        state, result = self._contend(key, holder)
+        if state == _DONE:
+            self._count('remote_follower')
+            return result
+        self._count('leader')
+        if state == _FREE:
+            return compute()
+
+        try:
+            with _renewing(key, holder):
+                result = compute()
+        except BaseException:
+            _release(key, holder)
+            raise
+        _publish(key, holder, result)
+        return result
+
+    def _lead_stream(self, key, produce):
+        if not settings.SINGLE_FLIGHT_LEASES:
+            self._count('leader')
+            return (yield from produce())
+        holder = uuid.uuid4().hex
+        state, result = self._contend(key, holder)
+        if state == _DONE:
+            self._count('remote_follower')
+            yield result
+            return result
+        self._count('leader')
+        if state == _FREE:
+            return (yield from produce())
+
+        try:
+            with _renewing(key, holder):
+                result = yield from produce()
+        except BaseException:
+            _release(key, holder)
+            raise
+        _publish(key, holder, result)
+        return result
+
+    async def astream(self, owner, repo_name, revision, produce, combine):
+        """stream() for async code: ``produce`` is an async generator function
+
+        Async generators cannot return a value, so the result is
+        ``combine(items)``; a follower's only item is that result.
+        """
+        key = self.key(owner, repo_name, revision)
+        while True:
+            future, leader = self._join(key, None)
+            if leader:
+                break
+            self._count('follower')
+            try:
+                result = await self._await(future)
+            except _LeaderCancelled:
+                continue
+            if result is not _DETACH:
+                yield result
+                return
+            self._count('detached')
+            async with _aclosing(produce()) as stream:
+                async for item in stream:
+                    yield item
+            return
+        items = []
+        try:
+            async with _aclosing(self._alead_stream(key, produce, combine)) as stream:
+                async for item in stream:
+                    items.append(item)
+                    yield item
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, combine(items))
+
+    async def _acontend(self, key, holder):
+        """_contend() for async code"""
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_MAX_WAIT
+        delay = LEASE_POLL_INTERVAL
+        acquired = await sync_to_async(_acquire, thread_sensitive=False)(key, holder)
+        while not acquired and time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LEASE_POLL_MAX_INTERVAL)
+            state, result = await sync_to_async(_poll, thread_sensitive=False)(key)
+            if state == _DONE:
+                return _DONE, result
+            if state == _FREE:
+                acquired = await sync_to_async(_acquire, thread_sensitive=False)(key, holder)
+        if not acquired:
+            logger.warning('Gave up waiting for single-flight lease on %s', key)
+            return _FREE, None
+        return _RUNNING, None
+
+    async def _alead(self, key, compute):
+        if not settings.SINGLE_FLIGHT_LEASES:
+            self._count('leader')
+            return await compute()
+        holder = uuid.uuid4().hex
+        state, result = await self._acontend(key, holder)
+        if state == _DONE:
+            self._count('remote_follower')
+            return result
+        self._count('leader')
+        if state == _FREE:
+            return await compute()
+
+        try:
+            with _renewing(key, holder):
+                result = await compute()
+        except BaseException:
+            await sync_to_async(_release, thread_sensitive=False)(key, holder)
+            raise
+        await sync_to_async(_publish, thread_sensitive=False)(key, holder, result)
+        return result
+
+    async def _alead_stream(self, key, produce, combine):
+        if not settings.SINGLE_FLIGHT_LEASES:
+            self._count('leader')
+            async with _aclosing(produce()) as stream:
+                async for item in stream:
+                    yield item
+            return
+        holder = uuid.uuid4().hex
+        state, result = await self._acontend(key, holder)
+        if state == _DONE:
+            self._count('remote_follower')
+            yield result
+            return
+        self._count('leader')
+        if state == _FREE:
+            async with _aclosing(produce()) as stream:
+                async for item in stream:
+                    yield item
+            return
+
+        items = []
+        try:
+            with _renewing(key, holder):
+                async with _aclosing(produce()) as stream:
+                    async for item in stream:
+                        items.append(item)
+                        yield item
+        except BaseException:
+            await sync_to_async(_release, thread_sensitive=False)(key, holder)
+            raise
+        await sync_to_async(_publish, thread_sensitive=False)(key, holder, combine(items))
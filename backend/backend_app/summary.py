@@ -0,0 +1,294 @@
+"""Repository context gathering, prompt building and result caching for AI summaries."""
+import asyncio
+import logging
+from base64 import b64decode
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from mongoengine.errors import MongoEngineException
+from pymongo.errors import PyMongoError
+
+from .clients import async_groq_client, async_host_gate, fanout_executor, groq_client
+from .github import github_get, github_get_async
+from .models import RepoSummary
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = 'mixtral-8x7b-32768'
+# Bump whenever build_summary_messages changes so cached summaries are regenerated
+SUMMARY_PROMPT_VERSION = '1'
+README_EXCERPT_LENGTH = 4000
+
+
+class RepoContextError(Exception):
+    """The repository itself could not be fetched; carries GitHub's status code"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class RepoContext:
+    """Everything the summary prompt needs to know about a repository"""
+    name: str
+    full_name: str
+    description: str
+    stars: int
+    forks: int
+    default_branch: str
+    pushed_at: str
+    languages: list = field(default_factory=list)
+    readme_excerpt: str = ''
+
+
+def _readme_text(response):
+    if response.status_code != 200:
+        logger.debug('No README found or unable to fetch README')
+        return ''
+    readme_content = b64decode(response.json()['content']).decode('utf-8')
+    logger.debug('README content length: %d characters', len(readme_content))
+    return readme_content
+
+
+def _language_names(response):
+    if response.status_code != 200:
+        logger.debug('No languages found or unable to fetch languages')
+        return []
+    return list(response.json().keys())
+
+
+def _fetch_readme(owner, repo_name, access_token):
+    return _readme_text(github_get(f'/repos/{owner}/{repo_name}/readme', access_token))
+
+
+def _fetch_languages(owner, repo_name, access_token):
+    return _language_names(github_get(f'/repos/{owner}/{repo_name}/languages', access_token))
+
+
+def _repo_context(repo_data, readme_content, languages):
+    return RepoContext(
+        name=repo_data['name'],
+        full_name=repo_data['full_name'],
+        description=repo_data['description'] or "",
+        stars=repo_data['stargazers_count'],
+        forks=repo_data['forks_count'],
+        default_branch=repo_data.get('default_branch'),
+        pushed_at=repo_data.get('pushed_at'),
+        languages=languages,
+        readme_excerpt=readme_content[:README_EXCERPT_LENGTH],
+    )
+
+
+def gather_repo_context(owner, repo_name, access_token):
+    """Fetch repository metadata, README and languages in parallel
+
+    The three requests are independent, so the whole stage costs a single
+    round trip. Raises RepoContextError when the repository is not accessible;
+    a missing README or language breakdown just leaves those fields empty.
+    """
+    executor = fanout_executor()
+    repo_future = executor.submit(github_get, f'/repos/{owner}/{repo_name}', access_token)
+    readme_future = executor.submit(_fetch_readme, owner, repo_name, access_token)
+    languages_future = executor.submit(_fetch_languages, owner, repo_name, access_token)
+
+    repo_response = repo_future.result()
+    if repo_response.status_code != 200:
+        readme_future.cancel()
+        languages_future.cancel()
+        raise RepoContextError('Failed to fetch repository details', repo_response.status_code)
+
+    return _repo_context(repo_response.json(), readme_future.result(), languages_future.result())
+
+
+async def gather_repo_context_async(owner, repo_name, access_token):
+    """gather_repo_context() for async views: the three requests run concurrently on the event loop"""
+    repo_path = f'/repos/{owner}/{repo_name}'
+    repo_response, readme_response, languages_response = await asyncio.gather(
+        github_get_async(repo_path, access_token),
+        github_get_async(f'{repo_path}/readme', access_token),
+        github_get_async(f'{repo_path}/languages', access_token),
+    )
+    if repo_response.status_code != 200:
+        raise RepoContextError('Failed to fetch repository details', repo_response.status_code)
+
+    return _repo_context(repo_response.json(), _readme_text(readme_response), _language_names(languages_response))
+
+
+def build_summary_messages(context):
+    """Chat messages asking the model for a resume-ready summary of ``context``"""
+    prompt = f"""Given the following GitHub repository information, generate a concise, professional summary suitable for a Software Engineer resume. Focus on the key technologies, purpose, and notable features. Follow the STAR format. Put metrics. Format the response in bullet points, which should be descriptive and not just superficial.
+
+Repository Information:
+- Name: {context.name}
+- Description: {context.description}
+- Primary Languages: {', '.join(context.languages)}
+- Stars: {context.stars}
+- Forks: {context.forks}
+
+README Excerpt:
+{context.readme_excerpt}
+
+Generate a summary in 3 points, highlighting the most important aspects of the project."""
+
+    return [
+        {"role": "system", "content": "You are a technical writer who creates concise, professional project summaries."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+# Concurrent requests for a summary of the same revision share one completion
+summary_flight = SingleFlight('summary')
+
+
+def _summary_revision(context):
+    return f'{context.pushed_at}:{SUMMARY_PROMPT_VERSION}:{SUMMARY_MODEL}'
+
+
+def generate_summary(user_login, context):
+    """Have Groq summarize ``context`` and cache the result; returns the summary text
+
+    Requests arriving while a summary of the same revision is being
+    generated wait for it instead of asking Groq again.
+    """
+    def complete():
+        completion = groq_client().chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=build_summary_messages(context),
+            temperature=0.3,
+            max_tokens=500
+        )
+        summary = completion.choices[0].message.content
+        store_summary(user_login, context, summary)
+        return summary
+
+    owner, repo_name = context.full_name.split('/', 1)
+    return summary_flight.run(owner, repo_name, _summary_revision(context), complete)
+
+
+def stream_summary(user_login, context):
+    """Yield the summary of ``context`` in chunks as Groq streams it, then cache it
+
+    Shares completions with generate_summary(): a request for a revision
+    whose summary is already being generated gets the finished text as a
+    single chunk.
+    """
+    def produce():
+        stream = groq_client().chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=build_summary_messages(context),
+            temperature=0.3,
+            max_tokens=500,
+            stream=True
+        )
+        parts = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                parts.append(content)
+                yield content
+        summary = ''.join(parts)
+        store_summary(user_login, context, summary)
+        return summary
+
+    owner, repo_name = context.full_name.split('/', 1)
+    return summary_flight.stream(owner, repo_name, _summary_revision(context), produce)
+
+
+def stream_summary_async(user_login, context):
+    """stream_summary() for async views: an async generator, with the completion streamed on the event loop"""
+    async def produce():
+        client = async_groq_client()
+        async with async_host_gate(str(client.base_url)):
+            stream = await client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=build_summary_messages(context),
+                temperature=0.3,
+                max_tokens=500,
+                stream=True
+            )
+            parts = []
+            async with stream:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        parts.append(content)
+                        yield content
+        summary = ''.join(parts)
+        if settings.SUMMARY_CACHE_ENABLED:
+            await sync_to_async(store_summary, thread_sensitive=False)(user_login, context, summary)
+
+    owner, repo_name = context.full_name.split('/', 1)
+    return summary_flight.astream(owner, repo_name, _summary_revision(context), produce, ''.join)
+
+
+async def generate_summary_async(user_login, context):
+    """generate_summary() for async views: the completion is awaited on the event loop"""
+    async def complete():
+        client = async_groq_client()
+        async with async_host_gate(str(client.base_url)):
+            completion = await client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=build_summary_messages(context),
+                temperature=0.3,
+                max_tokens=500
+            )
+        summary = completion.choices[0].message.content
+        if settings.SUMMARY_CACHE_ENABLED:
+            await sync_to_async(store_summary, thread_sensitive=False)(user_login, context, summary)
+        return summary
+
+    owner, repo_name = context.full_name.split('/', 1)
+    return await summary_flight.arun(owner, repo_name, _summary_revision(context), complete)
+
+
+def get_cached_summary(context):
+    """Return the stored summary for this revision of the repository, if any"""
+    if not settings.SUMMARY_CACHE_ENABLED or not context.pushed_at:
+        return None
+    try:
+        return RepoSummary.objects(
+            full_name=context.full_name,
+            revision=context.pushed_at,
+            prompt_version=SUMMARY_PROMPT_VERSION,
+            model=SUMMARY_MODEL,
+            expires_at__gt=datetime.utcnow()
+        ).first()
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Error reading cached summary: %s', e)
+        return None
+
+
+def store_summary(user_login, context, content):
+    """Save a freshly generated summary and trim the user's oldest entries"""
+    if not settings.SUMMARY_CACHE_ENABLED or not context.pushed_at:
+        return
+    now = datetime.utcnow()
+    try:
+        RepoSummary.objects(
+            full_name=context.full_name,
+            revision=context.pushed_at,
+            prompt_version=SUMMARY_PROMPT_VERSION,
+            model=SUMMARY_MODEL
+        ).update_one(
+            set__user=user_login,
+            set__content=content,
+            set__languages=context.languages,
+            set__created_at=now,
+            set__expires_at=now + timedelta(seconds=settings.SUMMARY_CACHE_MAX_AGE),
+            upsert=True
+        )
+        stale_ids = list(RepoSummary.objects(user=user_login).order_by('-created_at').skip(
+            settings.SUMMARY_CACHE_MAX_PER_USER
+        ).scalar('id'))
+        if stale_ids:
+            RepoSummary.objects(id__in=stale_ids).delete()
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Error storing summary: %s', e)
@@ -1,3 +1,723 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import async_views, clients, views
+from .cache import CACHES, TieredCache
+from .campaigns import _expire as expire_campaign, files_to_update
+from .dependencies import (
+    RepoTree, _parse_manifests, manifest_scan_cache, parse_requirements, resolve_current, scan_state_cache
+)
+from .github import github_get, token_scope
+from .dependency_index import IndexQueryError, index_scan, parse_range, query_index, version_key
+from .models import DependencyUse, RepoSummary
+from .ratelimit import (
+    BULK, INTERACTIVE, SECONDARY_LIMIT_BACKOFF, SECONDARY_LIMIT_MAX_BACKOFF, RateLimitScheduler, bulk_priority
+)
+from .registry import fetch_latest_versions, version_cache
+from .singleflight import _DONE, _FREE, _RUNNING, SingleFlight, _acquire, _poll
+from .webhooks import WebhookError, handle_delivery, handle_push, sign, verify_signature
+
+
+class VersionKeyTests(SimpleTestCase):
+    def test_release_numbers_are_zero_padded(self):
+        self.assertEqual(version_key('1.2.3'), '00000001.00000002.00000003.00000000')
+
+    def test_missing_parts_count_as_zero(self):
+        self.assertEqual(version_key('4.17'), version_key('4.17.0'))
+
+    def test_keys_sort_like_versions(self):
+        self.assertLess(version_key('1.9.0'), version_key('1.10.0'))
+        self.assertLess(version_key('0.99'), version_key('1'))
+
+    def test_prerelease_and_local_parts_are_ignored(self):
+        self.assertEqual(version_key('2.0.0rc1'), version_key('2.0.0'))
+        self.assertEqual(version_key('2.0.0+local'), version_key('2.0.0'))
+
+    def test_parts_beyond_the_width_are_clamped(self):
+        self.assertEqual(version_key('123456789'), '99999999.00000000.00000000.00000000')
+
+    def test_not_a_version(self):
+        self.assertIsNone(version_key('*'))
+        self.assertIsNone(version_key('git+https://github.com/octocat/hello-world.git'))
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_range(self):
+        self.assertEqual(parse_range('>=1.0, <2.0'), {'$gte': version_key('1.0'), '$lt': version_key('2.0')})
+
+    def test_bare_version_means_equal(self):
+        self.assertEqual(parse_range('v4.17.21'), {'$eq': version_key('4.17.21')})
+
+    def test_invalid_clause(self):
+        with self.assertRaises(IndexQueryError) as raised:
+            parse_range('>=1.0,~2')
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_repeated_operator(self):
+        with self.assertRaises(IndexQueryError):
+            parse_range('<2,<3')
+
+
+class QueryIndexTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(DependencyUse, 'objects')
+        self.objects = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.uses = self.objects.return_value.order_by.return_value
+        self.uses.count.return_value = 0
+
+    def raw_query(self):
+        return self.objects.call_args.kwargs['__raw__']
+
+    def test_package_names_are_normalized(self):
+        query_index('octocat', 'pip', 'Django_REST.framework')
+        self.assertEqual(self.raw_query(), {'owner': 'octocat', 'ecosystem': 'pip', 'package': 'django-rest-framework'})
+        self.objects.return_value.order_by.assert_called_once_with('repo', 'manifest')
+
+    def test_range_leaves_out_entries_without_a_version(self):
+        query_index('octocat', 'npm', 'lodash', '<4.17.21')
+        self.assertEqual(self.raw_query()['version_key'], {'$lt': version_key('4.17.21'), '$nin': [None]})
+
+    def test_not_equal_is_folded_into_nin(self):
+        query_index('octocat', 'npm', 'lodash', '>=4,!=4.17.0')
+        self.assertEqual(
+            self.raw_query()['version_key'], {'$gte': version_key('4'), '$nin': [None, version_key('4.17.0')]}
+        )
+
+    def test_pages(self):
+        self.uses.count.return_value = 45
+        _, total = query_index('octocat', 'npm', 'lodash', page=2, per_page=30)
+        self.assertEqual(total, 45)
+        self.uses.skip.assert_called_once_with(30)
+        self.uses.skip.return_value.limit.assert_called_once_with(30)
+
+
+@override_settings(DEPENDENCY_INDEX=True)
+class IndexScanTests(SimpleTestCase):
+    """Entries are indexed under the version their spec declares"""
+
+    def indexed(self, ecosystem, spec):
+        row = {
+            'ecosystem': ecosystem, 'package': 'flask', 'spec': spec,
+            'current': resolve_current(ecosystem, spec), 'file_path': 'requirements.txt'
+        }
+        with mock.patch.object(DependencyUse, '_get_collection') as collection:
+            index_scan('octocat', 'api', 'tree-1', [row])
+        operation, = collection.return_value.bulk_write.call_args.args[0]
+        fields = operation._doc['$set']
+        return fields['version'], fields['version_key']
+
+    def test_unpinned_requirements_have_no_version(self):
+        self.assertEqual(self.indexed('pip', ''), (None, None))
+        self.assertEqual(self.indexed('pip', '[async]'), (None, None))
+        self.assertEqual(self.indexed('npm', ''), (None, None))
+
+    def test_pinned_requirements_keep_their_version(self):
+        self.assertEqual(self.indexed('pip', '>=2.0,<3'), ('2.0', version_key('2.0')))
+        self.assertEqual(self.indexed('npm', '^4.17.21'), ('4.17.21', version_key('4.17.21')))
+
+
+@override_settings(GITHUB_WEBHOOK_SECRET='webhook-secret')
+class VerifySignatureTests(SimpleTestCase):
+    body = b'{"zen": "Design for failure."}'
+
+    def test_valid_signature(self):
+        self.assertTrue(verify_signature(self.body, sign(self.body, 'webhook-secret')))
+
+    def test_other_secret(self):
+        self.assertFalse(verify_signature(self.body, sign(self.body, 'another-secret')))
+
+    def test_tampered_body(self):
+        self.assertFalse(verify_signature(self.body + b' ', sign(self.body, 'webhook-secret')))
+
+    def test_missing_signature(self):
+        self.assertFalse(verify_signature(self.body, None))
+
+    def test_non_ascii_signature(self):
+        self.assertFalse(verify_signature(self.body, 'sha256=é'))
+
+
+@override_settings(METRICS_TOKEN='metrics-token')
+class MetricsAuthorizationTests(SimpleTestCase):
+    def get(self, view, authorization):
+        return view(RequestFactory().get('/', HTTP_AUTHORIZATION=authorization))
+
+    def test_valid_token(self):
+        self.assertEqual(self.get(views.cache_stats, 'Bearer metrics-token').status_code, 200)
+
+    def test_metrics_render_with_cache_rates(self):
+        response = self.get(views.metrics, 'Bearer metrics-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'cache_entries{cache="github_conditional"}', response.content)
+        self.assertNotIn(b'hit_rate', response.content)
+
+    def test_non_ascii_token_is_rejected(self):
+        for view in (views.metrics, views.cache_stats, views.rate_limit_stats):
+            with self.subTest(view=view.__name__):
+                self.assertEqual(self.get(view, 'Bearer métrics').status_code, 401)
+
+
+def _push(ref='refs/heads/main', **fields):
+    return {
+        'ref': ref,
+        'after': 'c0ffee',
+        'repository': {'name': 'hello-world', 'owner': {'login': 'octocat'}, 'default_branch': 'main'},
+        **fields,
+    }
+
+
+@override_settings(
+    SUMMARY_CACHE_ENABLED=True, GITHUB_WEBHOOK_TOKEN='webhook-token', WEBHOOK_PRECOMPUTE_SUMMARY=True
+)
+class HandlePushTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(RepoSummary, 'objects')
+        self.summaries = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.summaries.return_value.delete.return_value = 2
+        patcher = mock.patch('backend_app.webhooks.job_executor')
+        self.executor = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_default_branch_drops_summaries_and_queues_precompute(self):
+        result = handle_push(_push())
+        self.assertEqual(result['status'], 'accepted')
+        self.assertEqual(result['invalidated'], {'summaries': 2})
+        self.assertEqual(result['precompute'], ['dependencies', 'summary'])
+        self.summaries.assert_called_once_with(full_name='octocat/hello-world')
+        args = self.executor.submit.call_args.args
+        self.assertEqual(args[1:], ('octocat', 'hello-world', 'main', 'c0ffee', True))
+
+    def test_other_branch_is_ignored(self):
+        result = handle_push(_push(ref='refs/heads/feature'))
+        self.assertEqual(result['status'], 'ignored')
+        self.summaries.assert_not_called()
+        self.executor.submit.assert_not_called()
+
+    def test_deleted_branch_is_ignored(self):
+        self.assertEqual(handle_push(_push(deleted=True))['status'], 'ignored')
+        self.executor.submit.assert_not_called()
+
+    @override_settings(SUMMARY_CACHE_ENABLED=False)
+    def test_summaries_are_kept_without_the_summary_cache(self):
+        result = handle_push(_push())
+        self.assertEqual(result['invalidated'], {'summaries': 0})
+        self.assertEqual(result['precompute'], ['dependencies'])
+        self.summaries.assert_not_called()
+
+    @override_settings(GITHUB_WEBHOOK_TOKEN=None)
+    def test_nothing_is_precomputed_without_a_token(self):
+        self.assertEqual(handle_push(_push())['precompute'], [])
+        self.executor.submit.assert_not_called()
+
+    def test_malformed_payload(self):
+        with self.assertRaises(WebhookError) as raised:
+            handle_push({'ref': 'refs/heads/main'})
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_delivery_must_be_a_json_object(self):
+        with self.assertRaises(WebhookError):
+            handle_delivery('push', b'[]')
+        self.assertEqual(handle_delivery('ping', json.dumps({'zen': 'Keep it simple.'}).encode())['status'], 'pong')
+
+
+class ParseManifestsTests(SimpleTestCase):
+    """Re-scans parse only the manifests whose blob changed"""
+
+    contents = {
+        'sha-app-1': '{"dependencies": {"react": "^18.2.0"}}',
+        'sha-app-2': '{"dependencies": {"react": "^18.3.1"}}',
+        'sha-api-1': 'django==4.2.17\nhttpx==0.28.1',
+        'sha-web-1': '{"devDependencies": {"vite": "^5.0.0"}}',
+    }
+
+    def setUp(self):
+        for cache in (manifest_scan_cache, scan_state_cache):
+            cache.memory.clear()
+            patcher = mock.patch.object(cache, 'persistent', False)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+            self.addCleanup(cache.memory.clear)
+        patcher = mock.patch('backend_app.dependencies.load_manifests', side_effect=self.load_manifests)
+        self.load = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load_manifests(self, owner, repo_name, blobs, access_token, ref=None):
+        return {sha: self.contents[sha] for _, sha in blobs}
+
+    def scan(self, tree_sha, blobs):
+        reuse = {}
+        tree = RepoTree('main', f'commit-{tree_sha}', tree_sha, blobs)
+        return _parse_manifests('octocat', 'monorepo', tree, 'token', reuse), reuse
+
+    def test_first_scan_parses_everything(self):
+        manifests, reuse = self.scan('tree-1', {'app/package.json': 'sha-app-1', 'requirements.txt': 'sha-api-1'})
+        self.assertEqual(manifests, {
+            'app/package.json': [['react', '^18.2.0']],
+            'requirements.txt': [['django', '==4.2.17'], ['httpx', '==0.28.1']],
+        })
+        self.assertEqual(reuse['previous_tree_sha'], None)
+        self.assertEqual((reuse['manifests_parsed'], reuse['manifests_reused'], reuse['manifests_added']), (2, 0, 2))
+
+    def test_rescan_parses_only_changed_blobs(self):
+        self.scan('tree-1', {'app/package.json': 'sha-app-1', 'requirements.txt': 'sha-api-1'})
+        manifests, reuse = self.scan('tree-2', {'app/package.json': 'sha-app-2', 'web/package.json': 'sha-web-1'})
+
+        self.assertEqual(
+            self.load.call_args.args[2], [('app/package.json', 'sha-app-2'), ('web/package.json', 'sha-web-1')]
+        )
+        self.assertEqual(manifests['app/package.json'], [['react', '^18.3.1']])
+        self.assertEqual(reuse, {
+            'previous_tree_sha': 'tree-1',
+            'manifests': 2,
+            'manifests_reused': 0,
+            'manifests_parsed': 2,
+            'manifests_added': 1,
+            'manifests_changed': 1,
+            'manifests_removed': 1,
+        })
+
+    def test_unchanged_blobs_are_reused(self):
+        self.scan('tree-1', {'app/package.json': 'sha-app-1', 'requirements.txt': 'sha-api-1'})
+        manifests, reuse = self.scan('tree-2', {'app/package.json': 'sha-app-1', 'requirements.txt': 'sha-api-1'})
+
+        self.assertEqual(self.load.call_args.args[2], [])
+        self.assertEqual(manifests['requirements.txt'], [['django', '==4.2.17'], ['httpx', '==0.28.1']])
+        self.assertEqual((reuse['manifests_reused'], reuse['manifests_parsed'], reuse['manifests_changed']), (2, 0, 0))
+
+
+class FilesToUpdateTests(SimpleTestCase):
+    """Campaigns only rewrite requirements that pin one plain version"""
+
+    def rows(self, content):
+        return [
+            {'ecosystem': 'pip', 'package': package, 'spec': spec,
+             'current': resolve_current('pip', spec), 'file_path': 'requirements.txt'}
+            for package, spec in parse_requirements(content)
+        ]
+
+    def test_parser_keeps_every_clause(self):
+        self.assertEqual(parse_requirements('requests >= 2.0, < 3  # capped\ncelery[redis]==5.3\nflask'), [
+            ('requests', '>=2.0,<3'), ('celery', '[redis]==5.3'), ('flask', '')
+        ])
+
+    def test_ranges_and_extras_are_not_rewritten(self):
+        rows = self.rows('requests>=2.0,<3\ncelery[redis]==5.3\nflask==1.0\nhttpx>=0.27')
+        targets = {('pip', name): '9.0' for name in ('requests', 'celery', 'flask', 'httpx')}
+
+        self.assertEqual(files_to_update(rows, targets), {'requirements.txt': {
+            'flask': {'current': '1.0', 'latest': '9.0'},
+            'httpx': {'current': '0.27', 'latest': '9.0'},
+        }})
+
+
+@override_settings(CAMPAIGN_TIMEOUT=3600)
+class CampaignExpireTests(SimpleTestCase):
+    """Campaigns whose driver was lost to a restart finish as failed, ready to resume"""
+
+    def setUp(self):
+        patcher = mock.patch('backend_app.campaigns.Campaign')
+        self.model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def campaign(self, started_ago, repo_updated_ago=None, status='running'):
+        now = datetime.utcnow()
+        repos = [{'repo': 'octocat/a', 'status': 'pending'}]
+        if repo_updated_ago is not None:
+            updated_at = now - timedelta(seconds=repo_updated_ago)
+            repos.append({'repo': 'octocat/b', 'status': 'updated', 'updated_at': updated_at})
+        return mock.Mock(
+            campaign_id='c1', status=status, created_at=now - timedelta(seconds=started_ago),
+            started_at=now - timedelta(seconds=started_ago), repos=repos
+        )
+
+    def test_running_campaign_without_progress_is_failed(self):
+        campaign = self.campaign(started_ago=7200)
+        self.assertIs(expire_campaign(campaign), campaign)
+
+        self.model.objects.assert_called_once_with(campaign_id='c1', status='running')
+        update = self.model.objects.return_value.update_one.call_args.kwargs
+        self.assertEqual(update['set__status'], 'failed')
+        self.assertIn('Resume the campaign', update['set__error'])
+        campaign.reload.assert_called_once_with()
+
+    def test_recent_repository_progress_keeps_it_running(self):
+        expire_campaign(self.campaign(started_ago=7200, repo_updated_ago=60))
+        expire_campaign(self.campaign(started_ago=7200, status='succeeded'))
+        self.model.objects.assert_not_called()
+
+    def test_campaign_driven_by_this_process_is_left_alone(self):
+        with mock.patch('backend_app.campaigns._running', {'c1'}):
+            expire_campaign(self.campaign(started_ago=7200))
+        self.model.objects.assert_not_called()
+
+
+@override_settings(CAMPAIGN_STREAM_INTERVAL=0.01, CAMPAIGN_STREAM_HEARTBEAT=0.03, CAMPAIGN_STREAM_MAX_DURATION=0.1)
+class CampaignEventStreamTests(SimpleTestCase):
+    """Campaign streams send keep-alives while nothing changes and end after the cap"""
+
+    def campaign(self, status='running'):
+        return mock.Mock(status=status, repos=[{'repo': 'octocat/a', 'status': 'pending'}], error=None)
+
+    async def collect(self, events):
+        return [event async for event in events]
+
+    def assert_heartbeats_then_timeout(self, events):
+        self.assertTrue(events[0].startswith('event: repo\n'))
+        self.assertIn(': keep-alive\n\n', events)
+        self.assertEqual(events.count(events[0]), 1)
+        self.assertTrue(events[-1].startswith('event: timeout\n'))
+
+    def test_sync_stream(self):
+        campaign = self.campaign()
+        with mock.patch('backend_app.views.refresh_campaign', return_value=campaign):
+            self.assert_heartbeats_then_timeout(list(views._campaign_event_stream(campaign)))
+
+    def test_async_stream(self):
+        campaign = self.campaign()
+        with mock.patch('backend_app.async_views.refresh_campaign', return_value=campaign):
+            events = asyncio.run(self.collect(async_views._campaign_event_stream(campaign)))
+        self.assert_heartbeats_then_timeout(events)
+
+    def test_expired_campaign_ends_the_stream(self):
+        failed = self.campaign(status='failed')
+        with mock.patch('backend_app.views.refresh_campaign', return_value=failed):
+            events = list(views._campaign_event_stream(self.campaign()))
+        self.assertTrue(events[-1].startswith('event: done\n'))
+        self.assertIn('"status": "failed"', events[-1])
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TieredCache('tests', ttl=60, stale_ttl=300, maxsize=2, persistent=False)
+        self.addCleanup(CACHES.pop, 'tests')
+
+    def store(self, key, value, age):
+        self.cache.memory.set(key, value, datetime.utcnow() - timedelta(seconds=age))
+
+    def test_fresh_within_ttl(self):
+        self.cache.set('react', '18.3.1')
+        self.assertEqual(self.cache.get('react'), ('18.3.1', True))
+
+    def test_stale_until_stale_ttl_runs_out(self):
+        self.store('react', '18.2.0', age=120)
+        self.assertEqual(self.cache.get('react'), ('18.2.0', False))
+        self.assertEqual(self.cache.counters['stale_hits'], 1)
+
+    def test_expired_after_ttl_and_stale_ttl(self):
+        self.store('react', '18.2.0', age=361)
+        self.assertIsNone(self.cache.get('react'))
+
+    def test_no_ttl_never_expires(self):
+        cache = TieredCache('tests', ttl=None, persistent=False)
+        cache.memory.set('tree', ['package.json'], datetime.utcnow() - timedelta(days=365))
+        self.assertEqual(cache.get('tree'), (['package.json'], True))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.set_many({'react': '18.3.1', 'vite': '5.4.0'})
+        self.cache.get('react')
+        self.cache.set('django', '5.1.2')
+        self.assertIsNone(self.cache.get('vite'))
+        self.assertIsNotNone(self.cache.get('react'))
+        self.assertEqual(self.cache.counters['evictions'], 1)
+
+
+class FetchLatestVersionsTests(SimpleTestCase):
+    """Stale versions are served at once and refreshed in the background"""
+
+    def setUp(self):
+        version_cache.memory.clear()
+        self.addCleanup(version_cache.memory.clear)
+        for name, value in (('persistent', False), ('ttl', 3600), ('stale_ttl', 86400)):
+            patcher = mock.patch.object(version_cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('backend_app.registry._refresh_in_background')
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            'backend_app.registry.fetch_latest_versions_async',
+            new=mock.AsyncMock(return_value={('pip', 'django'): '5.1.2'})
+        )
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_misses_wait_on_the_registries(self):
+        version_cache.set('npm:react', '18.3.1')
+        version_cache.memory.set('npm:vite', '5.3.0', datetime.utcnow() - timedelta(hours=2))
+        stats = {}
+        versions = fetch_latest_versions([('npm', 'react'), ('npm', 'vite'), ('pip', 'django')], stats)
+
+        self.assertEqual(versions, {('npm', 'react'): '18.3.1', ('npm', 'vite'): '5.3.0', ('pip', 'django'): '5.1.2'})
+        self.fetch.assert_awaited_once_with([('pip', 'django')])
+        self.refresh.assert_called_once_with([('npm', 'vite')])
+        self.assertEqual((stats['versions_cached'], stats['versions_stale']), (2, 1))
+        self.assertEqual(version_cache.get('pip:django'), ('5.1.2', True))
+
+
+@override_settings(
+    GITHUB_REQUESTS_PER_SECOND=10,
+    GITHUB_REQUEST_BURST=50,
+    GITHUB_INTERACTIVE_BURST_RESERVE=10,
+    GITHUB_BULK_BUDGET_RESERVE=500,
+    GITHUB_INTERACTIVE_MAX_WAIT=5,
+    GITHUB_RATE_LIMIT_TOKENS=3,
+)
+class RateLimitSchedulerTests(SimpleTestCase):
+    """Which calls the scheduler lets out first, and for how long it holds them back"""
+
+    def setUp(self):
+        self.scheduler = RateLimitScheduler()
+        self.budget = self.scheduler._budget('token')
+
+    def rate_limit_headers(self, remaining, reset_in=600):
+        return {
+            'x-ratelimit-limit': '5000',
+            'x-ratelimit-remaining': str(remaining),
+            'x-ratelimit-reset': str(int(time.time()) + reset_in),
+        }
+
+    def test_bulk_leaves_the_burst_reserve_to_interactive_calls(self):
+        self.budget.tokens = 5
+        self.assertEqual(self.scheduler._delay(self.budget, INTERACTIVE), 0)
+        self.assertGreater(self.scheduler._delay(self.budget, BULK), 0)
+
+    def test_bulk_yields_to_waiting_interactive_calls(self):
+        self.budget.waiting[INTERACTIVE] += 1
+        self.assertGreater(self.scheduler._delay(self.budget, BULK), 0)
+        self.assertEqual(self.scheduler._delay(self.budget, INTERACTIVE), 0)
+
+    def test_bulk_pauses_until_reset_on_a_low_budget(self):
+        self.scheduler.record('token', httpx.Response(200, headers=self.rate_limit_headers(remaining=400)))
+        self.assertGreater(self.scheduler._delay(self.budget, BULK), 590)
+        self.assertEqual(self.scheduler._delay(self.budget, INTERACTIVE), 0)
+        self.assertGreater(self.scheduler.bulk_pause('token'), 590)
+
+    def test_interactive_calls_give_up_instead_of_waiting_long(self):
+        self.scheduler.record('token', httpx.Response(429, headers={'retry-after': '60'}))
+        self.assertFalse(self.scheduler.acquire('token', INTERACTIVE))
+        self.assertEqual(self.budget.counters['interactive_rejected'], 1)
+
+    def test_retry_after_is_honoured(self):
+        self.assertEqual(self.scheduler.record('token', httpx.Response(403, headers={'retry-after': '7'})), 7)
+
+    def test_secondary_backoff_doubles_up_to_the_cap(self):
+        limited = httpx.Response(403, content=b'You have exceeded a secondary rate limit')
+        waits = [self.scheduler.record('token', limited) for _ in range(8)]
+        self.assertEqual(waits[:2], [SECONDARY_LIMIT_BACKOFF, SECONDARY_LIMIT_BACKOFF * 2])
+        self.assertEqual(max(waits), SECONDARY_LIMIT_MAX_BACKOFF)
+        self.assertIsNone(self.scheduler.record('token', httpx.Response(200)))
+        self.assertEqual(self.scheduler.record('token', limited), SECONDARY_LIMIT_BACKOFF)
+
+    def test_idle_budgets_are_forgotten_least_recently_used_first(self):
+        self.scheduler.record('blocked', httpx.Response(429, headers={'retry-after': '60'}))
+        for scope in ('a', 'b', 'c'):
+            self.scheduler.acquire(scope, INTERACTIVE)
+        self.assertEqual(list(self.scheduler._budgets), ['blocked', 'b', 'c'])
+
+
+@override_settings(
+    HTTP_CLIENT_FANOUT_WORKERS=4, HTTP_CLIENT_BULK_FANOUT_WORKERS=4, GITHUB_BULK_BUDGET_RESERVE=500
+)
+class FanoutPriorityTests(SimpleTestCase):
+    """Bulk calls paused by the scheduler never hold the threads interactive calls fan out on"""
+
+    def setUp(self):
+        patcher = mock.patch.dict(clients._executors, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = RateLimitScheduler()
+        patcher = mock.patch('backend_app.github.scheduler', self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        http = mock.Mock()
+        http.request.return_value = httpx.Response(200, json={'login': 'octocat'})
+        patcher = mock.patch('backend_app.github.http_client', return_value=http)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_interactive_calls_run_while_bulk_calls_wait_for_the_reset(self):
+        # Token A is down to its bulk reserve: its bulk calls wait until the reset
+        budget = self.scheduler._budget(token_scope('token-a'))
+        budget.remaining, budget.reset = 400, int(time.time()) + 2
+        with bulk_priority():
+            bulk = [
+                clients.fanout_executor().submit(github_get, '/user', 'token-a', conditional=False) for _ in range(8)
+            ]
+
+        started = time.monotonic()
+        interactive = clients.fanout_executor().submit(github_get, '/user', 'token-b', conditional=False)
+        self.assertEqual(interactive.result(timeout=1).status_code, 200)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertFalse(any(future.done() for future in bulk))
+        for future in bulk:
+            future.result(timeout=10)
+
+
+@override_settings(SINGLE_FLIGHT_LEASES=False)
+class SingleFlightTests(SimpleTestCase):
+    """Followers share the leader's outcome, or start over when it never comes"""
+
+    def setUp(self):
+        self.flight = SingleFlight('test')
+        self.roles = []
+        patcher = mock.patch.object(self.flight, '_count', side_effect=self.roles.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def wait_for(self, role, count=1):
+        deadline = time.monotonic() + 5
+        while self.roles.count(role) < count:
+            self.assertLess(time.monotonic(), deadline, f'no {role} after 5 seconds')
+            time.sleep(0.01)
+
+    def in_thread(self, target):
+        outcome = {}
+
+        def run():
+            try:
+                outcome['result'] = target()
+            except Exception as e:
+                outcome['error'] = e
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        return thread, outcome
+
+    def test_follower_gets_the_leaders_exception(self):
+        release = threading.Event()
+
+        def compute():
+            release.wait(5)
+            raise ValueError('upstream failed')
+
+        leader, _ = self.in_thread(lambda: self.flight.run('octocat', 'api', 'sha', compute))
+        self.wait_for('leader')
+        follower, outcome = self.in_thread(lambda: self.flight.run('octocat', 'api', 'sha', compute))
+        self.wait_for('follower')
+        release.set()
+        follower.join(5)
+
+        self.assertIsInstance(outcome['error'], ValueError)
+        self.assertEqual(self.roles, ['leader', 'follower'])
+
+    def test_follower_starts_over_when_the_leaders_stream_is_closed(self):
+        produced = []
+
+        def produce():
+            produced.append(True)
+            yield 'a'
+            yield 'b'
+            return 'ab'
+
+        stream = self.flight.stream('octocat', 'api', 'sha', produce)
+        self.assertEqual(next(stream), 'a')
+        follower, outcome = self.in_thread(lambda: list(self.flight.stream('octocat', 'api', 'sha', produce)))
+        self.wait_for('follower')
+        stream.close()
+        follower.join(5)
+
+        # The follower led a run of its own rather than sharing a result that never came
+        self.assertEqual(outcome['result'], ['a', 'b'])
+        self.assertEqual(len(produced), 2)
+        self.assertEqual(self.roles, ['leader', 'follower', 'leader'])
+
+    def test_follower_starts_over_when_the_leader_is_cancelled(self):
+        async def scenario():
+            started = asyncio.Event()
+            calls = []
+
+            async def compute():
+                calls.append(True)
+                if len(calls) == 1:
+                    started.set()
+                    await asyncio.sleep(60)
+                return 'fresh'
+
+            leader = asyncio.create_task(self.flight.arun('octocat', 'api', 'sha', compute))
+            await started.wait()
+            follower = asyncio.create_task(self.flight.arun('octocat', 'api', 'sha', compute))
+            while 'follower' not in self.roles:
+                await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await asyncio.wait_for(follower, 5)
+
+        self.assertEqual(asyncio.run(scenario()), 'fresh')
+        self.assertEqual(self.roles, ['leader', 'follower', 'leader'])
+
+    def test_interactive_follower_detaches_from_a_paused_bulk_leader(self):
+        release = threading.Event()
+
+        def bulk_run():
+            with bulk_priority():
+                return self.flight.run('octocat', 'api', 'sha', lambda: release.wait(5) and 'bulk', scope='scope-a')
+
+        with mock.patch('backend_app.singleflight.scheduler') as scheduler:
+            scheduler.bulk_pause.return_value = 30
+            self.in_thread(bulk_run)
+            # Cleanups run last-in first-out: let the leader finish before joining it
+            self.addCleanup(release.set)
+            self.wait_for('leader')
+            result = self.flight.run('octocat', 'api', 'sha', lambda: 'interactive')
+
+        self.assertEqual(result, 'interactive')
+        scheduler.bulk_pause.assert_called_with('scope-a')
+        self.assertEqual(self.roles, ['leader', 'follower', 'detached'])
+
+
+@override_settings(SINGLE_FLIGHT_LEASE_TTL=60)
+class SingleFlightLeaseTests(SimpleTestCase):
+    """Lease states as read from and written to MongoDB"""
+
+    def setUp(self):
+        patcher = mock.patch('backend_app.singleflight._collection')
+        self.collection = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def lease(self, status, expires_in, result=None):
+        return {'status': status, 'result': result, 'expires_at': datetime.utcnow() + timedelta(seconds=expires_in)}
+
+    def test_acquire_takes_only_an_expired_lease(self):
+        self.assertTrue(_acquire('key', 'holder-1'))
+        query, update = self.collection.update_one.call_args.args
+        self.assertEqual(list(query), ['_id', 'expires_at'])
+        self.assertEqual(update['$set']['holder'], 'holder-1')
+        self.assertEqual(update['$set']['status'], _RUNNING)
+        self.assertTrue(self.collection.update_one.call_args.kwargs['upsert'])
+
+    def test_acquire_loses_to_a_live_lease(self):
+        self.collection.update_one.side_effect = DuplicateKeyError('E11000')
+        self.assertFalse(_acquire('key', 'holder-1'))
+
+    def test_acquire_without_mongodb_computes_anyway(self):
+        self.collection.update_one.side_effect = PyMongoError('no server')
+        self.assertTrue(_acquire('key', 'holder-1'))
+
+    def test_poll_states(self):
+        cases = [
+            (None, (_FREE, None)),
+            (self.lease(_RUNNING, -1), (_FREE, None)),
+            (self.lease(_DONE, -1, '[1]'), (_FREE, None)),
+            (self.lease(_RUNNING, 30), (_RUNNING, None)),
+            (self.lease(_DONE, 30, '{"rows": [1, 2]}'), (_DONE, {'rows': [1, 2]})),
+        ]
+        for lease, expected in cases:
+            with self.subTest(lease=lease):
+                self.collection.find_one.return_value = lease
+                self.assertEqual(_poll('key'), expected)
+
+    def test_poll_without_mongodb_reports_the_lease_free(self):
+        self.collection.find_one.side_effect = PyMongoError('no server')
+        self.assertEqual(_poll('key'), (_FREE, None))
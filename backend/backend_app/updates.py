@@ -0,0 +1,165 @@
+"""Dependency update pull requests built with the Git Data API."""
+import json
+import re
+from datetime import datetime
+
+from .dependencies import ScanError, fetch_tree, load_manifests
+from .github import github_get, github_patch, github_post
+
+UPDATE_COMMIT_MESSAGE = 'Update dependencies to latest versions'
+UPDATE_PR_TITLE = 'Update Dependencies to Latest Versions'
+
+
+class UpdateError(Exception):
+    """The update could not be applied; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def apply_updates(file_path, content, updates):
+    """Return ``content`` with every package in ``updates`` bumped to its latest version"""
+    if file_path.endswith('package.json'):
+        package_data = json.loads(content)
+        for pkg, versions in updates.items():
+            if 'dependencies' in package_data and pkg in package_data['dependencies']:
+                package_data['dependencies'][pkg] = f"^{versions['latest']}"
+            if 'devDependencies' in package_data and pkg in package_data['devDependencies']:
+                package_data['devDependencies'][pkg] = f"^{versions['latest']}"
+        return json.dumps(package_data, indent=2)
+
+    # requirements.txt
+    new_lines = []
+    for line in content.split('\n'):
+        if line.strip() and not line.startswith('#'):
+            pkg_name = re.match(r'^([a-zA-Z0-9\-_]+)', line.strip())
+            if pkg_name and pkg_name.group(1) in updates:
+                new_lines.append(f"{pkg_name.group(1)}=={updates[pkg_name.group(1)]['latest']}")
+                continue
+        new_lines.append(line)
+    return '\n'.join(new_lines)
+
+
+def _pull_request_body(files):
+    changes = {}
+    for updates in files.values():
+        for pkg, versions in updates.items():
+            changes[pkg] = f"- `{pkg}`: `{versions['current']}` → `{versions['latest']}`"
+    return (
+        'This PR updates the following dependencies to their latest versions:\n\n' +
+        '\n'.join(changes[pkg] for pkg in sorted(changes)) +
+        '\n\nFiles changed:\n\n' +
+        '\n'.join(f'- `{path}`' for path in sorted(files))
+    )
+
+
+def _created(response, what, status_code=201):
+    if response.status_code != status_code:
+        # Rate limiting is the caller's to retry, so pass it on as such
+        status = response.status_code if response.status_code in (403, 429) else 500
+        raise UpdateError(f'Could not create {what}', status)
+    return response.json()
+
+
+def find_open_pull_request(owner, repo_name, access_token, branch):
+    """The open pull request from ``branch`` of the repository itself, or None"""
+    response = github_get(
+        f'/repos/{owner}/{repo_name}/pulls', access_token,
+        params={'head': f'{owner}:{branch}', 'state': 'open'}, conditional=False
+    )
+    pulls = _created(response, 'list of pull requests', 200)
+    return pulls[0] if pulls else None
+
+
+def create_update_pull_request(owner, repo_name, access_token, files, branch=None):
+    """Update every manifest in ``files`` ({path: updates}) in one commit and open one PR
+
+    The files are read from the default branch head, normally straight from
+    the tree and blob caches (or one tarball for large cold batches). The
+    new contents go inline into a single tree on top of the head's tree, so
+    GitHub creates the blobs itself; then one commit, one branch ref and one
+    pull request follow: four writes however many files change.
+
+    With a fixed ``branch`` the call can be repeated safely: an open pull
+    request from that branch is returned instead of opening another, and a
+    branch left behind by an attempt that stopped short of its pull request
+    is moved to the new commit.
+    """
+    if branch:
+        pull_request = find_open_pull_request(owner, repo_name, access_token, branch)
+        if pull_request is not None:
+            return {
+                'pr_url': pull_request['html_url'],
+                'pr_number': pull_request['number'],
+                'branch': branch,
+                'commit_sha': pull_request['head']['sha'],
+                'files': sorted(files),
+            }
+
+    try:
+        tree = fetch_tree(owner, repo_name, access_token)
+    except ScanError as e:
+        raise UpdateError(str(e), e.status_code)
+
+    missing = [path for path in files if path not in tree.blobs]
+    if missing:
+        raise UpdateError(f"Could not find {', '.join(sorted(missing))}", 404)
+    contents = load_manifests(
+        owner, repo_name, [(path, tree.blobs[path]) for path in files], access_token, ref=tree.commit_sha
+    )
+
+    changed = {}
+    for path, updates in files.items():
+        current_content = contents.get(tree.blobs[path])
+        if current_content is None:
+            raise UpdateError(f'Could not fetch content of {path}', 404)
+        new_content = apply_updates(path, current_content, updates)
+        if new_content != current_content:
+            changed[path] = new_content
+    if not changed:
+        raise UpdateError('The files are already up to date', 400)
+
+    repo_path = f'/repos/{owner}/{repo_name}'
+    new_tree = _created(github_post(f'{repo_path}/git/trees', access_token, json={
+        'base_tree': tree.sha,
+        'tree': [
+            {'path': path, 'mode': '100644', 'type': 'blob', 'content': content}
+            for path, content in sorted(changed.items())
+        ]
+    }), 'tree')
+    commit = _created(github_post(f'{repo_path}/git/commits', access_token, json={
+        'message': UPDATE_COMMIT_MESSAGE,
+        'tree': new_tree['sha'],
+        'parents': [tree.commit_sha]
+    }), 'commit')
+
+    # The branch is created pointing at the new commit, so it never has to move
+    new_branch = branch or f"dependency-updates-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    response = github_post(f'{repo_path}/git/refs', access_token, json={
+        'ref': f'refs/heads/{new_branch}',
+        'sha': commit['sha']
+    })
+    if response.status_code == 422 and branch:
+        # Already there from an earlier attempt that stopped before its pull request
+        response = github_patch(f'{repo_path}/git/refs/heads/{new_branch}', access_token, json={
+            'sha': commit['sha'],
+            'force': True
+        })
+        _created(response, 'new branch', 200)
+    else:
+        _created(response, 'new branch')
+
+    pull_request = _created(github_post(f'{repo_path}/pulls', access_token, json={
+        'title': UPDATE_PR_TITLE,
+        'body': _pull_request_body({path: files[path] for path in changed}),
+        'head': new_branch,
+        'base': tree.ref
+    }), 'pull request')
+    return {
+        'pr_url': pull_request['html_url'],
+        'pr_number': pull_request['number'],
+        'branch': new_branch,
+        'commit_sha': commit['sha'],
+        'files': sorted(changed),
+    }
@@ -1,13 +1,29 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
-print("Loading backend_app URLs")
+# The I/O-heavy endpoints have async versions for the ASGI server
+if settings.ASYNC_VIEWS:
+    from . import async_views as io_views
+else:
+    io_views = views
 
 urlpatterns = [
     path('test-mongodb/', views.test_mongodb, name='test_mongodb'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('github/rate-limit/', views.rate_limit_stats, name='rate_limit_stats'),
     path('github/login/', views.github_login, name='github_login'),
-    path('github/repos/', views.github_repos, name='github_repos'),
-    path('github/repos/<str:repo_name>/summary', views.generate_repo_summary, name='generate_repo_summary'),
-    path('github/repos/<str:repo_name>/dependencies', views.check_dependencies, name='check_dependencies'),
-    path('github/repos/<str:repo_name>/update-dependencies', views.update_dependencies, name='update_dependencies'),
+    path('github/webhook', views.github_webhook, name='github_webhook'),
+    path('github/repos/', io_views.github_repos, name='github_repos'),
+    path('github/repos/<str:repo_name>/summary', io_views.generate_repo_summary, name='generate_repo_summary'),
+    path('github/repos/<str:repo_name>/summary/stream', io_views.stream_repo_summary, name='stream_repo_summary'),
+    path('github/repos/<str:repo_name>/dependencies', io_views.check_dependencies, name='check_dependencies'),
+    path('github/repos/<str:repo_name>/dependencies/scan', views.submit_dependency_scan, name='submit_dependency_scan'),
+    path('dependencies/', views.query_dependency_index, name='query_dependency_index'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('github/repos/<str:repo_name>/update-dependencies', io_views.update_dependencies, name='update_dependencies'),
+    path('campaigns/', views.create_campaign, name='create_campaign'),
+    path('campaigns/<str:campaign_id>/', views.campaign_status, name='campaign_status'),
+    path('campaigns/<str:campaign_id>/resume', views.resume_campaign_view, name='resume_campaign'),
+    path('campaigns/<str:campaign_id>/stream', io_views.stream_campaign, name='stream_campaign'),
 ]
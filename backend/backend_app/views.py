@@ -1,111 +1,136 @@
+from django.conf import settings
 from django.shortcuts import render
-from rest_framework.decorators import api_view
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer, BrowsableAPIRenderer
 from rest_framework.response import Response
 from .models import TestConnection
-import requests
-import os
-from dotenv import load_dotenv
-from base64 import b64decode
-import groq
+from .cache import TieredCache, collect_cache_stats
+from .clients import http_client
+from .github import github_get_all_pages, github_user, token_scope
+from .dependencies import ScanError, scan_dependencies
+from .dependency_index import IndexQueryError, query_index, serialize_use
+from .campaigns import (
+    CampaignError, campaign_counts, get_campaign, refresh_campaign, resume_campaign, serialize_campaign,
+    submit_campaign
+)
+from .jobs import get_job, serialize_job, submit_scan
+from .metrics import registry
+from .ratelimit import scheduler
+from .summary import (
+    RepoContextError, gather_repo_context, generate_summary, get_cached_summary, stream_summary
+)
+from .updates import UpdateError, create_update_pull_request
+from .webhooks import WebhookError, handle_delivery, verify_signature
+import hmac
 import json
-from packaging import version
-import re
-from datetime import datetime
-import base64
-
-# Load environment variables
-load_dotenv()
-print("Environment variables loaded")
-
-# GitHub OAuth settings
-GITHUB_CLIENT_ID = os.environ.get('GITHUB_CLIENT_ID')
-GITHUB_CLIENT_SECRET = os.environ.get('GITHUB_CLIENT_SECRET')
-GITHUB_REDIRECT_URI = os.environ.get('GITHUB_REDIRECT_URI')
-print(f"GitHub OAuth settings loaded - Client ID: {GITHUB_CLIENT_ID}, Redirect URI: {GITHUB_REDIRECT_URI}")
-
-# Add this with your other environment variables
-GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
-groq_client = groq.Groq(api_key=GROQ_API_KEY)
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Each user's full repository list, briefly, so paging and searching stay cheap
+repos_cache = TieredCache(
+    'github_repos',
+    ttl=settings.GITHUB_REPOS_CACHE_TTL,
+    maxsize=settings.GITHUB_REPOS_CACHE_SIZE,
+    persistent=False,
+)
+
+def simplify_repos(repos_data):
+    """Transform GitHub's repository objects to include only necessary data"""
+    return [{
+        'id': repo['id'],
+        'name': repo['name'],
+        'full_name': repo['full_name'],
+        'description': repo['description'],
+        'html_url': repo['html_url'],
+        'language': repo['language'],
+        'stargazers_count': repo['stargazers_count'],
+        'updated_at': repo['updated_at'],
+        'visibility': repo['visibility']
+    } for repo in repos_data]
+
+def repo_page(repos, query_params):
+    """Apply ?q= search and ?page=/per_page= to a repository list; returns ``(repos, total)``
+
+    Raises ValueError when page or per_page is not an integer.
+    """
+    # Optional server-side search over name and description
+    query = query_params.get('q', '').strip().lower()
+    if query:
+        repos = [
+            repo for repo in repos
+            if query in repo['name'].lower() or query in (repo['description'] or '').lower()
+        ]
+    total = len(repos)
+
+    # Optional pagination; without ?page= the whole (filtered) list is returned
+    if 'page' in query_params:
+        page = max(1, int(query_params['page']))
+        per_page = min(100, max(1, int(query_params.get('per_page', 30))))
+        repos = repos[(page - 1) * per_page:page * per_page]
+    return repos, total
 
 @api_view(['POST'])
 def github_login(request):
     """Handle the GitHub OAuth callback"""
-    print("GitHub login endpoint called")
     try:
         code = request.data.get('code')
-        print(f"Received GitHub code: {code}")
-        print(f"GitHub OAuth settings - Client ID: {GITHUB_CLIENT_ID}, Client Secret: {GITHUB_CLIENT_SECRET}, Redirect URI: {GITHUB_REDIRECT_URI}")
         
         # Exchange code for access token
-        token_url = 'https://github.com/login/oauth/access_token'
-        print(f"Making request to token URL: {token_url}")
-        response = requests.post(
+        token_url = f'{settings.GITHUB_OAUTH_URL}/login/oauth/access_token'
+        response = http_client().post(
             token_url,
             data={
-                'client_id': GITHUB_CLIENT_ID,
-                'client_secret': GITHUB_CLIENT_SECRET,
+                'client_id': settings.GITHUB_CLIENT_ID,
+                'client_secret': settings.GITHUB_CLIENT_SECRET,
                 'code': code
             },
             headers={'Accept': 'application/json'}
         )
         
         token_data = response.json()
-        print(f"Token response received: {token_data}")
         
         if 'error' in token_data:
-            print(f"Error in token response: {token_data}")
+            logger.warning('GitHub token exchange failed: %s', token_data.get('error'))
             return Response({
                 'error': token_data.get('error_description', 'Failed to obtain access token'),
                 'details': token_data
             }, status=400)
             
         access_token = token_data['access_token']
-        print("Successfully obtained access token")
         
         # Get user data from GitHub
-        user_url = 'https://api.github.com/user'
-        print(f"Making request to user URL: {user_url}")
-        user_response = requests.get(
-            user_url,
-            headers={
-                'Authorization': f'Bearer {access_token}',
-                'Accept': 'application/json'
-            }
-        )
-        
-        user_data = user_response.json()
-        print(f"User data received: {user_data}")
+        # Resolving the user here also warms the identity cache for later views
+        user, status_code = github_user(access_token)
+        if user is None:
+            return Response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+        logger.info('GitHub login for %s', user['login'])
         
         return Response({
             'access_token': access_token,
-            'user': {
-                'id': user_data['id'],
-                'login': user_data['login'],
-                'name': user_data.get('name'),
-                'avatar_url': user_data.get('avatar_url'),
-                'email': user_data.get('email')
-            }
+            'user': user
         })
         
     except Exception as e:
-        print(f"Error in github_login: {str(e)}")
+        logger.exception('Error in github_login')
         return Response({
             'error': str(e)
         }, status=500)
 
 @api_view(['GET'])
 def test_mongodb(request):
-    print("MongoDB test endpoint called")
     try:
         # Try to create a test document
-        print("Attempting to create test document")
         test_doc = TestConnection(message="MongoDB connection successful!").save()
         
         # Retrieve the document to verify
-        print("Attempting to retrieve test document")
         retrieved_doc = TestConnection.objects.first()
         
-        print("MongoDB test successful")
         return Response({
             'status': 'success',
             'message': retrieved_doc.message,
@@ -113,16 +138,42 @@ def test_mongodb(request):
             'total_documents': TestConnection.objects.count()
         })
     except Exception as e:
-        print(f"Error in test_mongodb: {str(e)}")
+        logger.exception('Error in test_mongodb')
         return Response({
             'status': 'error',
             'message': str(e)
         }, status=500)
 
+def _metrics_authorized(request):
+    """True unless METRICS_TOKEN is set and the request does not carry it"""
+    # Compared as bytes: compare_digest raises TypeError on non-ASCII str
+    return not settings.METRICS_TOKEN or hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {settings.METRICS_TOKEN}'.encode()
+    )
+
+@api_view(['GET'])
+def cache_stats(request):
+    """Report hit/miss counters and sizes of the shared caches"""
+    if not _metrics_authorized(request):
+        return Response({'error': 'Invalid metrics token'}, status=401)
+    return Response(collect_cache_stats())
+
+@api_view(['GET'])
+def rate_limit_stats(request):
+    """Report each token's GitHub rate-limit budget and how the scheduler has paced it"""
+    if not _metrics_authorized(request):
+        return Response({'error': 'Invalid metrics token'}, status=401)
+    return Response(scheduler.stats())
+
+def metrics(request):
+    """Request and upstream call latencies, cache counters and more, in the Prometheus text format"""
+    if not _metrics_authorized(request):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @api_view(['GET'])
 def github_repos(request):
     """Fetch repositories for the authenticated user"""
-    print("GitHub repos endpoint called")
     try:
         # Get access token from request headers
         auth_header = request.headers.get('Authorization')
@@ -133,46 +184,37 @@ def github_repos(request):
         
         access_token = auth_header.split(' ')[1]
         
-        # Fetch repositories from GitHub API
-        repos_url = 'https://api.github.com/user/repos'
-        print(f"Fetching repos from: {repos_url}")
-        repos_response = requests.get(
-            repos_url,
-            headers={
-                'Authorization': f'Bearer {access_token}',
-                'Accept': 'application/json'
-            },
-            params={
-                'sort': 'updated',
-                'per_page': 100  # Adjust this value based on your needs
-            }
-        )
-        
-        if repos_response.status_code != 200:
-            print(f"Error fetching repos: {repos_response.json()}")
+        # Every page of the user's repositories, cached briefly per token
+        scope = token_scope(access_token)
+        cached_repos = repos_cache.get(scope)
+        if cached_repos is not None:
+            simplified_repos = cached_repos.value
+        else:
+            repos_url = '/user/repos'
+            repos_data, status_code = github_get_all_pages(repos_url, access_token, params={'sort': 'updated'})
+
+            if repos_data is None:
+                logger.warning('Error fetching repos: status %s', status_code)
+                return Response({
+                    'error': 'Failed to fetch repositories'
+                }, status=status_code)
+
+            simplified_repos = simplify_repos(repos_data)
+            repos_cache.set(scope, simplified_repos)
+
+        try:
+            simplified_repos, total = repo_page(simplified_repos, request.query_params)
+        except ValueError:
             return Response({
-                'error': 'Failed to fetch repositories'
-            }, status=repos_response.status_code)
-        
-        repos_data = repos_response.json()
-        
-        # Transform the response to include only necessary data
-        simplified_repos = [{
-            'id': repo['id'],
-            'name': repo['name'],
-            'full_name': repo['full_name'],
-            'description': repo['description'],
-            'html_url': repo['html_url'],
-            'language': repo['language'],
-            'stargazers_count': repo['stargazers_count'],
-            'updated_at': repo['updated_at'],
-            'visibility': repo['visibility']
-        } for repo in repos_data]
-        
-        return Response(simplified_repos)
+                'error': 'page and per_page must be integers'
+            }, status=400)
+
+        response = Response(simplified_repos)
+        response['X-Total-Count'] = str(total)
+        return response
         
     except Exception as e:
-        print(f"Error in github_repos: {str(e)}")
+        logger.exception('Error in github_repos')
         return Response({
             'error': str(e)
         }, status=500)
@@ -180,134 +222,148 @@ def github_repos(request):
 @api_view(['GET'])
 def generate_repo_summary(request, repo_name):
     """Generate a summary for the specified repository"""
-    print(f"Generating summary for repo: {repo_name}")
     try:
         # Get access token from request headers
         auth_header = request.headers.get('Authorization')
-        print(f"Auth header: {auth_header}")
         if not auth_header or not auth_header.startswith('Bearer '):
-            print("No valid authorization token found")
             return Response({
                 'error': 'No authorization token provided'
             }, status=401)
         
         access_token = auth_header.split(' ')[1]
-        print(f"Access token obtained: {access_token[:10]}...")
         
         # First get the user data to get the username
-        user_response = requests.get(
-            'https://api.github.com/user',
-            headers={
-                'Authorization': f'Bearer {access_token}',
-                'Accept': 'application/json'
-            }
-        )
+        user, status_code = github_user(access_token)
         
-        if user_response.status_code != 200:
+        if user is None:
             return Response({
                 'error': 'Failed to fetch user data'
-            }, status=user_response.status_code)
+            }, status=status_code)
             
-        username = user_response.json()['login']
+        username = user['login']
         
-        # Use the fetched username instead of hardcoded value
-        repo_url = f'https://api.github.com/repos/{username}/{repo_name}'
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        print(f"Fetching repo details from: {repo_url}")
-        
-        repo_response = requests.get(repo_url, headers=headers)
-        print(f"Repo details response status: {repo_response.status_code}")
-        if repo_response.status_code != 200:
-            print(f"Failed to fetch repo details: {repo_response.json()}")
+        # Fetch repo details, README and languages in parallel
+        try:
+            context = gather_repo_context(username, repo_name, access_token)
+        except RepoContextError as e:
+            logger.warning('Failed to fetch repo details of %s/%s: %s', username, repo_name, e)
             return Response({
-                'error': 'Failed to fetch repository details'
-            }, status=repo_response.status_code)
-        
-        repo_data = repo_response.json()
-        print(f"Successfully fetched repo data for: {repo_data['full_name']}")
-        
-        # Fetch the README content
-        # https://github.com/AviroopPaul/fintrac/blob/main/README.md
-        readme_url = f'https://api.github.com/repos/{username}/{repo_name}/readme'
-        print(f"Fetching README from: {readme_url}")
-        readme_response = requests.get(readme_url, headers=headers)
-        print(f"README response status: {readme_response.status_code}")
-        
-        readme_content = ""
-        if readme_response.status_code == 200:
-            readme_data = readme_response.json()
-            readme_content = b64decode(readme_data['content']).decode('utf-8')
-            print(f"README content length: {len(readme_content)} characters")
-        else:
-            print("No README found or unable to fetch README")
-        
-        # Fetch repository languages
-        languages_url = repo_data['languages_url']
-        print(f"Fetching languages from: {languages_url}")
-        languages_response = requests.get(languages_url, headers=headers)
-        print(f"Languages response status: {languages_response.status_code}")
-        languages = []
-        if languages_response.status_code == 200:
-            languages = list(languages_response.json().keys())
-            print(f"Languages found: {languages}")
-        else:
-            print("No languages found or unable to fetch languages")
-        
-        # Prepare context for AI summary
-        context = {
-            "name": repo_data['name'],
-            "description": repo_data['description'] or "",
-            "languages": languages,
-            "readme_excerpt": readme_content[:4000] if readme_content else "",  # Limit README length
-            "stars": repo_data['stargazers_count'],
-            "forks": repo_data['forks_count']
-        }
-        print("Context prepared for AI summary")
-        print(f"Stars: {context['stars']}, Forks: {context['forks']}")
-        
-        # Generate summary using Groq
-        prompt = f"""Given the following GitHub repository information, generate a concise, professional summary suitable for a Software Engineer resume. Focus on the key technologies, purpose, and notable features. Follow the STAR format. Put metrics. Format the response in bullet points, which should be descriptive and not just superficial.
-
-Repository Information:
-- Name: {context['name']}
-- Description: {context['description']}
-- Primary Languages: {', '.join(context['languages'])}
-- Stars: {context['stars']}
-- Forks: {context['forks']}
-
-README Excerpt:
-{context['readme_excerpt']}
-
-Generate a summary in 3 points, highlighting the most important aspects of the project."""
-
-        print("Sending request to Groq API")
-        completion = groq_client.chat.completions.create(
-            model="mixtral-8x7b-32768",  # or another appropriate model
-            messages=[
-                {"role": "system", "content": "You are a technical writer who creates concise, professional project summaries."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        print("Received response from Groq API")
+                'error': str(e)
+            }, status=e.status_code)
+
+        # Reuse the summary of this exact revision unless a refresh was asked for
+        if request.query_params.get('refresh') != '1':
+            cached_summary = get_cached_summary(context)
+            if cached_summary is not None:
+                logger.info('Serving cached summary for %s@%s', context.full_name, context.pushed_at)
+                return Response({
+                    'content': cached_summary.content,
+                    'repo_name': repo_name,
+                    'languages': cached_summary.languages,
+                    'cached': True
+                })
 
-        summary = completion.choices[0].message.content
-        print(f"Generated summary length: {len(summary)} characters")
+        # Generate summary using Groq, sharing any identical generation in flight
+        summary = generate_summary(username, context)
+        logger.info('Generated summary of %s: %d characters', context.full_name, len(summary))
 
         return Response({
             'content': summary,
             'repo_name': repo_name,
-            'languages': languages
+            'languages': context.languages,
+            'cached': False
         })
 
     except Exception as e:
-        print(f"Error generating summary: {str(e)}")
-        print(f"Error type: {type(e)}")
-        print(f"Error traceback: {e.__traceback__}")
+        logger.exception('Error generating summary')
+        return Response({
+            'error': f"Failed to generate summary: {str(e)}"
+        }, status=500)
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients send ``Accept: text/event-stream``; plain responses become an error event"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data).encode('utf-8')
+
+def _summary_event_stream(username, repo_name, context, cached_summary):
+    yield sse_event('meta', {
+        'repo_name': repo_name,
+        'languages': context.languages,
+        'cached': cached_summary is not None
+    })
+    if cached_summary is not None:
+        yield sse_event('token', {'content': cached_summary.content})
+        yield sse_event('done', {'length': len(cached_summary.content)})
+        return
+
+    try:
+        length = 0
+        for content in stream_summary(username, context):
+            length += len(content)
+            yield sse_event('token', {'content': content})
+
+        logger.info('Streamed summary of %s: %d characters', context.full_name, length)
+        yield sse_event('done', {'length': length})
+    except Exception as e:
+        logger.exception('Error streaming summary')
+        yield sse_event('error', {'error': f"Failed to generate summary: {str(e)}"})
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, EventStreamRenderer])
+def stream_repo_summary(request, repo_name):
+    """Stream a summary for the specified repository as Server-Sent Events
+
+    Emits a ``meta`` event with the repository languages, one ``token`` event
+    per completion chunk, then ``done`` (or ``error``).
+    """
+    try:
+        # Get access token from request headers
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({
+                'error': 'No authorization token provided'
+            }, status=401)
+        
+        access_token = auth_header.split(' ')[1]
+
+        user, status_code = github_user(access_token)
+        if user is None:
+            return Response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        username = user['login']
+
+        try:
+            context = gather_repo_context(username, repo_name, access_token)
+        except RepoContextError as e:
+            return Response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        cached_summary = None
+        if request.query_params.get('refresh') != '1':
+            cached_summary = get_cached_summary(context)
+
+        response = StreamingHttpResponse(
+            _summary_event_stream(username, repo_name, context, cached_summary),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx-style proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    except Exception as e:
+        logger.exception('Error streaming summary')
         return Response({
             'error': f"Failed to generate summary: {str(e)}"
         }, status=500)
@@ -315,7 +371,6 @@ Generate a summary in 3 points, highlighting the most important aspects of the p
 @api_view(['GET'])
 def check_dependencies(request, repo_name):
     """Check dependencies versions for a repository by recursively searching for dependency files"""
-    print(f"Checking dependencies for repo: {repo_name}")
     try:
         # Get access token from request headers
         auth_header = request.headers.get('Authorization')
@@ -325,117 +380,23 @@ def check_dependencies(request, repo_name):
             }, status=401)
         
         access_token = auth_header.split(' ')[1]
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-
-        dependencies = {
-            'npm': {},
-            'pip': {}
-        }
 
         # Get the user data to get the username
-        user_response = requests.get(
-            'https://api.github.com/user',
-            headers={
-                'Authorization': f'Bearer {access_token}',
-                'Accept': 'application/json'
-            }
-        )
+        user, status_code = github_user(access_token)
         
-        if user_response.status_code != 200:
+        if user is None:
             return Response({
                 'error': 'Failed to fetch user data'
-            }, status=user_response.status_code)
-            
-        username = user_response.json()['login']
-        
-        # Update tree URL to use dynamic username
-        tree_url = f'https://api.github.com/repos/{username}/{repo_name}/git/trees/main?recursive=1'
-        tree_response = requests.get(tree_url, headers=headers)
-        
-        if tree_response.status_code != 200:
-            # Try 'master' branch if 'main' doesn't exist
-            tree_url = f'https://api.github.com/repos/{username}/{repo_name}/git/trees/master?recursive=1'
-            tree_response = requests.get(tree_url, headers=headers)
+            }, status=status_code)
             
-            if tree_response.status_code != 200:
-                return Response({
-                    'error': 'Could not access repository tree'
-                }, status=tree_response.status_code)
+        username = user['login']
 
-        tree_data = tree_response.json()
-        
-        # Find all package.json and requirements.txt files
-        package_files = [item['path'] for item in tree_data['tree'] 
-                        if item['path'].endswith('package.json')]
-        requirements_files = [item['path'] for item in tree_data['tree'] 
-                            if item['path'].endswith('requirements.txt')]
-
-        # Check NPM dependencies for each package.json
-        for package_path in package_files:
-            try:
-                file_url = f'https://api.github.com/repos/{username}/{repo_name}/contents/{package_path}'
-                package_response = requests.get(file_url, headers=headers)
-                
-                if package_response.status_code == 200:
-                    content = b64decode(package_response.json()['content']).decode('utf-8')
-                    package_data = json.loads(content)
-                    
-                    # Combine all dependencies
-                    all_deps = {}
-                    if 'dependencies' in package_data:
-                        all_deps.update(package_data['dependencies'])
-                    if 'devDependencies' in package_data:
-                        all_deps.update(package_data['devDependencies'])
-
-                    # Check each dependency
-                    for pkg, current_version in all_deps.items():
-                        # Remove version prefix characters (^, ~, etc.)
-                        current_version = re.sub(r'^[^0-9]*', '', current_version)
-                        
-                        # Get latest version from npm registry
-                        npm_response = requests.get(f'https://registry.npmjs.org/{pkg}/latest')
-                        if npm_response.status_code == 200:
-                            latest_version = npm_response.json()['version']
-                            dependencies['npm'][pkg] = {
-                                'current': current_version,
-                                'latest': latest_version,
-                                'file_path': package_path
-                            }
-            except Exception as e:
-                print(f"Error checking NPM dependencies in {package_path}: {str(e)}")
-
-        # Check Python dependencies for each requirements.txt
-        for req_path in requirements_files:
-            try:
-                file_url = f'https://api.github.com/repos/{username}/{repo_name}/contents/{req_path}'
-                requirements_response = requests.get(file_url, headers=headers)
-                
-                if requirements_response.status_code == 200:
-                    content = b64decode(requirements_response.json()['content']).decode('utf-8')
-                    
-                    # Parse requirements.txt
-                    for line in content.split('\n'):
-                        if line and not line.startswith('#'):
-                            # Parse package name and version
-                            match = re.match(r'^([a-zA-Z0-9\-_]+)(?:[=!<>]+([0-9\.]+))?', line.strip())
-                            if match:
-                                pkg_name = match.group(1)
-                                current_version = match.group(2) or "0.0.0"
-                                
-                                # Get latest version from PyPI
-                                pypi_response = requests.get(f'https://pypi.org/pypi/{pkg_name}/json')
-                                if pypi_response.status_code == 200:
-                                    latest_version = pypi_response.json()['info']['version']
-                                    dependencies['pip'][pkg_name] = {
-                                        'current': current_version,
-                                        'latest': latest_version,
-                                        'file_path': req_path
-                                    }
-            except Exception as e:
-                print(f"Error checking Python dependencies in {req_path}: {str(e)}")
+        try:
+            dependencies = scan_dependencies(username, repo_name, access_token)
+        except ScanError as e:
+            return Response({
+                'error': str(e)
+            }, status=e.status_code)
 
         if not dependencies['npm'] and not dependencies['pip']:
             return Response({
@@ -445,15 +406,14 @@ def check_dependencies(request, repo_name):
         return Response(dependencies)
 
     except Exception as e:
-        print(f"Error in check_dependencies: {str(e)}")
+        logger.exception('Error in check_dependencies')
         return Response({
             'error': f"Failed to check dependencies: {str(e)}"
         }, status=500)
 
 @api_view(['POST'])
-def update_dependencies(request, repo_name):
-    """Create a PR with updated dependencies"""
-    print(f"Updating dependencies for repo: {repo_name}")
+def submit_dependency_scan(request, repo_name):
+    """Queue a background dependency scan and return its job id"""
     try:
         # Get access token from request headers
         auth_header = request.headers.get('Authorization')
@@ -463,137 +423,363 @@ def update_dependencies(request, repo_name):
             }, status=401)
         
         access_token = auth_header.split(' ')[1]
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
 
-        # Get the file content and updates from request
-        file_path = request.data.get('file_path')
-        updates = request.data.get('updates')
-        file_type = 'package.json' if file_path.endswith('package.json') else 'requirements.txt'
+        user, status_code = github_user(access_token)
+        if user is None:
+            return Response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        try:
+            job = submit_scan(user['login'], user['login'], repo_name, access_token)
+        except ScanError as e:
+            return Response({
+                'error': str(e)
+            }, status=e.status_code)
 
-        # Get the user data to get the username
-        user_response = requests.get(
-            'https://api.github.com/user',
-            headers=headers
-        )
+        return Response(serialize_job(job), status=202 if job.status != 'succeeded' else 200)
+
+    except Exception as e:
+        logger.exception('Error in submit_dependency_scan')
+        return Response({
+            'error': f"Failed to submit dependency scan: {str(e)}"
+        }, status=500)
+
+@api_view(['GET'])
+def job_status(request, job_id):
+    """Report the status, progress and (once finished) result of a background job"""
+    try:
+        # Get access token from request headers
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({
+                'error': 'No authorization token provided'
+            }, status=401)
         
-        if user_response.status_code != 200:
+        access_token = auth_header.split(' ')[1]
+
+        user, status_code = github_user(access_token)
+        if user is None:
             return Response({
                 'error': 'Failed to fetch user data'
-            }, status=user_response.status_code)
-            
-        username = user_response.json()['login']
-        
-        # Update all URLs to use dynamic username
-        repo_url = f'https://api.github.com/repos/{username}/{repo_name}'
+            }, status=status_code)
+
+        job = get_job(job_id, user['login'])
+        if job is None:
+            return Response({
+                'error': 'Job not found'
+            }, status=404)
+
+        return Response(serialize_job(job))
+
+    except Exception as e:
+        logger.exception('Error in job_status')
+        return Response({
+            'error': f"Failed to fetch job status: {str(e)}"
+        }, status=500)
+
+@api_view(['GET'])
+def query_dependency_index(request):
+    """List the user's repositories declaring a package, optionally within a version range
+
+    Takes ``ecosystem``, ``package``, ``version`` (e.g. ``<4.17.21`` or
+    ``>=1.0,<2.0``) and ``page``/``per_page``. Only repositories scanned
+    since the index was enabled are included.
+    """
+    try:
+        # Get access token from request headers
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({
+                'error': 'No authorization token provided'
+            }, status=401)
         
-        # Get repository info to determine default branch
-        repo_response = requests.get(repo_url, headers=headers)
-        if repo_response.status_code != 200:
-            return Response({'error': 'Could not fetch repository information'}, status=500)
+        access_token = auth_header.split(' ')[1]
+
+        if not settings.DEPENDENCY_INDEX:
+            return Response({
+                'error': 'The dependency index is disabled'
+            }, status=503)
+
+        ecosystem = request.query_params.get('ecosystem', '')
+        package = request.query_params.get('package', '').strip()
+        if ecosystem not in ('npm', 'pip') or not package:
+            return Response({
+                'error': 'ecosystem (npm or pip) and package are required'
+            }, status=400)
+        version_range = request.query_params.get('version', '').strip()
+
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            per_page = min(100, max(1, int(request.query_params.get('per_page', 30))))
+        except ValueError:
+            return Response({
+                'error': 'page and per_page must be integers'
+            }, status=400)
+
+        user, status_code = github_user(access_token)
+        if user is None:
+            return Response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        try:
+            uses, total = query_index(user['login'], ecosystem, package, version_range, page, per_page)
+        except IndexQueryError as e:
+            return Response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        return Response({
+            'ecosystem': ecosystem,
+            'package': package,
+            'version': version_range or None,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'results': [serialize_use(use) for use in uses],
+        })
+
+    except Exception as e:
+        logger.exception('Error in query_dependency_index')
+        return Response({
+            'error': f"Failed to query the dependency index: {str(e)}"
+        }, status=500)
+
+@api_view(['POST'])
+def update_dependencies(request, repo_name):
+    """Create one PR with updated dependencies across one or more manifests
+
+    Takes ``files`` as {file_path: updates}; the single-file form with
+    ``file_path`` and ``updates`` is still accepted.
+    """
+    try:
+        # Get access token from request headers
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({
+                'error': 'No authorization token provided'
+            }, status=401)
         
-        default_branch = repo_response.json()['default_branch']
+        access_token = auth_header.split(' ')[1]
+
+        # Get the files and updates from request
+        files = request.data.get('files')
+        if files is None and request.data.get('file_path'):
+            files = {request.data['file_path']: request.data.get('updates') or {}}
+        if not files:
+            return Response({
+                'error': 'No files to update'
+            }, status=400)
+
+        # Get the user data to get the username
+        user, status_code = github_user(access_token)
         
-        # Get the current file content
-        file_url = f'https://api.github.com/repos/{username}/{repo_name}/contents/{file_path}'
-        file_response = requests.get(file_url, headers=headers)
-        if file_response.status_code != 200:
-            return Response({'error': 'Could not fetch file content'}, status=404)
-
-        file_data = file_response.json()
-        current_content = b64decode(file_data['content']).decode('utf-8')
-        current_sha = file_data['sha']
-
-        # Create new branch
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        new_branch = f'dependency-updates-{timestamp}'
-
-        # Get the SHA of the default branch
-        ref_response = requests.get(
-            f'https://api.github.com/repos/{username}/{repo_name}/git/refs/heads/{default_branch}',
-            headers=headers
-        )
-        if ref_response.status_code != 200:
-            return Response({'error': 'Could not get default branch reference'}, status=500)
-
-        sha = ref_response.json()['object']['sha']
-
-        # Create new branch
-        create_branch_response = requests.post(
-            f'https://api.github.com/repos/{username}/{repo_name}/git/refs',
-            headers=headers,
-            json={
-                'ref': f'refs/heads/{new_branch}',
-                'sha': sha
-            }
-        )
-        if create_branch_response.status_code != 201:
-            return Response({'error': 'Could not create new branch'}, status=500)
-
-        # Update file content
-        new_content = current_content
-        if file_type == 'package.json':
-            package_data = json.loads(current_content)
-            for pkg, versions in updates.items():
-                if 'dependencies' in package_data and pkg in package_data['dependencies']:
-                    package_data['dependencies'][pkg] = f"^{versions['latest']}"
-                if 'devDependencies' in package_data and pkg in package_data['devDependencies']:
-                    package_data['devDependencies'][pkg] = f"^{versions['latest']}"
-            new_content = json.dumps(package_data, indent=2)
-        else:  # requirements.txt
-            lines = current_content.split('\n')
-            new_lines = []
-            for line in lines:
-                if line.strip() and not line.startswith('#'):
-                    pkg_name = re.match(r'^([a-zA-Z0-9\-_]+)', line.strip())
-                    if pkg_name and pkg_name.group(1) in updates:
-                        new_lines.append(f"{pkg_name.group(1)}=={updates[pkg_name.group(1)]['latest']}")
-                    else:
-                        new_lines.append(line)
-                else:
-                    new_lines.append(line)
-            new_content = '\n'.join(new_lines)
-
-        # Commit updated file
-        update_file_response = requests.put(
-            file_url,
-            headers=headers,
-            json={
-                'message': 'Update dependencies to latest versions',
-                'content': base64.b64encode(new_content.encode()).decode(),
-                'sha': current_sha,
-                'branch': new_branch
-            }
-        )
-        if update_file_response.status_code != 200:
-            return Response({'error': 'Could not update file'}, status=500)
-
-        # Create Pull Request
-        pr_response = requests.post(
-            f'https://api.github.com/repos/{username}/{repo_name}/pulls',
-            headers=headers,
-            json={
-                'title': 'Update Dependencies to Latest Versions',
-                'body': 'This PR updates the following dependencies to their latest versions:\n\n' +
-                       '\n'.join([f"- `{pkg}`: `{ver['current']}` → `{ver['latest']}`" for pkg, ver in updates.items()]),
-                'head': new_branch,
-                'base': default_branch
-            }
-        )
-        if pr_response.status_code != 201:
-            return Response({'error': 'Could not create pull request'}, status=500)
+        if user is None:
+            return Response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        try:
+            pull_request = create_update_pull_request(user['login'], repo_name, access_token, files)
+        except UpdateError as e:
+            return Response({
+                'error': str(e)
+            }, status=e.status_code)
 
-        pr_data = pr_response.json()
         return Response({
             'message': 'Successfully created pull request',
-            'pr_url': pr_data['html_url'],
-            'pr_number': pr_data['number']
+            **pull_request
         })
 
     except Exception as e:
-        print(f"Error in update_dependencies: {str(e)}")
+        logger.exception('Error in update_dependencies')
         return Response({
             'error': f"Failed to update dependencies: {str(e)}"
         }, status=500)
+
+@api_view(['POST'])
+def github_webhook(request):
+    """Receive GitHub webhooks; pushes invalidate and re-warm the repository's caches"""
+    try:
+        if not settings.GITHUB_WEBHOOK_SECRET:
+            return Response({
+                'error': 'Webhooks are not configured'
+            }, status=503)
+
+        # The signature covers the raw body, so it is checked before anything parses it
+        body = request.body
+        if not verify_signature(body, request.headers.get('X-Hub-Signature-256')):
+            return Response({
+                'error': 'Invalid webhook signature'
+            }, status=401)
+
+        event = request.headers.get('X-GitHub-Event', '')
+        logger.info('GitHub %s delivery %s', event, request.headers.get('X-GitHub-Delivery'))
+        try:
+            result = handle_delivery(event, body)
+        except WebhookError as e:
+            return Response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        return Response(result, status=202 if result['status'] == 'accepted' else 200)
+
+    except Exception as e:
+        logger.exception('Error in github_webhook')
+        return Response({
+            'error': f"Failed to process webhook: {str(e)}"
+        }, status=500)
+
+@api_view(['POST'])
+def create_campaign(request):
+    """Start a dependency update campaign across many repositories
+
+    Takes ``policy`` as [{ecosystem, package, version}] (omit ``version`` for
+    the latest release) and ``repos`` as repository names; each repository
+    whose manifests are behind the policy gets one pull request.
+    """
+    try:
+        # Get access token from request headers
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({
+                'error': 'No authorization token provided'
+            }, status=401)
+        
+        access_token = auth_header.split(' ')[1]
+
+        user, status_code = github_user(access_token)
+        if user is None:
+            return Response({
+                'error': 'Failed to fetch user data'
+            }, status=status_code)
+
+        try:
+            campaign = submit_campaign(
+                user['login'], request.data.get('policy'), request.data.get('repos'), access_token
+            )
+        except CampaignError as e:
+            return Response({
+                'error': str(e)
+            }, status=e.status_code)
+
+        logger.info('Started campaign %s over %d repositories', campaign.campaign_id, len(campaign.repos))
+        return Response(serialize_campaign(campaign), status=202)
+
+    except Exception as e:
+        logger.exception('Error in create_campaign')
+        return Response({
+            'error': f"Failed to create campaign: {str(e)}"
+        }, status=500)
+
+def _campaign_request(request, campaign_id):
+    """Return ``(campaign, access_token, error_response)`` for a campaign view"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None, None, Response({
+            'error': 'No authorization token provided'
+        }, status=401)
+
+    access_token = auth_header.split(' ')[1]
+
+    user, status_code = github_user(access_token)
+    if user is None:
+        return None, None, Response({
+            'error': 'Failed to fetch user data'
+        }, status=status_code)
+
+    campaign = get_campaign(campaign_id, user['login'])
+    if campaign is None:
+        return None, None, Response({
+            'error': 'Campaign not found'
+        }, status=404)
+    return campaign, access_token, None
+
+@api_view(['GET'])
+def campaign_status(request, campaign_id):
+    """Report a campaign's policy and the state of every repository in it"""
+    try:
+        campaign, _, error_response = _campaign_request(request, campaign_id)
+        if error_response is not None:
+            return error_response
+        return Response(serialize_campaign(campaign))
+
+    except Exception as e:
+        logger.exception('Error in campaign_status')
+        return Response({
+            'error': f"Failed to fetch campaign: {str(e)}"
+        }, status=500)
+
+@api_view(['POST'])
+def resume_campaign_view(request, campaign_id):
+    """Continue a campaign interrupted by a restart; finished repositories are skipped"""
+    try:
+        campaign, access_token, error_response = _campaign_request(request, campaign_id)
+        if error_response is not None:
+            return error_response
+        resume_campaign(campaign, access_token)
+        return Response(serialize_campaign(campaign), status=202 if campaign.status != 'succeeded' else 200)
+
+    except Exception as e:
+        logger.exception('Error in resume_campaign')
+        return Response({
+            'error': f"Failed to resume campaign: {str(e)}"
+        }, status=500)
+
+def _campaign_event_stream(campaign):
+    seen = {}
+    started = last_sent = time.monotonic()
+    while True:
+        for entry in campaign.repos:
+            if seen.get(entry['repo']) != entry:
+                seen[entry['repo']] = entry
+                last_sent = time.monotonic()
+                yield sse_event('repo', entry)
+        if campaign.status in ('succeeded', 'failed'):
+            yield sse_event('done', {
+                'status': campaign.status,
+                'counts': campaign_counts(campaign),
+                'error': campaign.error
+            })
+            return
+        now = time.monotonic()
+        if now - started >= settings.CAMPAIGN_STREAM_MAX_DURATION:
+            yield sse_event('timeout', {
+                'status': campaign.status,
+                'counts': campaign_counts(campaign)
+            })
+            return
+        if now - last_sent >= settings.CAMPAIGN_STREAM_HEARTBEAT:
+            # A comment line: clients ignore it, but writing it surfaces a closed connection
+            yield ': keep-alive\n\n'
+            last_sent = now
+        time.sleep(settings.CAMPAIGN_STREAM_INTERVAL)
+        campaign = refresh_campaign(campaign)
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, EventStreamRenderer])
+def stream_campaign(request, campaign_id):
+    """Stream campaign progress as Server-Sent Events
+
+    Emits a ``repo`` event whenever a repository's state changes, then
+    ``done`` with per-state counts once the campaign has finished. Quiet
+    stretches get a keep-alive comment, and a stream open for longer than
+    CAMPAIGN_STREAM_MAX_DURATION ends with a ``timeout`` event.
+    """
+    try:
+        campaign, _, error_response = _campaign_request(request, campaign_id)
+        if error_response is not None:
+            return error_response
+
+        response = StreamingHttpResponse(_campaign_event_stream(campaign), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx-style proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    except Exception as e:
+        logger.exception('Error in stream_campaign')
+        return Response({
+            'error': f"Failed to stream campaign: {str(e)}"
+        }, status=500)
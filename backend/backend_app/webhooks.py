@@ -0,0 +1,158 @@
+"""GitHub push webhooks: forget what a push made stale and warm the new head before anyone asks.
+
+Deliveries are verified against ``GITHUB_WEBHOOK_SECRET`` (the
+``X-Hub-Signature-256`` HMAC of the raw body). A push to a repository's
+default branch drops its stored summaries, then, when
+``GITHUB_WEBHOOK_TOKEN`` is set, queues a dependency scan of the new head
+(and with ``WEBHOOK_PRECOMPUTE_SUMMARY`` its summary) on the job workers.
+
+Trees, manifest contents and parsed manifests are keyed by git SHA, so a
+push never makes them wrong, only unused; the background scan fills the
+entries for the new SHAs, along with registry versions and the dependency
+index, so the first user to look finds them warm.
+"""
+import hashlib
+import hmac
+import json
+import logging
+
+from django.conf import settings
+from mongoengine.errors import MongoEngineException
+from pymongo.errors import PyMongoError
+
+from . import metrics
+from .dependencies import fetch_tree, scan_dependencies
+from .jobs import job_executor
+from .metrics import operation_trace
+from .models import RepoSummary
+from .ratelimit import bulk_priority
+from .summary import gather_repo_context, generate_summary, get_cached_summary
+
+logger = logging.getLogger(__name__)
+
+deliveries_total = metrics.registry.register(metrics.Counter(
+    'webhook_deliveries_total', 'GitHub webhook deliveries by event and outcome', ('event', 'outcome')
+))
+precomputations_total = metrics.registry.register(metrics.Counter(
+    'webhook_precomputations_total', 'Background work queued by push webhooks, by task and outcome',
+    ('task', 'outcome')
+))
+
+
+class WebhookError(Exception):
+    """The delivery cannot be processed; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sign(body, secret):
+    """The ``X-Hub-Signature-256`` header GitHub sends with ``body``"""
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature):
+    """True if ``signature`` is the HMAC of ``body`` under GITHUB_WEBHOOK_SECRET"""
+    # compare_digest rejects non-ASCII str with TypeError; bytes just do not match
+    return hmac.compare_digest(sign(body, settings.GITHUB_WEBHOOK_SECRET).encode(), (signature or '').encode())
+
+
+def invalidate_repo(owner, repo_name):
+    """Drop the stored summaries of every earlier revision; returns what was removed"""
+    if not settings.SUMMARY_CACHE_ENABLED:
+        return {'summaries': 0}
+    try:
+        summaries = RepoSummary.objects(full_name=f'{owner}/{repo_name}').delete()
+    except (MongoEngineException, PyMongoError) as e:
+        logger.warning('Could not drop summaries of %s/%s: %s', owner, repo_name, e)
+        summaries = 0
+    return {'summaries': summaries}
+
+
+def _precompute(owner, repo_name, branch, head_sha, with_summary):
+    access_token = settings.GITHUB_WEBHOOK_TOKEN
+    with bulk_priority(), operation_trace('webhook:precompute'):
+        try:
+            tree = fetch_tree(owner, repo_name, access_token, ref=branch)
+            if tree.commit_sha != head_sha:
+                logger.info('%s/%s moved from %s to %s since the push; scanning the newer head',
+                            owner, repo_name, head_sha, tree.commit_sha)
+            scan_dependencies(owner, repo_name, access_token, tree=tree)
+            precomputations_total.inc(task='dependencies', outcome='succeeded')
+        except Exception:
+            logger.exception('Error precomputing the dependency scan of %s/%s', owner, repo_name)
+            precomputations_total.inc(task='dependencies', outcome='failed')
+
+        if not with_summary:
+            return
+        try:
+            context = gather_repo_context(owner, repo_name, access_token)
+            if get_cached_summary(context) is None:
+                generate_summary(owner, context)
+            precomputations_total.inc(task='summary', outcome='succeeded')
+        except Exception:
+            logger.exception('Error precomputing the summary of %s/%s', owner, repo_name)
+            precomputations_total.inc(task='summary', outcome='failed')
+
+
+def handle_push(payload):
+    """Invalidate, then queue precomputation for, a push to the default branch
+
+    Pushes to other branches, tag pushes and branch deletions are ignored.
+    """
+    try:
+        repository = payload['repository']
+        owner = repository['owner'].get('login') or repository['owner']['name']
+        repo_name = repository['name']
+        branch = repository['default_branch']
+        ref, head_sha = payload['ref'], payload['after']
+    except (KeyError, TypeError, AttributeError):
+        raise WebhookError('Malformed push payload', 400)
+
+    if payload.get('deleted'):
+        return {'status': 'ignored', 'reason': f'{ref} was deleted'}
+    if ref != f'refs/heads/{branch}':
+        return {'status': 'ignored', 'reason': f'{ref} is not the default branch'}
+
+    invalidated = invalidate_repo(owner, repo_name)
+    tasks = []
+    if settings.GITHUB_WEBHOOK_TOKEN:
+        tasks.append('dependencies')
+        # A summary is only worth generating where it will be stored
+        if settings.WEBHOOK_PRECOMPUTE_SUMMARY and settings.SUMMARY_CACHE_ENABLED:
+            tasks.append('summary')
+        job_executor().submit(_precompute, owner, repo_name, branch, head_sha, 'summary' in tasks)
+    logger.info('Push to %s/%s@%s: invalidated %s, precomputing %s',
+                owner, repo_name, head_sha, invalidated, tasks or 'nothing')
+    return {
+        'status': 'accepted',
+        'repo': f'{owner}/{repo_name}',
+        'head_sha': head_sha,
+        'invalidated': invalidated,
+        'precompute': tasks,
+    }
+
+
+def handle_delivery(event, body):
+    """Process one verified delivery; returns the response body"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        deliveries_total.inc(event=event, outcome='invalid')
+        raise WebhookError('Payload is not a JSON object', 400)
+
+    if event == 'ping':
+        result = {'status': 'pong', 'zen': payload.get('zen')}
+    elif event == 'push':
+        try:
+            result = handle_push(payload)
+        except WebhookError:
+            deliveries_total.inc(event=event, outcome='invalid')
+            raise
+    else:
+        result = {'status': 'ignored', 'reason': f'{event or "unknown"} events are not handled'}
+    deliveries_total.inc(event=event, outcome=result['status'])
+    return result
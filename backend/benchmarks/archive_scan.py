@@ -0,0 +1,47 @@
+"""Manifest download time: one blob request per manifest vs. one streamed tarball.
+
+Run from the backend directory:
+
+    python -m benchmarks.archive_scan --latency 0.02 --manifests 50 200 500
+"""
+import argparse
+import time
+
+from django.conf import settings
+
+from .harness import clear_caches, setup_django
+from .stubs import StubServer, github_routes, monorepo_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.02, help='stub round-trip latency in seconds')
+    parser.add_argument('--manifests', type=int, nargs='+', default=[50, 200, 500])
+    args = parser.parse_args()
+
+    setup_done = False
+    print(f"{'manifests':>9} {'mode':>9} {'time (s)':>9} {'GitHub calls':>13}")
+    for count in args.manifests:
+        with StubServer(github_routes(files=monorepo_files(count)), latency=args.latency) as stub:
+            if not setup_done:
+                setup_django(GITHUB_API_URL=stub.url)
+                setup_done = True
+            else:
+                settings.GITHUB_API_URL = stub.url
+            from backend_app.dependencies import fetch_tree, load_manifests, manifest_ecosystem
+
+            tree = fetch_tree('octocat', 'monorepo', 'token')
+            manifests = [(path, sha) for path, sha in tree.blobs.items() if manifest_ecosystem(path)]
+            for mode, threshold in (('per-file', len(manifests) + 1), ('archive', 1)):
+                settings.SCAN_ARCHIVE_THRESHOLD = threshold
+                clear_caches()
+                stub.reset()
+                started = time.perf_counter()
+                contents = load_manifests('octocat', 'monorepo', manifests, 'token', ref=tree.commit_sha)
+                elapsed = time.perf_counter() - started
+                assert len(contents) == len(manifests)
+                print(f"{count:>9} {mode:>9} {elapsed:>9.2f} {stub.total_calls():>13}")
+
+
+if __name__ == '__main__':
+    main()
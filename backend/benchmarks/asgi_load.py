@@ -0,0 +1,181 @@
+"""Requests/sec, latency and memory per concurrent request: WSGI (runserver) vs ASGI (uvicorn).
+
+Starts each server as a subprocess against stub GitHub, registry and Groq
+servers, drives every I/O-heavy endpoint at a fixed concurrency and samples
+the server's resident memory from /proc while the load runs. Under WSGI each
+in-flight request holds a thread; under ASGI the async views hold a coroutine.
+
+Run from the backend directory:
+
+    python -m benchmarks.asgi_load --latency 0.1 --concurrency 50 --requests 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .stubs import StubServer, github_routes, groq_routes, monorepo_files, registry_routes
+
+SERVERS = {
+    'wsgi': lambda port: [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+    'asgi': lambda port: [
+        sys.executable, '-m', 'uvicorn', 'backend.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def endpoints(files):
+    manifest = next(path for path in sorted(files) if path.endswith('package.json'))
+    update = json.dumps({'files': {manifest: {'shared-0': {'current': '1.0.0', 'latest': '2.0.0'}}}})
+    return {
+        'repos': ('GET', '/api/github/repos/?page=1', None),
+        'summary': ('GET', '/api/github/repos/hello-world/summary', None),
+        'dependencies': ('GET', '/api/github/repos/monorepo/dependencies', None),
+        'update': ('POST', '/api/github/repos/monorepo/update-dependencies', update),
+    }
+
+
+def _process_status(pid):
+    """Resident memory (KB) and thread count of a process"""
+    rss_kb = threads = 0
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+            elif line.startswith('Threads:'):
+                threads = int(line.split()[1])
+    return rss_kb, threads
+
+
+class Server:
+    def __init__(self, kind, port, environ):
+        self.kind = kind
+        self.url = f'http://127.0.0.1:{port}'
+        self.process = subprocess.Popen(
+            SERVERS[kind](port), env={**os.environ, **environ},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f'{self.url}/api/cache/stats/').status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f'{self.kind} server did not start')
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+async def _load(server, endpoint, concurrency, total):
+    method, path, body = endpoint
+    headers = {'Authorization': 'Bearer token', 'Content-Type': 'application/json'}
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+    peak_kb = peak_threads = 0
+
+    async def sample_memory():
+        nonlocal peak_kb, peak_threads
+        while True:
+            rss_kb, threads = _process_status(server.process.pid)
+            peak_kb, peak_threads = max(peak_kb, rss_kb), max(peak_threads, threads)
+            await asyncio.sleep(0.02)
+
+    async with httpx.AsyncClient(base_url=server.url, timeout=120,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=headers, content=body)
+                except httpx.TransportError:
+                    # runserver drops connections once its listen backlog is full
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        # Warm the identity cache and upstream connection pools first
+        await asyncio.gather(*(client.request(method, path, headers=headers, content=body) for _ in range(4)))
+        idle_kb, _ = _process_status(server.process.pid)
+        sampler = asyncio.create_task(sample_memory())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': errors,
+        'idle_mb': idle_kb / 1024,
+        'peak_mb': peak_kb / 1024,
+        'kb_per_request': max(peak_kb - idle_kb, 0) / concurrency,
+        'threads': peak_threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.1, help='stub round-trip latency in seconds')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--tokens', type=int, default=20, help='completion tokens per summary')
+    parser.add_argument('--token-latency', type=float, default=0.02)
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument('--endpoints', nargs='+', default=['repos', 'summary', 'dependencies', 'update'])
+    args = parser.parse_args()
+
+    files = monorepo_files(20)
+    routes = endpoints(files)
+    print(f"{'server':>6} {'endpoint':>13} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'errors':>7} "
+          f"{'idle MB':>8} {'peak MB':>8} {'KB/req':>7} {'threads':>8}")
+    with StubServer(github_routes(files=files), latency=args.latency) as github, \
+            StubServer(registry_routes(), latency=args.latency) as registry, \
+            StubServer(groq_routes(args.tokens, args.token_latency)) as groq_stub:
+        environ = {
+            'DJANGO_SETTINGS_MODULE': 'backend.settings',
+            'GROQ_API_KEY': 'benchmark',
+            'GROQ_BASE_URL': groq_stub.url,
+            'GITHUB_API_URL': github.url,
+            'NPM_REGISTRY_URL': f'{registry.url}/npm',
+            'PYPI_URL': f'{registry.url}/pypi',
+            # No MongoDB: caches stay in memory, and every repos request goes to GitHub
+            'CACHE_PERSISTENT_TIER': 'false',
+            'SUMMARY_CACHE_ENABLED': 'false',
+            'GITHUB_REPOS_CACHE_TTL': '0',
+            'GITHUB_REQUESTS_PER_SECOND': '100000',
+            'GITHUB_REQUEST_BURST': '100000',
+        }
+        for port, kind in enumerate(args.servers, start=18700):
+            server = Server(kind, port, environ)
+            try:
+                server.wait_ready()
+                for name in args.endpoints:
+                    result = asyncio.run(_load(server, routes[name], args.concurrency, args.requests))
+                    print(f"{kind:>6} {name:>13} {result['rps']:>8.1f} {result['p50']:>9.1f} "
+                          f"{result['p95']:>9.1f} {result['errors']:>7} {result['idle_mb']:>8.1f} "
+                          f"{result['peak_mb']:>8.1f} {result['kb_per_request']:>7.0f} {result['threads']:>8}")
+            finally:
+                server.stop()
+
+
+if __name__ == '__main__':
+    main()
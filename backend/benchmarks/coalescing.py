@@ -0,0 +1,90 @@
+"""Upstream calls when many users open the same repository at once.
+
+Fires ``--users`` concurrent summary and dependency requests for one
+repository, starting from cold caches each round, and counts what reached
+the stub GitHub, registry and Groq servers. With single-flight coalescing
+one Groq completion and one manifest fan-out serve every request; only the
+cheap per-request lookups (identity, repository metadata, branch head and
+tree listing) repeat.
+
+Drives the sync views from threads, or the async ones with ``--async``:
+
+    python -m benchmarks.coalescing --users 20
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .harness import clear_caches, setup_django
+from .stubs import StubServer, github_routes, groq_routes, monorepo_files, registry_routes
+
+ENDPOINTS = {
+    'summary': '/api/github/repos/monorepo/summary',
+    'dependencies': '/api/github/repos/monorepo/dependencies',
+}
+
+
+def _fire_threads(path, users):
+    from django.test import Client
+
+    def request(_):
+        response = Client(HTTP_HOST='localhost').get(path, HTTP_AUTHORIZATION='Bearer token')
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        return list(pool.map(request, range(users)))
+
+
+def _fire_async(path, users):
+    import httpx
+    from django.core.asgi import get_asgi_application
+
+    async def fire():
+        transport = httpx.ASGITransport(app=get_asgi_application())
+        async with httpx.AsyncClient(transport=transport, base_url='http://localhost', timeout=120,
+                                     headers={'Authorization': 'Bearer token'}) as client:
+            responses = await asyncio.gather(*(client.get(path) for _ in range(users)))
+        return [response.status_code for response in responses]
+
+    return asyncio.run(fire())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub round trip in seconds')
+    parser.add_argument('--tokens', type=int, default=20)
+    parser.add_argument('--token-latency', type=float, default=0.02)
+    parser.add_argument('--async', dest='use_async', action='store_true', help='drive the async views')
+    args = parser.parse_args()
+
+    files = monorepo_files(20)
+    with StubServer(github_routes(files=files), latency=args.latency) as github, \
+            StubServer(registry_routes(), latency=args.latency) as registry, \
+            StubServer(groq_routes(args.tokens, args.token_latency)) as groq_stub:
+        setup_django(
+            GITHUB_API_URL=github.url,
+            GROQ_BASE_URL=groq_stub.url,
+            NPM_REGISTRY_URL=f'{registry.url}/npm',
+            PYPI_URL=f'{registry.url}/pypi',
+            SUMMARY_CACHE_ENABLED='false',
+            ASYNC_VIEWS='true' if args.use_async else 'false',
+        )
+        fire = _fire_async if args.use_async else _fire_threads
+        stubs = {'github': github, 'registry': registry, 'groq': groq_stub}
+
+        print(f"{'endpoint':>13} {'users':>6} {'wall (ms)':>10} {'ok':>4}  upstream calls (total)")
+        for name, path in ENDPOINTS.items():
+            clear_caches()
+            for stub in stubs.values():
+                stub.reset()
+            started = time.perf_counter()
+            statuses = fire(path, args.users)
+            elapsed = time.perf_counter() - started
+            calls = ', '.join(f'{stub_name} {stub.total_calls()}' for stub_name, stub in stubs.items())
+            print(f"{name:>13} {args.users:>6} {elapsed * 1000:>10.0f} {statuses.count(200):>4}  {calls}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Cold start cost: imports and work done before the first request can be served.
+
+Starts fresh interpreters under ``python -X importtime`` that set Django up,
+build the WSGI application and resolve the URLconf (which imports every view),
+then reports the wall time and the heaviest top-level imports.
+
+It also fails (exit status 1) on cold-start regressions: modules that must
+only load on first use being imported, a MongoDB client being created, or
+anything printed while starting. ``--budget-ms`` adds a wall-time limit.
+
+Run from the backend directory:
+
+    python -m benchmarks.importtime --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Imported on first use only; seeing them at startup is a regression
+LAZY_MODULES = ('groq', 'drf_yasg.views', 'drf_yasg.generators')
+
+STARTUP = """
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+import sys
+from mongoengine import connection
+print('@@' + __import__('json').dumps({
+    'setup_ms': elapsed * 1000,
+    'mongo_clients': len(connection._connections),
+    'lazy_imported': [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+_IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def cold_start():
+    """Run one fresh interpreter; returns (report, top-level imports, stray output)"""
+    environ = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'backend.settings',
+        'GROQ_API_KEY': os.environ.get('GROQ_API_KEY', 'benchmark'),
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        env=environ, capture_output=True, text=True, check=True
+    )
+    report = None
+    stray = []
+    for line in result.stdout.splitlines():
+        if line.startswith('@@'):
+            report = json.loads(line[2:])
+        elif line.strip():
+            stray.append(line)
+
+    top_level = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        # Only the outermost imports: their cumulative time covers the nested ones
+        if match and not match.group(3):
+            top_level[match.group(4)] = int(match.group(2)) / 1000
+    return report, top_level, stray
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, help='fail if the median startup takes longer')
+    args = parser.parse_args()
+
+    runs = [cold_start() for _ in range(args.runs)]
+    setup_ms = statistics.median(report['setup_ms'] for report, _, _ in runs)
+    report, top_level, stray = runs[-1]
+
+    print(f"startup (django.setup + WSGI app + URLconf), median of {args.runs}: {setup_ms:.0f} ms")
+    print(f"top-level imports: {len(top_level)}, {sum(top_level.values()):.0f} ms cumulative")
+    for name, ms in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:>8.1f} ms  {name}")
+
+    problems = []
+    if report['lazy_imported']:
+        problems.append(f"imported at startup: {', '.join(report['lazy_imported'])}")
+    if report['mongo_clients']:
+        problems.append(f"{report['mongo_clients']} MongoDB client(s) created at startup")
+    if stray:
+        problems.append(f"{len(stray)} line(s) printed at startup, e.g. {stray[0]!r}")
+    if args.budget_ms is not None and setup_ms > args.budget_ms:
+        problems.append(f"startup took {setup_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Dependency re-scan cost: first scan, unchanged re-scan, and re-scan after a one-file commit.
+
+Run from the backend directory:
+
+    python -m benchmarks.incremental_scan --latency 0.02 --manifests 500
+"""
+import argparse
+import json
+import time
+
+from django.conf import settings
+
+from .harness import clear_caches, setup_django
+from .stubs import StubServer, github_routes, monorepo_files, registry_routes
+
+
+def one_file_commit(files):
+    """The same repository with one package.json bumping a dependency and adding another"""
+    files = dict(files)
+    path = next(path for path in sorted(files) if path.endswith('package.json'))
+    manifest = json.loads(files[path])
+    manifest['dependencies'] = {**manifest['dependencies'], 'shared-0': '^2.0.0', 'left-pad': '^1.3.0'}
+    files[path] = json.dumps(manifest, indent=2).encode()
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.02, help='stub round-trip latency in seconds')
+    parser.add_argument('--manifests', type=int, default=500)
+    args = parser.parse_args()
+
+    files = monorepo_files(args.manifests)
+    runs = [('first scan', files), ('unchanged', files), ('one-file commit', one_file_commit(files))]
+
+    setup_django()
+    clear_caches()
+    from backend_app.dependencies import scan_dependencies
+
+    print(f"{'run':>16} {'time (s)':>9} {'GitHub':>7} {'registry':>9} {'parsed':>7} {'reused':>7}")
+    with StubServer(registry_routes(), latency=args.latency) as registry:
+        settings.NPM_REGISTRY_URL = f'{registry.url}/npm'
+        settings.PYPI_URL = f'{registry.url}/pypi'
+        for run, tree_files in runs:
+            with StubServer(github_routes(files=tree_files), latency=args.latency) as github:
+                settings.GITHUB_API_URL = github.url
+                registry.reset()
+                started = time.perf_counter()
+                result = scan_dependencies('octocat', 'monorepo', 'token')
+                elapsed = time.perf_counter() - started
+                reuse = result['reuse']
+                print(f"{run:>16} {elapsed:>9.2f} {github.total_calls():>7} {registry.total_calls():>9} "
+                      f"{reuse['manifests_parsed']:>7} {reuse['manifests_reused']:>7}")
+    print(json.dumps(reuse, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Connection reuse and latency of the shared client vs. per-call requests.
+
+Run from the backend directory:
+
+    python -m benchmarks.outbound_client --latency 0.005
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+
+from .stubs import StubServer, github_routes
+
+
+def _percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def _run(stub, get, count, workers):
+    """Issue ``count`` GitHub-style GETs and return per-call latencies"""
+    paths = ['/user', '/repos/octocat/hello-world']
+
+    def call(i):
+        started = time.perf_counter()
+        response = get(f'{stub.url}{paths[i % len(paths)]}', headers={'Authorization': 'Bearer token'})
+        response.json()
+        return time.perf_counter() - started
+
+    stub.reset()
+    with ThreadPoolExecutor(workers) as executor:
+        latencies = list(executor.map(call, range(count)))
+    return latencies, stub.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.005, help='stub processing latency in seconds')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+
+    with StubServer(github_routes(), latency=args.latency) as stub:
+        host = stub.url.split('://', 1)[1].split(':', 1)[0]
+        settings.configure(
+            HTTP_CLIENT_TIMEOUT=15.0,
+            HTTP_CLIENT_CONNECT_TIMEOUT=5.0,
+            HTTP_CLIENT_MAX_CONNECTIONS=100,
+            HTTP_CLIENT_KEEPALIVE_EXPIRY=30.0,
+            HTTP_CLIENT_HTTP2=True,
+            HTTP_CLIENT_HOST_LIMITS={host: 20},
+        )
+        from backend_app.clients import http_client
+
+        print(f"{'client':>16} {'workers':>8} {'conns':>6} {'reuse':>6} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        for workers in args.workers:
+            for name, get in (('requests.get', requests.get), ('shared client', http_client().get)):
+                latencies, connections = _run(stub, get, args.requests, workers)
+                reuse = 1 - connections / args.requests
+                print(f"{name:>16} {workers:>8} {connections:>6} {reuse:>6.1%} "
+                      f"{statistics.median(latencies) * 1000:>9.2f} {_percentile(latencies, 0.99) * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""GitHub request pacing: secondary-limit hits and interactive latency under a bulk scan.
+
+A bulk job downloads ``--blobs`` blobs at full fan-out while an interactive
+caller repeatedly fetches /user. The stub GitHub trips a secondary rate
+limit (403 + Retry-After) past ``--limit`` requests per second. Runs once
+with pacing effectively off and once paced below the limit: a bucket of
+``--rate`` requests per second with a burst of half that.
+
+    python -m benchmarks.ratelimit_priority --blobs 300 --limit 60 --rate 40
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from django.conf import settings
+
+from .harness import setup_django
+from .stubs import StubServer, github_routes, monorepo_files, rate_limited
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.02, help='stub round-trip latency in seconds')
+    parser.add_argument('--blobs', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=60, help='stub secondary limit, requests per second')
+    parser.add_argument('--rate', type=float, default=40, help='paced requests per second')
+    parser.add_argument('--interactive', type=int, default=20, help='interactive calls during the bulk job')
+    args = parser.parse_args()
+
+    files = monorepo_files(args.blobs)
+    routes = rate_limited(github_routes(files=files), per_second=args.limit)
+    with StubServer(routes, latency=args.latency) as github:
+        setup_django(GITHUB_API_URL=github.url, GITHUB_INTERACTIVE_MAX_WAIT=30)
+        from backend_app.dependencies import _download_blobs, git_blob_sha
+        from backend_app.github import github_get, token_scope
+        from backend_app.ratelimit import bulk_priority, scheduler
+
+        shas = [git_blob_sha(content) for content in files.values()]
+
+        print(f"{'pacing':>7} {'bulk (s)':>9} {'blobs ok':>9} {'403s':>5} "
+              f"{'interactive p50 (ms)':>21} {'p95 (ms)':>9}")
+        for pacing, rate, burst in (('off', 100000, 100000), ('on', args.rate, max(int(args.rate / 2), 1))):
+            settings.GITHUB_REQUESTS_PER_SECOND = rate
+            settings.GITHUB_REQUEST_BURST = burst
+            settings.GITHUB_INTERACTIVE_BURST_RESERVE = max(int(burst * 0.2), 1)
+            token = f'token-{pacing}'
+            time.sleep(1.1)  # start in a fresh secondary-limit window
+            github.reset()
+
+            outcome = {}
+
+            def bulk():
+                started = time.perf_counter()
+                with bulk_priority():
+                    outcome['blobs'] = _download_blobs('octocat', 'monorepo', shas, token)
+                outcome['elapsed'] = time.perf_counter() - started
+
+            worker = threading.Thread(target=bulk)
+            worker.start()
+            latencies = []
+            while worker.is_alive() and len(latencies) < args.interactive:
+                started = time.perf_counter()
+                github_get('/user', token, conditional=False)
+                latencies.append(time.perf_counter() - started)
+                time.sleep(0.05)
+            worker.join()
+
+            budget = scheduler.stats()[token_scope(token)[:12]]
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            print(f"{pacing:>7} {outcome['elapsed']:>9.2f} {len(outcome['blobs']):>9} "
+                  f"{budget.get('rate_limited', 0):>5} {statistics.median(latencies) * 1000:>21.1f} "
+                  f"{p95 * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Wall-clock time of latest-version lookups: sequential, concurrent and cached.
+
+Run from the backend directory:
+
+    python -m benchmarks.registry_lookups --latency 0.05
+"""
+import argparse
+import time
+
+import requests
+from django.conf import settings
+
+from .stubs import StubServer, registry_routes
+
+
+def _packages(count):
+    # Half npm, half PyPI, like a typical full-stack repo
+    return [('npm' if i % 2 else 'pip', f'package-{i}') for i in range(count)]
+
+
+def _sequential(packages):
+    # The pre-batching view: one blocking requests.get per dependency
+    from backend_app.registry import _extract_version, _registry_url
+
+    results = {}
+    for ecosystem, package in packages:
+        response = requests.get(_registry_url(ecosystem, package))
+        if response.status_code == 200:
+            results[(ecosystem, package)] = _extract_version(ecosystem, response.json())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='stub round-trip latency in seconds')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent lookups per registry')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 1000])
+    args = parser.parse_args()
+
+    with StubServer(registry_routes(), latency=args.latency) as stub:
+        settings.configure(
+            NPM_REGISTRY_URL=f'{stub.url}/npm',
+            PYPI_URL=f'{stub.url}/pypi',
+            REGISTRY_CONCURRENCY={'npm': args.concurrency, 'pip': args.concurrency},
+            REGISTRY_TIMEOUT=30.0,
+            VERSION_CACHE_TTL=3600,
+            VERSION_CACHE_STALE_TTL=0,
+            VERSION_CACHE_SIZE=10000,
+        )
+        from backend_app.registry import fetch_latest_versions, version_cache
+
+        # Measure the in-process tier only; MongoDB is not part of this benchmark
+        version_cache.persistent = False
+
+        print(f"{'deps':>6} {'sequential (s)':>15} {'concurrent (s)':>15} {'speedup':>8} {'cached (s)':>11}")
+        for size in args.sizes:
+            packages = _packages(size)
+
+            started = time.perf_counter()
+            sequential = _sequential(packages)
+            sequential_time = time.perf_counter() - started
+
+            version_cache.memory.clear()
+            started = time.perf_counter()
+            concurrent = fetch_latest_versions(packages)
+            concurrent_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            cached = fetch_latest_versions(packages)
+            cached_time = time.perf_counter() - started
+
+            assert sequential == concurrent == cached
+            print(f"{size:>6} {sequential_time:>15.2f} {concurrent_time:>15.2f} "
+                  f"{sequential_time / concurrent_time:>7.1f}x {cached_time:>11.4f}")
+        print(f"cache: {version_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,481 @@
+"""Local HTTP stand-ins for the upstream services the backend talks to."""
+import base64
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import tarfile
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.stub.record_connection()
+
+    def _dispatch(self, method):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path = self.path.split('?', 1)[0]
+        if path == '/__stub__/calls':
+            with stub._lock:
+                payload = {
+                    'calls': [[*key, count] for key, count in stub._calls.items()],
+                    'connections': stub._connections,
+                }
+            if method == 'POST':
+                stub.reset()
+            return self._send(200, payload, {})
+        for route_method, pattern, handler in stub.routes:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                stub.record(method, pattern.pattern)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload, headers = handler(self, match, body)
+                # Answer conditional requests for unchanged resources like GitHub does
+                etag = headers.get('ETag')
+                if status == 200 and etag and self.headers.get('If-None-Match') == etag:
+                    status, payload = 304, b''
+                break
+        else:
+            stub.record(method, path)
+            status, payload, headers = 404, {'message': 'Not Found'}, {}
+        self._send(status, payload, headers)
+
+    def _send(self, status, payload, headers):
+        if hasattr(payload, '__next__'):
+            return self._send_chunked(status, payload, headers)
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode()
+            headers = {'Content-Type': 'application/json', **headers}
+        elif isinstance(payload, str):
+            payload = payload.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_chunked(self, status, chunks, headers):
+        """Stream an iterator of str/bytes chunks with chunked transfer encoding"""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs under concurrent clients
+    request_queue_size = 1024
+
+
+class StubServer:
+    """A threaded HTTP server answering from a route table.
+
+    ``routes`` is a list of ``(method, path_regex, handler)`` where the handler
+    receives ``(request_handler, match, body)`` and returns
+    ``(status, payload, headers)``.  Every request sleeps ``latency`` seconds
+    first so round trips cost something, as they do against the real services.
+
+    The server runs in a forked process so it does not compete with the code
+    under test for the GIL; per-route call counts are read back over HTTP.
+    """
+
+    def __init__(self, routes, latency=0.0):
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+        self.latency = latency
+        self._calls = Counter()
+        self._connections = 0
+        self._lock = threading.Lock()
+        self._server = _StubHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self._server.stub = self
+        self._process = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def _read_counters(self):
+        with urllib.request.urlopen(f'{self.url}/__stub__/calls') as response:
+            return json.load(response)
+
+    @property
+    def calls(self):
+        """Counter of ``(method, route_pattern)`` -> requests served so far"""
+        return Counter({(method, route): count for method, route, count in self._read_counters()['calls']})
+
+    @property
+    def connections(self):
+        """TCP connections accepted so far, excluding the one reading this"""
+        return self._read_counters()['connections'] - 1
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def record_connection(self):
+        with self._lock:
+            self._connections += 1
+
+    def record(self, method, route):
+        with self._lock:
+            self._calls[(method, route)] += 1
+
+    def reset(self):
+        """Clear the call counters (from the parent, or inside the server)"""
+        if multiprocessing.parent_process() is None and self._process is not None:
+            request = urllib.request.Request(f'{self.url}/__stub__/calls', method='POST')
+            urllib.request.urlopen(request).close()
+            return
+        with self._lock:
+            self._calls.clear()
+            self._connections = 0
+
+    def start(self):
+        context = multiprocessing.get_context('fork')
+        self._process = context.Process(target=self._server.serve_forever, daemon=True)
+        self._process.start()
+        return self
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def registry_routes(version='1.0.0'):
+    """npm registry and PyPI JSON API answering every package with ``version``."""
+    return [
+        ('GET', r'/npm/(?P<package>.+)/latest', lambda h, m, b: (200, {'version': version}, {})),
+        ('GET', r'/pypi/(?P<package>[^/]+)/json', lambda h, m, b: (200, {'info': {'version': version}}, {})),
+    ]
+
+
+def git_blob_sha(content):
+    """The SHA git (and GitHub) assigns to a blob with this content"""
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+
+def monorepo_files(manifests=20, packages_per_manifest=15, shared_packages=10):
+    """A repository with ``manifests`` package.json / requirements.txt files.
+
+    Each manifest declares ``shared_packages`` packages used everywhere plus
+    its own, so lookups can be deduplicated across manifests.
+    """
+    files = {'README.md': b'# Monorepo\n'}
+    for i in range(manifests):
+        names = [f'shared-{j}' for j in range(shared_packages)]
+        names += [f'pkg-{i}-{j}' for j in range(packages_per_manifest - shared_packages)]
+        if i % 2:
+            files[f'services/svc-{i}/requirements.txt'] = '\n'.join(f'{name}==1.0.0' for name in names).encode()
+        else:
+            files[f'packages/app-{i}/package.json'] = json.dumps(
+                {'name': f'app-{i}', 'dependencies': {name: '^1.0.0' for name in names}}, indent=2
+            ).encode()
+    return files
+
+
+def tarball(files, prefix):
+    """A gzipped tar archive of ``files`` under ``prefix/``, like GitHub's /tarball"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for path, content in sorted(files.items()):
+            info = tarfile.TarInfo(f'{prefix}/{path}')
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return gzip.compress(buffer.getvalue())
+
+
+def git_trees(files):
+    """Git tree objects for ``files``: returns ``(root_sha, {tree_sha: entries})``
+
+    Entries hold the direct children of one directory, as GitHub lists them
+    for a non-recursive tree request.
+    """
+    directories = {'': {}}
+    for path in files:
+        parts = path.split('/')
+        for depth in range(1, len(parts)):
+            parent, name = '/'.join(parts[:depth - 1]), parts[depth - 1]
+            directories.setdefault('/'.join(parts[:depth]), {})
+            directories[parent][name] = ('tree', '/'.join(parts[:depth]))
+        directories['/'.join(parts[:-1])][parts[-1]] = ('blob', path)
+
+    trees, shas = {}, {}
+    # Children before parents, so a directory's SHA can include its subtrees'
+    for directory in sorted(directories, key=lambda d: -d.count('/') - bool(d)):
+        entries = []
+        for name, (kind, path) in sorted(directories[directory].items()):
+            if kind == 'blob':
+                entries.append({'path': name, 'mode': '100644', 'type': 'blob',
+                                'sha': git_blob_sha(files[path]), 'size': len(files[path])})
+            else:
+                entries.append({'path': name, 'mode': '040000', 'type': 'tree', 'sha': shas[path]})
+        shas[directory] = hashlib.sha1(json.dumps(entries).encode()).hexdigest()
+        trees[shas[directory]] = entries
+    return shas[''], trees
+
+
+def _flatten_tree(trees, sha, prefix=''):
+    for entry in trees[sha]:
+        path = f"{prefix}{entry['path']}"
+        yield {**entry, 'path': path}
+        if entry['type'] == 'tree':
+            yield from _flatten_tree(trees, entry['sha'], f'{path}/')
+
+
+def head_commit_sha(tree_sha):
+    """The SHA of the commit at the head of ``main`` in github_routes() for this tree"""
+    return hashlib.sha1(f'commit {tree_sha}'.encode()).hexdigest()
+
+
+def github_routes(login='octocat', repo_count=250, files=None, truncate_at=100000):
+    """The GitHub REST endpoints the views use.
+
+    The user owns ``repo_count`` repositories; every repository's default
+    branch ``main`` contains ``files`` (path -> bytes). Recursive tree
+    listings longer than ``truncate_at`` entries come back truncated.
+    """
+    files = files if files is not None else monorepo_files()
+    blobs = {git_blob_sha(content): content for content in files.values()}
+    tree_sha, trees = git_trees(files)
+    commit_sha = head_commit_sha(tree_sha)
+
+    def branch(h, m, b):
+        if m.group('branch') != 'main':
+            return 404, {'message': 'Branch not found'}, {}
+        return 200, {
+            'name': 'main',
+            'commit': {'sha': commit_sha, 'commit': {'tree': {'sha': tree_sha}}},
+        }, {'ETag': f'"{commit_sha}"'}
+
+    def tree_response(h, m, b):
+        sha = tree_sha if m.group('ref') in ('main', commit_sha) else m.group('ref')
+        if sha not in trees:
+            return 404, {'message': 'Not Found'}, {}
+        if 'recursive=' not in h.path:
+            return 200, {'sha': sha, 'tree': trees[sha], 'truncated': False}, {'ETag': f'"{sha}"'}
+        entries = list(_flatten_tree(trees, sha))
+        truncated = len(entries) > truncate_at
+        return 200, {'sha': sha, 'tree': entries[:truncate_at], 'truncated': truncated}, {'ETag': f'"{sha}:r"'}
+
+    def blob(h, m, b):
+        content = blobs.get(m.group('sha'))
+        if content is None:
+            return 404, {'message': 'Not Found'}, {}
+        if 'raw' in h.headers.get('Accept', ''):
+            return 200, content, {'Content-Type': 'application/vnd.github.raw'}
+        return 200, {'sha': m.group('sha'), 'encoding': 'base64', 'content': base64.b64encode(content).decode()}, {}
+
+    archive = tarball(files, f'{login}-repo-{tree_sha[:7]}')
+
+    def archive_redirect(h, m, b):
+        # GitHub answers with a redirect to codeload.github.com
+        return 302, b'', {'Location': f'http://{h.headers["Host"]}/codeload/{m.group("owner")}/{m.group("repo")}'}
+
+    def archive_download(h, m, b):
+        chunks = (archive[i:i + 16384] for i in range(0, len(archive), 16384))
+        return 200, chunks, {'Content-Type': 'application/x-gzip'}
+
+    def contents(h, m, b):
+        content = files.get(m.group('path'))
+        if content is None:
+            return 404, {'message': 'Not Found'}, {}
+        return 200, {
+            'path': m.group('path'),
+            'sha': git_blob_sha(content),
+            'encoding': 'base64',
+            'content': base64.b64encode(content).decode(),
+        }, {}
+
+    def user_repos(h, m, b):
+        query = dict(pair.split('=', 1) for pair in h.path.partition('?')[2].split('&') if '=' in pair)
+        page, per_page = int(query.get('page', 1)), int(query.get('per_page', 30))
+        last_page = max(1, -(-repo_count // per_page))
+        repos = [{
+            'id': i,
+            'name': f'repo-{i}',
+            'full_name': f'{login}/repo-{i}',
+            'description': f'Stub repository number {i}',
+            'html_url': f'https://github.com/{login}/repo-{i}',
+            'language': 'Python',
+            'stargazers_count': i,
+            'updated_at': '2024-01-01T00:00:00Z',
+            'visibility': 'public',
+        } for i in range((page - 1) * per_page, min(page * per_page, repo_count))]
+        base = f'http://{h.headers["Host"]}/user/repos?per_page={per_page}'
+        link = f'<{base}&page={page + 1}>; rel="next", <{base}&page={last_page}>; rel="last"'
+        return 200, repos, ({'Link': link} if page < last_page else {})
+
+    def repo(h, m, b):
+        owner, name = m.group('owner'), m.group('repo')
+        return 200, {
+            'id': 1,
+            'name': name,
+            'full_name': f'{owner}/{name}',
+            'description': 'A stub repository',
+            'default_branch': 'main',
+            'stargazers_count': 42,
+            'forks_count': 7,
+            'languages_url': f'http://{h.headers["Host"]}/repos/{owner}/{name}/languages',
+        }, {}
+
+    def created(kind):
+        # Write endpoints answer with a SHA derived from the request body
+        return lambda h, m, b: (201, {'sha': hashlib.sha1(kind.encode() + b).hexdigest()}, {})
+
+    def pull_request(h, m, b):
+        owner, name = m.group('owner'), m.group('repo')
+        return 201, {'number': 1, 'html_url': f'https://github.com/{owner}/{name}/pull/1'}, {}
+
+    readme = base64.b64encode(b'# Stub repository\n\nA project used for benchmarks.\n' * 50).decode()
+
+    def access_token(h, m, b):
+        # The OAuth code exchange on github.com (GITHUB_OAUTH_URL)
+        return 200, {'access_token': f'gho_stub{hashlib.sha1(b).hexdigest()}', 'token_type': 'bearer', 'scope': 'repo'}, {}
+
+    return [
+        ('GET', r'/user', lambda h, m, b: (200, {'id': 1, 'login': login, 'name': 'The Octocat'}, {})),
+        ('GET', r'/user/repos', user_repos),
+        ('GET', r'/rate_limit', lambda h, m, b: (200, {'resources': {'core': {
+            'limit': 5000, 'remaining': 4999, 'reset': int(time.time()) + 3600, 'used': 1}}}, {})),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)', repo),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/readme',
+         lambda h, m, b: (200, {'content': readme, 'encoding': 'base64'}, {})),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/languages',
+         lambda h, m, b: (200, {'Python': 12000, 'JavaScript': 8000}, {})),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/branches/(?P<branch>.+)', branch),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/git/trees/(?P<ref>[^/]+)', tree_response),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/git/blobs/(?P<sha>[0-9a-f]+)', blob),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/contents/(?P<path>.+)', contents),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/tarball(/(?P<ref>[^/]+))?', archive_redirect),
+        ('GET', r'/codeload/(?P<owner>[^/]+)/(?P<repo>[^/]+)', archive_download),
+        ('POST', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/git/trees', created('tree')),
+        ('POST', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/git/commits', created('commit')),
+        ('POST', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/git/refs', created('ref')),
+        ('GET', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls', lambda h, m, b: (200, [], {})),
+        ('POST', r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls', pull_request),
+        ('POST', r'/login/oauth/access_token', access_token),
+    ]
+
+
+def rate_limited(routes, budget=5000, per_second=None, retry_after=1):
+    """Wrap ``routes`` with GitHub-style rate limiting.
+
+    Every answer carries ``X-RateLimit-*`` headers counting down a primary
+    ``budget``, which answers 403 once spent. More than ``per_second``
+    requests within one second trip a secondary limit: 403 with
+    ``Retry-After``.
+    """
+    lock = threading.Lock()
+    state = {'used': 0, 'second': 0, 'count': 0}
+    reset = int(time.time()) + 3600
+
+    def wrap(handler):
+        def limited(h, m, b):
+            with lock:
+                now = int(time.time())
+                if now != state['second']:
+                    state['second'], state['count'] = now, 0
+                state['count'] += 1
+                secondary = per_second is not None and state['count'] > per_second
+                if not secondary and state['used'] < budget:
+                    state['used'] += 1
+                remaining = budget - state['used']
+            headers = {
+                'X-RateLimit-Limit': str(budget),
+                'X-RateLimit-Remaining': str(remaining),
+                'X-RateLimit-Reset': str(reset),
+                'X-RateLimit-Resource': 'core',
+            }
+            if secondary:
+                return 403, {'message': 'You have exceeded a secondary rate limit.'}, {
+                    **headers, 'Retry-After': str(retry_after)
+                }
+            if remaining == 0:
+                return 403, {'message': 'API rate limit exceeded.'}, headers
+            status, payload, extra = handler(h, m, b)
+            return status, payload, {**extra, **headers}
+        return limited
+
+    return [(method, pattern, wrap(handler)) for method, pattern, handler in routes]
+
+
+def groq_routes(tokens=60, token_latency=0.02):
+    """Groq's OpenAI-compatible chat completions API producing ``tokens`` tokens.
+
+    Each token costs ``token_latency`` seconds, streamed or not.
+    """
+    words = [f'word{i} ' for i in range(tokens)]
+
+    def completion(h, m, body):
+        request = json.loads(body)
+        base = {'id': 'chatcmpl-stub', 'created': int(time.time()), 'model': request['model']}
+        if not request.get('stream'):
+            time.sleep(tokens * token_latency)
+            return 200, {
+                **base,
+                'object': 'chat.completion',
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(words)},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 100, 'completion_tokens': tokens, 'total_tokens': 100 + tokens},
+            }, {}
+
+        def events():
+            for word in words:
+                time.sleep(token_latency)
+                chunk = {
+                    **base,
+                    'object': 'chat.completion.chunk',
+                    'choices': [{'index': 0, 'delta': {'content': word}, 'finish_reason': None}],
+                }
+                yield f'data: {json.dumps(chunk)}\n\n'
+            yield 'data: [DONE]\n\n'
+
+        return 200, events(), {'Content-Type': 'text/event-stream'}
+
+    return [('POST', r'/openai/v1/chat/completions', completion)]
@@ -0,0 +1,375 @@
+"""Every API endpoint at fixed concurrency against stub upstreams, recorded to a JSON baseline.
+
+Starts stub GitHub (REST and OAuth), npm registry, PyPI and Groq servers,
+then the backend itself (uvicorn or runserver) pointed at them, and drives
+each URL in ``backend_app/urls.py`` in turn: a few warm-up requests, then
+``--requests`` requests from ``--concurrency`` clients. For each endpoint it
+records throughput, p50/p95/p99 latency, errors, and the upstream calls per
+request as counted by the stubs.
+
+The endpoints that keep state in MongoDB (jobs, campaigns, the dependency
+index, the connection test) need ``--mongodb-uri``; without it they are
+reported as skipped and every cache stays in memory. Adding a URL without a scenario here fails the
+run, so the suite keeps covering the whole API.
+
+``--save`` writes the results as a baseline; ``--compare`` checks a run
+against one and exits with status 1 on a regression: any endpoint making
+more upstream calls per request, or slower or lower throughput than the
+baseline beyond ``--tolerance``. Upstream call counts are exact on any
+machine; timings are only comparable between runs on the same one.
+
+Run from the backend directory:
+
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from .asgi_load import Server
+from .harness import setup_django
+from .stubs import StubServer, github_routes, groq_routes, monorepo_files, rate_limited, registry_routes
+
+REPO = 'monorepo'
+TOKEN = 'benchmark-token'
+# Push deliveries only invalidate here: no GITHUB_WEBHOOK_TOKEN, so no background scans skew the counts
+WEBHOOK_SECRET = 'benchmark-webhook-secret'
+
+# Successful answers; queued scans and campaigns answer 202
+ACCEPTED_STATUSES = (200, 201, 202)
+
+
+class Scenario:
+    """How to call one endpoint: method, path and body, and what it needs first
+
+    ``setup`` runs once against the server before the endpoint is driven and
+    returns the values the path is formatted with (e.g. a job id). A bytes
+    ``body`` is sent as it is, anything else as JSON.
+    """
+
+    def __init__(self, method, path, body=None, needs_mongodb=False, setup=None, headers=None):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.needs_mongodb = needs_mongodb
+        self.setup = setup
+        self.headers = headers
+
+
+def _update_body(files):
+    manifest = next(path for path in sorted(files) if path.endswith('package.json'))
+    return {'files': {manifest: {'shared-0': {'current': '1.0.0', 'latest': '2.0.0'}}}}
+
+
+CAMPAIGN_BODY = {
+    'policy': [{'ecosystem': 'npm', 'package': 'shared-0', 'version': '2.0.0'}],
+    'repos': [REPO],
+}
+
+
+def _push_delivery():
+    """The recorded push webhook, signed the way GitHub signs it"""
+    body = (Path(__file__).parent / 'payloads' / 'push.json').read_bytes()
+    signature = 'sha256=' + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {'Content-Type': 'application/json', 'X-GitHub-Event': 'push', 'X-Hub-Signature-256': signature}
+
+
+def _submit_scan(client):
+    response = client.post(f'/api/github/repos/{REPO}/dependencies/scan')
+    response.raise_for_status()
+    return {'job_id': response.json()['job_id']}
+
+
+def _indexed_repo(client):
+    """Scan the repository once so the dependency index has entries to return"""
+    client.get(f'/api/github/repos/{REPO}/dependencies').raise_for_status()
+    return {}
+
+
+def _finished_campaign(client):
+    """A campaign that has run to the end, so its event stream closes straight away"""
+    response = client.post('/api/campaigns/', json=CAMPAIGN_BODY)
+    response.raise_for_status()
+    campaign_id = response.json()['campaign_id']
+    deadline = time.monotonic() + 60
+    while client.get(f'/api/campaigns/{campaign_id}/').json()['status'] not in ('succeeded', 'failed'):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'campaign {campaign_id} did not finish')
+        time.sleep(0.2)
+    return {'campaign_id': campaign_id}
+
+
+def scenarios(files):
+    """Scenario per URL name in backend_app/urls.py"""
+    webhook_body, webhook_headers = _push_delivery()
+    return {
+        'test_mongodb': Scenario('GET', '/api/test-mongodb/', needs_mongodb=True),
+        'cache_stats': Scenario('GET', '/api/cache/stats/'),
+        'rate_limit_stats': Scenario('GET', '/api/github/rate-limit/'),
+        'github_login': Scenario('POST', '/api/github/login/', {'code': 'benchmark'}),
+        'github_webhook': Scenario('POST', '/api/github/webhook', body=webhook_body, headers=webhook_headers),
+        'github_repos': Scenario('GET', '/api/github/repos/?page=2&per_page=30'),
+        'generate_repo_summary': Scenario('GET', f'/api/github/repos/{REPO}/summary'),
+        'stream_repo_summary': Scenario('GET', f'/api/github/repos/{REPO}/summary/stream'),
+        'check_dependencies': Scenario('GET', f'/api/github/repos/{REPO}/dependencies'),
+        'submit_dependency_scan': Scenario(
+            'POST', f'/api/github/repos/{REPO}/dependencies/scan', needs_mongodb=True
+        ),
+        'query_dependency_index': Scenario(
+            'GET', '/api/dependencies/?ecosystem=npm&package=shared-0&version=<2.0.0',
+            needs_mongodb=True, setup=_indexed_repo
+        ),
+        'job_status': Scenario('GET', '/api/jobs/{job_id}/', needs_mongodb=True, setup=_submit_scan),
+        'update_dependencies': Scenario(
+            'POST', f'/api/github/repos/{REPO}/update-dependencies', _update_body(files)
+        ),
+        'create_campaign': Scenario('POST', '/api/campaigns/', CAMPAIGN_BODY, needs_mongodb=True),
+        'campaign_status': Scenario(
+            'GET', '/api/campaigns/{campaign_id}/', needs_mongodb=True, setup=_finished_campaign
+        ),
+        'resume_campaign': Scenario(
+            'POST', '/api/campaigns/{campaign_id}/resume', needs_mongodb=True, setup=_finished_campaign
+        ),
+        'stream_campaign': Scenario(
+            'GET', '/api/campaigns/{campaign_id}/stream', needs_mongodb=True, setup=_finished_campaign
+        ),
+    }
+
+
+def url_names():
+    """Names of every URL in backend_app/urls.py"""
+    setup_django()
+    from backend_app.urls import urlpatterns
+    return [pattern.name for pattern in urlpatterns]
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+async def _drive(url, method, path, body, headers, concurrency, total):
+    """Send ``total`` requests from ``concurrency`` clients; returns (latencies, statuses, seconds)"""
+    latencies = []
+    statuses = Counter()
+    remaining = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, headers={'Authorization': f'Bearer {TOKEN}'},
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    # The whole body is read, so streaming endpoints count until their last event
+                    if isinstance(body, bytes):
+                        response = await client.request(method, path, content=body, headers=headers)
+                    else:
+                        response = await client.request(method, path, json=body, headers=headers)
+                except httpx.TransportError:
+                    statuses['transport_error'] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - started
+
+
+def run_endpoint(server, stubs, scenario, args):
+    path = scenario.path
+    if scenario.setup is not None:
+        with httpx.Client(base_url=server.url, timeout=120,
+                          headers={'Authorization': f'Bearer {TOKEN}'}) as client:
+            path = path.format(**scenario.setup(client))
+
+    # Warm the caches and connection pools; only the measured requests are counted upstream
+    asyncio.run(_drive(server.url, scenario.method, path, scenario.body, scenario.headers, 1, args.warmup))
+    for stub in stubs.values():
+        stub.reset()
+    latencies, statuses, elapsed = asyncio.run(
+        _drive(server.url, scenario.method, path, scenario.body, scenario.headers, args.concurrency, args.requests)
+    )
+
+    latencies.sort()
+    calls = {name: stub.calls for name, stub in stubs.items()}
+    upstream = {name: sum(counter.values()) for name, counter in calls.items()}
+    errors = sum(count for status, count in statuses.items() if status not in ACCEPTED_STATUSES)
+    return {
+        'method': scenario.method,
+        'path': path,
+        'requests': args.requests,
+        'rps': round(args.requests / elapsed, 2),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'upstream_calls': upstream,
+        'upstream_calls_per_request': {
+            name: round(total / args.requests, 2) for name, total in upstream.items()
+        },
+        'upstream_routes': {
+            name: {f'{method} {route}': count for (method, route), count in sorted(counter.items())}
+            for name, counter in calls.items() if counter
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as messages"""
+    problems = []
+    for name, result in results['endpoints'].items():
+        base = baseline['endpoints'].get(name)
+        if base is None or result.get('skipped') or base.get('skipped'):
+            continue
+        for upstream, calls in result['upstream_calls_per_request'].items():
+            if calls > base['upstream_calls_per_request'].get(upstream, 0):
+                problems.append(f"{name}: {calls} {upstream} calls per request, "
+                                f"baseline {base['upstream_calls_per_request'].get(upstream, 0)}")
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if result[metric] is not None and base[metric] and result[metric] > base[metric] * (1 + tolerance):
+                problems.append(f"{name}: {metric} {result[metric]} vs {base[metric]} in the baseline")
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            problems.append(f"{name}: {result['rps']} req/s vs {base['rps']} in the baseline")
+        if result['errors'] > base['errors']:
+            problems.append(f"{name}: {result['errors']} errors vs {base['errors']} in the baseline")
+    return problems
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=['asgi', 'wsgi'], default='asgi')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=3, help='unmeasured requests per endpoint first')
+    parser.add_argument('--endpoints', nargs='+', help='URL names to run (default: all)')
+    parser.add_argument('--github-latency', type=float, default=0.05, help='stub GitHub round trip in seconds')
+    parser.add_argument('--registry-latency', type=float, default=0.05)
+    parser.add_argument('--tokens', type=int, default=20, help='completion tokens per summary')
+    parser.add_argument('--token-latency', type=float, default=0.01, help='stub Groq seconds per token')
+    parser.add_argument('--manifests', type=int, default=20, help='manifests in the stub repository')
+    parser.add_argument('--rate-limit-budget', type=int, help='stub GitHub primary rate limit (requests)')
+    parser.add_argument('--rate-limit-per-second', type=int, help='stub GitHub secondary rate limit')
+    parser.add_argument('--github-rps', type=float, default=100000,
+                        help="the backend's own GitHub pacing per token (GITHUB_REQUESTS_PER_SECOND)")
+    parser.add_argument('--mongodb-uri', help='run the MongoDB-backed endpoints and cache tiers too')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='fail on regressions against this baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed timing drift, as a fraction')
+    parser.add_argument('--port', type=int, default=18900)
+    args = parser.parse_args()
+
+    files = monorepo_files(args.manifests)
+    plan = scenarios(files)
+    missing = [name for name in url_names() if name not in plan]
+    if missing:
+        sys.exit(f"no benchmark scenario for: {', '.join(missing)}")
+    names = args.endpoints or list(plan)
+
+    github = github_routes(files=files)
+    if args.rate_limit_budget is not None or args.rate_limit_per_second is not None:
+        github = rate_limited(github, budget=args.rate_limit_budget or 5000, per_second=args.rate_limit_per_second)
+
+    results = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'server': args.server,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'github_latency': args.github_latency,
+            'registry_latency': args.registry_latency,
+            'tokens': args.tokens,
+            'token_latency': args.token_latency,
+            'manifests': args.manifests,
+            'rate_limit_budget': args.rate_limit_budget,
+            'rate_limit_per_second': args.rate_limit_per_second,
+            'mongodb': bool(args.mongodb_uri),
+        },
+        'endpoints': {},
+    }
+
+    print(f"{'endpoint':>24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}  upstream calls/request")
+    with StubServer(github, latency=args.github_latency) as github_stub, \
+            StubServer(registry_routes(), latency=args.registry_latency) as registry_stub, \
+            StubServer(groq_routes(args.tokens, args.token_latency)) as groq_stub:
+        stubs = {'github': github_stub, 'registry': registry_stub, 'groq': groq_stub}
+        environ = {
+            'DJANGO_SETTINGS_MODULE': 'backend.settings',
+            'GROQ_API_KEY': 'benchmark',
+            'GROQ_BASE_URL': groq_stub.url,
+            'GITHUB_API_URL': github_stub.url,
+            'GITHUB_OAUTH_URL': github_stub.url,
+            'GITHUB_WEBHOOK_SECRET': WEBHOOK_SECRET,
+            'NPM_REGISTRY_URL': f'{registry_stub.url}/npm',
+            'PYPI_URL': f'{registry_stub.url}/pypi',
+            'GITHUB_REQUESTS_PER_SECOND': str(args.github_rps),
+            'GITHUB_REQUEST_BURST': str(max(int(args.github_rps), 1)),
+            'CACHE_PERSISTENT_TIER': 'true' if args.mongodb_uri else 'false',
+            'SUMMARY_CACHE_ENABLED': 'true' if args.mongodb_uri else 'false',
+            'LOG_LEVEL': 'WARNING',
+        }
+        if args.mongodb_uri:
+            environ['MONGODB_URI'] = args.mongodb_uri
+
+        server = Server(args.server, args.port, environ)
+        try:
+            server.wait_ready()
+            for name in names:
+                scenario = plan[name]
+                if scenario.needs_mongodb and not args.mongodb_uri:
+                    results['endpoints'][name] = {'skipped': 'needs --mongodb-uri'}
+                    print(f"{name:>24}  skipped (needs --mongodb-uri)")
+                    continue
+                result = results['endpoints'][name] = run_endpoint(server, stubs, scenario, args)
+                upstream = ', '.join(f'{stub} {calls:g}' for stub, calls
+                                     in result['upstream_calls_per_request'].items() if calls)
+                print(f"{name:>24} {result['rps']:>8.1f} {result['p50_ms'] or 0:>8.1f} {result['p95_ms'] or 0:>8.1f} "
+                      f"{result['p99_ms'] or 0:>8.1f} {result['errors']:>6}  {upstream or '-'}")
+        finally:
+            server.stop()
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+            baseline_file.write('\n')
+        print(f"baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        changed = [
+            f"{option} {baseline['meta'].get(option)} -> {value}" for option, value in results['meta'].items()
+            if option not in ('revision', 'python') and baseline['meta'].get(option) != value
+        ]
+        if changed:
+            print(f"note: the baseline was recorded with other options: {', '.join(changed)}")
+        problems = compare(results, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
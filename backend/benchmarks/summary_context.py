@@ -0,0 +1,60 @@
+"""Time from request start to the Groq call for repository summaries.
+
+Compares the former strictly sequential fetches (/user, repo, README,
+languages) with the parallel context stage and a warm identity cache.
+Run from the backend directory:
+
+    python -m benchmarks.summary_context --latency 0.05
+"""
+import argparse
+import statistics
+import time
+from base64 import b64decode
+
+from .harness import clear_caches, setup_django
+from .stubs import StubServer, github_routes
+
+
+def _sequential_context(repo_name, access_token):
+    from backend_app.github import github_get
+
+    username = github_get('/user', access_token).json()['login']
+    repo_data = github_get(f'/repos/{username}/{repo_name}', access_token).json()
+    readme = github_get(f'/repos/{username}/{repo_name}/readme', access_token).json()
+    b64decode(readme['content']).decode('utf-8')
+    list(github_get(repo_data['languages_url'], access_token).json().keys())
+
+
+def _parallel_context(repo_name, access_token):
+    from backend_app.github import github_user
+    from backend_app.summary import build_summary_messages, gather_repo_context
+
+    user, _ = github_user(access_token)
+    build_summary_messages(gather_repo_context(user['login'], repo_name, access_token))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='stub round-trip latency in seconds')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    with StubServer(github_routes(), latency=args.latency) as stub:
+        setup_django(GITHUB_API_URL=stub.url)
+        clear_caches()
+
+        print(f"{'strategy':>12} {'p50 (ms)':>9} {'max (ms)':>9} {'calls/req':>10}")
+        for name, gather in (('sequential', _sequential_context), ('parallel', _parallel_context)):
+            gather('hello-world', 'token')  # warm connections and the identity cache
+            stub.reset()
+            timings = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                gather('hello-world', 'token')
+                timings.append(time.perf_counter() - started)
+            calls = stub.total_calls() / args.iterations
+            print(f"{name:>12} {statistics.median(timings) * 1000:>9.1f} {max(timings) * 1000:>9.1f} {calls:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
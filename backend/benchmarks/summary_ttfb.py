@@ -0,0 +1,64 @@
+"""Time to first byte of the JSON and the streaming (SSE) summary endpoints.
+
+Drives both views in-process against stub GitHub and Groq servers. The
+JSON endpoint returns nothing until the whole completion is done; the SSE
+endpoint forwards the first completion chunk as soon as it arrives.
+
+    python -m benchmarks.summary_ttfb --tokens 60 --token-latency 0.02
+"""
+import argparse
+import statistics
+import time
+
+from .harness import setup_django
+from .stubs import StubServer, github_routes, groq_routes
+
+
+def _ttfb(client, path):
+    """Seconds until the first body bytes, and until the response is complete"""
+    started = time.perf_counter()
+    response = client.get(path, HTTP_AUTHORIZATION='Bearer token')
+    assert response.status_code == 200, response.status_code
+    if not response.streaming:
+        first_byte = time.perf_counter() - started
+        return first_byte, first_byte
+
+    chunks = iter(response.streaming_content)
+    next(chunks)  # the meta event is sent before the model is called
+    next(chunks)
+    first_token = time.perf_counter() - started
+    for _ in chunks:
+        pass
+    return first_token, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.02, help='stub GitHub latency in seconds')
+    parser.add_argument('--tokens', type=int, default=60)
+    parser.add_argument('--token-latency', type=float, default=0.02)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    with StubServer(github_routes(), latency=args.latency) as github, \
+            StubServer(groq_routes(args.tokens, args.token_latency)) as groq_stub:
+        setup_django(
+            GITHUB_API_URL=github.url,
+            GROQ_BASE_URL=groq_stub.url,
+            SUMMARY_CACHE_ENABLED='false',
+        )
+        from django.test import Client
+        client = Client(HTTP_HOST='localhost')
+
+        print(f"{'endpoint':>10} {'TTFB p50 (ms)':>14} {'total p50 (ms)':>15}")
+        for name, path in (('json', '/api/github/repos/hello-world/summary'),
+                           ('sse', '/api/github/repos/hello-world/summary/stream')):
+            _ttfb(client, path)  # warm connections and the identity cache
+            samples = [_ttfb(client, path) for _ in range(args.iterations)]
+            ttfb = statistics.median(first for first, _ in samples)
+            total = statistics.median(total for _, total in samples)
+            print(f"{name:>10} {ttfb * 1000:>14.1f} {total * 1000:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
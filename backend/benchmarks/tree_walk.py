@@ -0,0 +1,59 @@
+"""Tree listing cost: first scan of a commit, truncated trees, and unchanged re-scans.
+
+GitHub truncates recursive tree listings past a size limit; the stub does the
+same past ``--truncate-at`` entries so the subtree walk is exercised.
+
+Run from the backend directory:
+
+    python -m benchmarks.tree_walk --latency 0.02 --files 2000 20000
+"""
+import argparse
+import time
+
+from django.conf import settings
+
+from .harness import clear_caches, setup_django
+from .stubs import StubServer, github_routes, monorepo_files
+
+
+def repository(file_count, manifests=50):
+    files = monorepo_files(manifests)
+    for i in range(file_count - len(files)):
+        files[f'src/module-{i % 40}/part-{i % 7}/file-{i}.py'] = b'print(%d)\n' % i
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.02, help='stub round-trip latency in seconds')
+    parser.add_argument('--files', type=int, nargs='+', default=[2000, 20000])
+    parser.add_argument('--truncate-at', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_done = False
+    print(f"{'files':>7} {'run':>16} {'time (s)':>9} {'tree calls':>11} {'GitHub calls':>13}")
+    for count in args.files:
+        files = repository(count)
+        manifests = sum(1 for path in files if path.endswith(('package.json', 'requirements.txt')))
+        routes = github_routes(files=files, truncate_at=args.truncate_at)
+        with StubServer(routes, latency=args.latency) as stub:
+            if not setup_done:
+                setup_django(GITHUB_API_URL=stub.url)
+                setup_done = True
+            else:
+                settings.GITHUB_API_URL = stub.url
+            from backend_app.dependencies import fetch_tree
+
+            clear_caches()
+            for run in ('first scan', 'unchanged commit'):
+                stub.reset()
+                started = time.perf_counter()
+                tree = fetch_tree('octocat', 'monorepo', 'token')
+                elapsed = time.perf_counter() - started
+                assert len(tree.blobs) == manifests, (len(tree.blobs), manifests)
+                tree_calls = sum(n for (_, route), n in stub.calls.items() if '/git/trees/' in route)
+                print(f"{count:>7} {run:>16} {elapsed:>9.2f} {tree_calls:>11} {stub.total_calls():>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""GitHub round trips of a dependency update PR touching 1, 10 and 100 manifests.
+
+Drives the update-dependencies view in-process against a stub GitHub and
+counts every request it receives, split into reads and writes.
+
+    python -m benchmarks.update_batch --latency 0.02 --files 1 10 100
+"""
+import argparse
+import json
+import time
+
+from .harness import clear_caches, setup_django
+from .stubs import StubServer, github_routes, monorepo_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.02, help='stub round-trip latency in seconds')
+    parser.add_argument('--files', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    files = monorepo_files(max(args.files))
+    manifests = sorted(path for path in files if path.endswith(('package.json', 'requirements.txt')))
+    updates = {f'shared-{i}': {'current': '1.0.0', 'latest': '2.0.0'} for i in range(3)}
+
+    with StubServer(github_routes(files=files), latency=args.latency) as github:
+        setup_django(GITHUB_API_URL=github.url)
+        from django.test import Client
+        client = Client(HTTP_HOST='localhost')
+
+        print(f"{'files':>6} {'cache':>5} {'time (s)':>9} {'reads':>6} {'writes':>7} {'total':>6}")
+        for count in args.files:
+            body = json.dumps({'files': {path: updates for path in manifests[:count]}})
+            for cache in ('cold', 'warm'):
+                if cache == 'cold':
+                    clear_caches()
+                github.reset()
+                started = time.perf_counter()
+                response = client.post(
+                    '/api/github/repos/monorepo/update-dependencies', body,
+                    content_type='application/json', HTTP_AUTHORIZATION='Bearer token'
+                )
+                elapsed = time.perf_counter() - started
+                assert response.status_code == 200, response.content
+                assert len(response.json()['files']) == count
+                calls = github.calls
+                reads = sum(n for (method, _), n in calls.items() if method == 'GET')
+                writes = sum(calls.values()) - reads
+                print(f"{count:>6} {cache:>5} {elapsed:>9.2f} {reads:>6} {writes:>7} {reads + writes:>6}")
+
+
+if __name__ == '__main__':
+    main()
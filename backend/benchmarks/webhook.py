@@ -0,0 +1,97 @@
+"""The first dependency view after a push, with and without the push webhook warming it.
+
+Each round scans the stub repository, then "pushes" a one-file commit by
+pointing the backend at a second stub serving the new head, and times the
+next user request. With the webhook, the recorded delivery in
+``payloads/push.json`` (its ``after`` set to the new head and signed with
+the test secret) is posted first and the background scan is waited for.
+Tampered and ping deliveries are sent too, to check the signature gate.
+
+Run from the backend directory:
+
+    python -m benchmarks.webhook --manifests 200
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .harness import clear_caches, setup_django
+from .incremental_scan import one_file_commit
+from .stubs import StubServer, git_trees, github_routes, head_commit_sha, monorepo_files, registry_routes
+
+PAYLOAD = Path(__file__).parent / 'payloads' / 'push.json'
+SECRET = 'benchmark-webhook-secret'
+PATH = '/api/github/repos/monorepo/dependencies'
+
+
+def _deliver(client, event, body, signature=None):
+    from backend_app.webhooks import sign
+
+    return client.post(
+        '/api/github/webhook', body, content_type='application/json',
+        HTTP_X_GITHUB_EVENT=event,
+        HTTP_X_GITHUB_DELIVERY='benchmark',
+        HTTP_X_HUB_SIGNATURE_256=signature or sign(body, SECRET),
+    )
+
+
+def _precomputed():
+    from backend_app.webhooks import precomputations_total
+
+    return sum(value for key, value in precomputations_total._values.items() if key[0] == 'dependencies')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.02, help='stub round-trip latency in seconds')
+    parser.add_argument('--manifests', type=int, default=200)
+    args = parser.parse_args()
+
+    files = monorepo_files(args.manifests)
+    pushed = one_file_commit(files)
+    payload = json.loads(PAYLOAD.read_text())
+    payload['after'] = head_commit_sha(git_trees(pushed)[0])
+    body = json.dumps(payload).encode()
+
+    setup_django(GITHUB_WEBHOOK_SECRET=SECRET, GITHUB_WEBHOOK_TOKEN='webhook-token', SUMMARY_CACHE_ENABLED='false')
+    from django.test import Client
+    client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION='Bearer token')
+
+    with StubServer(github_routes(files=files), latency=args.latency) as before, \
+            StubServer(github_routes(files=pushed), latency=args.latency) as after, \
+            StubServer(registry_routes(), latency=args.latency) as registry:
+        settings.NPM_REGISTRY_URL = f'{registry.url}/npm'
+        settings.PYPI_URL = f'{registry.url}/pypi'
+
+        tampered = _deliver(client, 'push', body, signature='sha256=' + '0' * 64)
+        ping = _deliver(client, 'ping', json.dumps({'zen': 'Keep it logically awesome.'}).encode())
+        print(f'tampered delivery: {tampered.status_code}, ping: {ping.status_code}')
+
+        print(f"{'first view after push':>22} {'time (s)':>9} {'GitHub':>7} {'registry':>9} {'parsed':>7}")
+        for mode in ('without webhook', 'with webhook'):
+            clear_caches()
+            settings.GITHUB_API_URL = before.url
+            client.get(PATH)
+
+            settings.GITHUB_API_URL = after.url
+            if mode == 'with webhook':
+                done = _precomputed()
+                response = _deliver(client, 'push', body)
+                assert response.status_code == 202, response.content
+                while _precomputed() == done:
+                    time.sleep(0.01)
+            after.reset()
+            registry.reset()
+
+            started = time.perf_counter()
+            result = client.get(PATH).json()
+            elapsed = time.perf_counter() - started
+            print(f"{mode:>22} {elapsed:>9.2f} {after.total_calls():>7} {registry.total_calls():>9} "
+                  f"{result['reuse']['manifests_parsed']:>7}")
+
+
+if __name__ == '__main__':
+    main()
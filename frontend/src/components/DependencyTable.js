@@ -32,6 +32,7 @@ function DependencyTable({
               <th className="pb-2 text-cyan-400">Package</th>
               <th className="pb-2 text-cyan-400">Current Version</th>
               <th className="pb-2 text-cyan-400">Latest Version</th>
+              <th className="pb-2 text-cyan-400">Used In</th>
               <th
                 className="pb-2 text-cyan-400 cursor-pointer hover:text-cyan-300 flex items-center gap-1"
                 onClick={() => handleSort("status")}
@@ -51,6 +52,14 @@ function DependencyTable({
                 <td className="py-3 text-white">{pkg}</td>
                 <td className="py-3 text-gray-300">{versions.current}</td>
                 <td className="py-3 text-gray-300">{versions.latest}</td>
+                <td
+                  className="py-3 text-gray-300"
+                  title={(versions.file_paths || [versions.file_path]).join("\n")}
+                >
+                  {(versions.file_paths || []).length > 1
+                    ? `${versions.file_paths.length} manifests`
+                    : versions.file_path}
+                </td>
                 <td className="py-3">
                   <span
                     className={`px-2 py-1 rounded-full text-sm ${
@@ -7,6 +7,7 @@ import { AiOutlineStar, AiOutlineFileText } from "react-icons/ai";
 
 function Dashboard() {
   const [repos, setRepos] = useState([]);
+  const [totalCount, setTotalCount] = useState(0);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [page, setPage] = useState(1);
@@ -43,6 +44,7 @@ function Dashboard() {
       return;
     }
 
+    // Paging and search happen server-side, so only one page of repos is loaded
     const fetchRepos = async () => {
       try {
         const github_token = localStorage.getItem("github_token");
@@ -52,9 +54,15 @@ function Dashboard() {
             headers: {
               Authorization: `Bearer ${github_token}`,
             },
+            params: {
+              page,
+              per_page: reposPerPage,
+              q: searchTerm || undefined,
+            },
           }
         );
         setRepos(response.data);
+        setTotalCount(Number(response.headers["x-total-count"] || 0));
         setLoading(false);
       } catch (err) {
         setError("Failed to fetch repositories");
@@ -62,8 +70,9 @@ function Dashboard() {
       }
     };
 
-    fetchRepos();
-  }, [navigate, userData]);
+    const timeout = setTimeout(fetchRepos, searchTerm ? 250 : 0);
+    return () => clearTimeout(timeout);
+  }, [navigate, userData, page, reposPerPage, searchTerm]);
 
   const handlePageChange = (newPage) => {
     if (newPage >= 1 && newPage <= totalPages) {
@@ -77,14 +86,7 @@ function Dashboard() {
     navigate("/");
   };
 
-  const filteredRepos = repos.filter((repo) =>
-    repo.name.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
-  const indexOfLastRepo = page * reposPerPage;
-  const indexOfFirstRepo = indexOfLastRepo - reposPerPage;
-  const currentRepos = filteredRepos.slice(indexOfFirstRepo, indexOfLastRepo);
-  const totalPages = Math.ceil(filteredRepos.length / reposPerPage);
+  const totalPages = Math.max(1, Math.ceil(totalCount / reposPerPage));
   const hasMore = page < totalPages;
 
   const handleSearch = (e) => {
@@ -131,14 +133,14 @@ function Dashboard() {
         />
       </div>
 
-      {filteredRepos.length === 0 && (
+      {repos.length === 0 && (
         <div className="text-center text-gray-400 my-8">
           No repositories found matching "{searchTerm}"
         </div>
       )}
 
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-        {currentRepos.map((repo) => (
+        {repos.map((repo) => (
           <div
             key={repo.id}
             className="bg-gray-800 rounded-lg border border-cyan-900/30 p-6 
@@ -90,13 +90,18 @@ function DependencyCheck() {
         setUpdatingPip(true);
       }
 
+      // Update every manifest that declares an outdated package in one PR
+      const files = {};
+      Object.entries(outdatedDeps).forEach(([pkg, versions]) => {
+        (versions.file_paths || [versions.file_path]).forEach((path) => {
+          files[path] = { ...files[path], [pkg]: versions };
+        });
+      });
+
       const github_token = localStorage.getItem("github_token");
       const response = await axios.post(
         `http://localhost:8000/api/github/repos/${repoName}/update-dependencies`,
-        {
-          file_path: Object.values(outdatedDeps)[0].file_path,
-          updates: outdatedDeps,
-        },
+        { files },
         {
           headers: {
             Authorization: `Bearer ${github_token}`,
@@ -1,6 +1,16 @@
 import React, { useState, useEffect } from "react";
 import { useParams } from "react-router-dom";
-import axios from "axios";
+
+// Parse one "event: ...\ndata: ..." block of a Server-Sent Events stream
+const parseEvent = (block) => {
+  let event = "message";
+  let data = "";
+  block.split("\n").forEach((line) => {
+    if (line.startsWith("event: ")) event = line.slice(7);
+    if (line.startsWith("data: ")) data += line.slice(6);
+  });
+  return { event, data: data ? JSON.parse(data) : null };
+};
 
 function RepoSummary() {
   const { repoName } = useParams();
@@ -9,26 +19,59 @@ function RepoSummary() {
   const [error, setError] = useState(null);
 
   useEffect(() => {
+    const controller = new AbortController();
+
     const fetchSummary = async () => {
       try {
         const github_token = localStorage.getItem("github_token");
-        const response = await axios.get(
-          `http://localhost:8000/api/github/repos/${repoName}/summary`,
+        const response = await fetch(
+          `http://localhost:8000/api/github/repos/${repoName}/summary/stream`,
           {
             headers: {
               Authorization: `Bearer ${github_token}`,
             },
+            signal: controller.signal,
           }
         );
-        setSummary(response.data);
+        if (!response.ok) {
+          throw new Error(`Request failed with status ${response.status}`);
+        }
+
+        // Render tokens as they arrive instead of waiting for the whole summary
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const blocks = buffer.split("\n\n");
+          buffer = blocks.pop();
+          blocks.forEach((block) => {
+            const { event, data } = parseEvent(block);
+            if (event === "meta") {
+              setSummary({ content: "", languages: data.languages });
+            } else if (event === "token") {
+              setLoading(false);
+              setSummary((prev) => ({
+                ...prev,
+                content: (prev?.content || "") + data.content,
+              }));
+            } else if (event === "error") {
+              throw new Error(data.error);
+            }
+          });
+        }
         setLoading(false);
       } catch (err) {
+        if (err.name === "AbortError") return;
         setError("Failed to fetch repository summary");
         setLoading(false);
       }
     };
 
     fetchSummary();
+    return () => controller.abort();
   }, [repoName]);
 
   return (